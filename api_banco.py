@@ -1,239 +1,245 @@
 from contextlib import asynccontextmanager
+import functools
+import json
+import os
 from multiprocessing import Value
+from typing import List, Optional
 import uvicorn
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from services.database import (
-    atualiza_cliente_db,
-    atualiza_investimento_db, 
-    atualizar_saldo_db,
-    busca_investimento_db,
-    busca_investimento_doc, 
-    deletar_cliente, 
-    busca_conta, 
     create_tables, 
-    busca_cliente, 
-    busca_cliente_por_nome,
-    retirada_investimento_db,
-    inserir_cliente as inserir_cliente_db, 
-    nova_conta, 
-    cadastrar_investidor_db, 
-    atualiza_investidor_db, 
-    busca_investidor_db,
-    novo_investimento_db
+    iniciar_pool,
+    fechar_pool,
+    checkpoint_wal,
+    extrato_db,
+    iterar_extrato,
+    estatisticas_cache_consultas,
 )
-from services.cliente_service import validar_cliente
-from services.conta_service import verificacao_conta
-from services.cliente_investidor_service import validar_cliente_conta, validar_investidor
-from models.schemas import RENTABILIDADE_PERFIL, ClienteIn, PerfilEnum, InvestidorIn, TipoEnum
-from services.investimento_service import validacao_investimento
+from models.schemas import ClienteLoteIn, PerfilEnum
+from services.agendador import Agendador
+from services import database_async
+from services import banco_service
+from services.posicao_service import iterar_posicoes_todos
+from services.metricas import instrumentar
+from services.core_banco import ErroCoreBanco
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    iniciar_pool()
     create_tables()
+    database_async.iniciar_executor_db()
+    agendador = Agendador('api_banco')
+    banco_service.agendar_tarefas(agendador)
     yield
+    agendador.parar()
+    database_async.fechar_executor_db()
+    checkpoint_wal('TRUNCATE')
+    fechar_pool()
 
 app = FastAPI(title = 'Banco Javer', lifespan = lifespan) # ADICIONE O LIFESPAN AQUI
+#latência por rota, sql por requisição e /metrics
+instrumentar(app, 'api_banco', admin = True)
+
+
+#erros da camada de serviço chegam ao cliente com o status, o detalhe e os cabeçalhos (ex.: ETag do 412)
+@app.exception_handler(ErroCoreBanco)
+async def erro_core_banco(request: Request, e: ErroCoreBanco):
+    return JSONResponse(status_code = e.status_code, content = {"detail": e.detalhe}, headers = e.cabecalhos)
+
+
+#controle otimista: o ETag é a versão da linha; um PATCH com If-Match só grava se ela não mudou
+def definir_etag(response: Response, registro: Optional[dict]) -> None:
+    if registro and registro.get('versao') is not None:
+        response.headers['ETag'] = f'"{registro["versao"]}"'
+
+
+#'async': as consultas quentes são async def e rodam no executor do banco (BANCO_DB_EXECUTOR)
+#'sync': as mesmas rotas registradas como def comuns, no threadpool do starlette
+ROTAS_LEITURA = os.getenv('BANCO_ROTAS_LEITURA', 'async')
+
+
+#registra uma consulta quente como GET no modelo de BANCO_ROTAS_LEITURA; a função é sempre síncrona
+def rota_leitura(caminho: str):
+    def registrar(funcao):
+        if ROTAS_LEITURA == 'sync':
+            return app.get(caminho)(funcao)
+
+        @functools.wraps(funcao)
+        async def rota(**kwargs):
+            return await database_async.executar(funcao, **kwargs)
+        return app.get(caminho)(rota)
+    return registrar
 
 
 #buscar cliente pelo nome
 @app.get('/clientes/busca/nome')
-def busca_cliente_nome(nome:str):
-    cliente = busca_cliente_por_nome(nome)
-    if not cliente:
-        raise HTTPException(status_code= 404, detail= 'Cliente não encontrado.')
-    return cliente
+def busca_cliente_nome(nome:str, pagina: int = Query(1, ge = 1), tamanho: int = Query(20, ge = 1, le = 100)):
+    return banco_service.buscar_clientes_nome(nome, pagina, tamanho)
 
 #buscar cliente pelo documento
-@app.get('/clientes/{documento}')
+@rota_leitura('/clientes/{documento}')
 def busca_cliente_documento(documento: str):
-    cliente = busca_cliente(documento)
-    if not cliente:
-        raise HTTPException(status_code= 404, detail = 'Cliente não encontrado.')
-    return cliente
+    return banco_service.buscar_cliente(documento)
 
 
 
 #cadastrar cliente
 @app.post('/clientes')
 def cadastro_cliente(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool):
-    try:
-        #usar a funçao da regra de negócio
-        cliente = validar_cliente(nome, telefone, documento, correntista, investidor)
-        if cliente:
-            cliente = inserir_cliente_db(nome, telefone, documento, correntista, investidor)
-        return cliente
-    except Exception as e:
-        raise HTTPException(status_code= 400, detail= f'Impossível cadastrar cliente. Erro: {e}')
+    return banco_service.cadastrar_cliente(nome, telefone, documento, correntista, investidor)
+
+#cadastro completo em uma chamada: cliente, conta e investidor na mesma transação
+@app.post('/onboarding')
+def onboarding(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool, saldo_cc: float = 0.0,
+               email: Optional[str] = None, patrimonio: Optional[float] = None, perfil: Optional[PerfilEnum] = None,
+               chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
+    return banco_service.onboarding(nome, telefone, documento, correntista, investidor, saldo_cc, email, patrimonio, perfil, chave_idempotencia)
+
+#cadastro em lote (JSON): clientes, contas e investidores em transações por lote
+@app.post('/clientes/lote')
+def cadastro_clientes_lote(clientes: List[ClienteLoteIn]):
+    return banco_service.cadastrar_lote([dict(cliente) for cliente in clientes])
+
+#cadastro em lote (CSV no corpo da requisição, com cabeçalho)
+@app.post('/clientes/lote/csv')
+async def cadastro_clientes_lote_csv(request: Request):
+    texto = (await request.body()).decode('utf-8-sig')
+    return await run_in_threadpool(banco_service.cadastrar_lote_csv, texto)
 
 #excluir cliente
 @app.delete('/clientes/{documento}')
 def excluir_cliente_api(documento: str):
-    try:
-        deletar_cliente(documento)
-        return 'Cadastro excluído com sucesso.'
-    except ValueError as e:
-        raise HTTPException(status_code = 400, detail = str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail= f'Erro ao excluir cadastro: {e}')
+    return banco_service.excluir_cliente(documento)
 
     
 #criar contas
 @app.post('/contas')
-def criar_conta(documento: str, saldo_cc: float = 0.0):
-    try:
-        return verificacao_conta(documento, saldo_cc)
-    except Exception as e:
-        raise HTTPException(status_code= 404, detail= f'Impossível criar conta. Erro: {e}')
+def criar_conta(documento: str, saldo_cc: float = 0.0, chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
+    return banco_service.criar_conta(documento, saldo_cc, chave_idempotencia)
 
 #buscar contas
-@app.get('/contas/{documento}')
-def buscar_contas(documento: str):
-    try: 
-        conta = busca_conta(documento)
-    except Exception as e:
-        raise HTTPException(status_code= 404, detail= 'Nenhuma conta encontrada.')
+@rota_leitura('/contas/{documento}')
+def buscar_contas(documento: str, response: Response):
+    conta = banco_service.buscar_conta(documento)
+    definir_etag(response, conta)
     return conta
 
+#acertos e falhas do cache das buscas por documento
+@app.get('/cache/estatisticas')
+def estatisticas_cache():
+    return estatisticas_cache_consultas()
+
+#score de crédito gravado; recalculado na hora se alguma movimentação o invalidou
+@rota_leitura('/contas/score/{documento}')
+def score_conta(documento: str):
+    return banco_service.score(documento)
+
+#extrato da conta (ou do patrimônio/investimentos) a partir do razão, paginado pelo id do lançamento
+@app.get('/contas/{documento}/extrato')
+def extrato_conta(documento: str, origem: str = 'CONTA', limite: int = Query(50, ge = 1, le = 500), antes_de: Optional[int] = None):
+    if origem not in ('CONTA', 'INVESTIDOR', 'INVESTIMENTO'):
+        raise HTTPException(status_code = 400, detail = 'Origem inválida. Use CONTA, INVESTIDOR ou INVESTIMENTO.')
+    lancamentos = extrato_db(documento, origem, limite, antes_de)
+    return {
+        "documento": documento,
+        "lancamentos": lancamentos,
+        "proximo": lancamentos[-1]['id_lancamento'] if len(lancamentos) == limite else None
+    }
+
+#extrato completo em NDJSON, do lançamento mais recente para o mais antigo
+@app.get('/contas/{documento}/extrato/stream')
+def stream_extrato(documento: str, origem: str = 'CONTA'):
+    if origem not in ('CONTA', 'INVESTIDOR', 'INVESTIMENTO'):
+        raise HTTPException(status_code = 400, detail = 'Origem inválida. Use CONTA, INVESTIDOR ou INVESTIMENTO.')
+    linhas = (json.dumps(item, ensure_ascii = False) + '\n' for item in iterar_extrato(documento, origem))
+    return StreamingResponse(linhas, media_type = 'application/x-ndjson')
+
 #atualizar cadastro
 @app.patch('/clientes/{documento}')
 def atualizar_cliente(documento: str, nome: str, telefone: str):
-    try:
-        cliente_atualizado = atualiza_cliente_db(documento, nome, telefone)
-
-        if cliente_atualizado:
-            return {
-                "documento": documento,
-                "nome": nome,
-                "telefone": telefone,
-            }
-        else:
-            # Caso o documento não exista no banco
-            raise HTTPException(status_code=404, detail="Cliente não encontrado.")
-            
-    except Exception as e:
-        # Erros de conexão ou SQL
-        raise HTTPException(status_code=500, detail=f"Erro ao atualizar: {str(e)}")
+    return banco_service.atualizar_cliente(documento, nome, telefone)
 
     
-#atualizar saldo da conta
+#atualizar saldo da conta; um retry com a mesma Idempotency-Key recebe o mesmo ETag
 @app.patch('/contas/{documento}/atualizar_saldo')
-def atualizar_saldo(documento: str, novo_saldo: float):
-    try:
-        conta = busca_conta(documento)
-        if not conta:
-            raise ValueError(f'Nenhuma conta vinculada ao CPF {documento}')
-        elif conta:
-            numero_conta = conta.get('numero_conta')
-            atualizar_saldo_db(numero_conta, novo_saldo)
-        return(f'Saldo atualizado: R${novo_saldo}')
-    except Exception as e:
-        raise e
+def atualizar_saldo(documento: str, novo_saldo: float, response: Response, chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key'),
+                    if_match: Optional[str] = Header(None)):
+    resultado = banco_service.atualizar_saldo(documento, novo_saldo, chave_idempotencia, if_match)
+    definir_etag(response, resultado)
+    return resultado['mensagem']
 
     
 
 #criar investidor
 @app.post('/investidor')
 def cadastro_investidor(documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: PerfilEnum):
-    try:
-        investidor = cadastrar_investidor_db(documento, nome, telefone, email, patrimonio, perfil.value)
-        return investidor
-    except ValueError as e:
-        raise HTTPException(status_code = 500, detail = f'Erro ao cadastrar investidor: {e}')
+    return banco_service.cadastrar_investidor(documento, nome, telefone, email, patrimonio, perfil)
     
 #atualizar dados do investidor
 @app.patch('/investidor/{documento}')
-def atualizar_investidor_banco(documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: PerfilEnum):
-    try:
-        investidor = atualiza_investidor_db(documento, nome, telefone, email, patrimonio, perfil.value)
-        if not investidor:
-            raise HTTPException(status_code = 404, detail = 'Cadastro não encontrado.')
-    except ValueError as e:
-        raise HTTPException(status_code = 500, detail = 'Cadastro não encontrado')
-    except Exception as e:
-        raise HTTPException(status_code = 500, detail = f'Erro ao atualizar cliente: {e}')
+def atualizar_investidor_banco(documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: PerfilEnum, response: Response,
+                               if_match: Optional[str] = Header(None)):
+    investidor = banco_service.atualizar_investidor(documento, nome, telefone, email, patrimonio, perfil, if_match)
+    definir_etag(response, investidor)
+    return investidor
     
 #buscar investidor
-@app.get('/clientes/investidor/{documento}')
-def procurar_investidor(documento: str):
-    investidor = busca_investidor_db(documento)
-    if not investidor:
-        raise HTTPException(status_code = 404, detail = 'Investidor não encontrado.')
+@rota_leitura('/clientes/investidor/{documento}')
+def procurar_investidor(documento: str, response: Response):
+    investidor = banco_service.buscar_investidor(documento)
+    definir_etag(response, investidor)
     return investidor
 
 #novo investimento
 @app.post('/investimento/novo')
-def novo_investimento(documento: str, tipo: str, valor_investido: float, ativo: bool, ticker: str = None):
-    if tipo == 'RENDA FIXA':
-        rentabilidade = RENTABILIDADE_PERFIL.get(busca_investidor_db(documento).get('perfil'))
-    else:
-        rentabilidade = 0.0
-    try:
-        resultado = novo_investimento_db(documento, tipo, valor_investido, rentabilidade, ativo, ticker)
-        return resultado
-    except Exception as e:
-        raise HTTPException(status_code = 400, detail = f'Erro ao salvar investimento: {e}')
-    #     investidor = busca_investidor_db(documento)
-    #     if not investidor:
-    #         raise Exception("Investidor não encontrado")
-
-    #     valor_perfil = investidor.get('perfil')
-    #     perfil = str(valor_perfil).strip().upper()
-
-
-    #     if validacao_investimento(documento, tipo, valor_investido, ativo, ticker):
-    #         resultado = novo_investimento_db(documento, tipo, valor_investido, rentabilidade, ativo)
-    #         return resultado
-            
-    # except Exception as e:
-    #     raise HTTPException(status_code=400, detail=f'Erro ao criar investimento: {e}')
-
-#atualizar investimento
-@app.patch('investimento/atualizar/{id_investimento}')
-def atualizar_investimento(id_investimento: str, tipo: str, valor_investido: float, ativo: bool):
-    tipo_investimento = busca_investimento_db(id_investimento).get('tipo')
-    if tipo_investimento != 'RENDA_FIXA':
-        raise ValueError('Impossível alterar investimentos em renda variável. Tente vender os ativos.')
-    else: 
-        try:
-            investimento_atualizado = atualiza_investimento_db(id_investimento, tipo, valor_investido, ativo)
-
-            if investimento_atualizado:
-                return{
-                    "id_investimento" : id_investimento,
-                    "tipo" : tipo,
-                    "valor_investido" : valor_investido,
-                    "ativo" : ativo
-                }
-
-            else:
-                raise HTTPException(status_code = 404, detail = 'Investimento não encontrado.')
-
-        except Exception as e:
-            raise HTTPException(status_code = 500, detail = f'Erro ao atualizar investimento: {e}')
+def novo_investimento(documento: str, tipo: str, valor_investido: float, ativo: bool, ticker: str = None, preco_aplicacao: Optional[float] = None,
+                      chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
+    return banco_service.novo_investimento(documento, tipo, valor_investido, ativo, ticker, chave_idempotencia, preco_aplicacao)
+
+#atualizar investimento (aporte em renda fixa)
+@app.patch('/investimento/atualizar/{id_investimento}')
+def atualizar_investimento(id_investimento: str, tipo: str, valor_investido: float, ativo: bool, response: Response,
+                           chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key'),
+                           if_match: Optional[str] = Header(None)):
+    resultado = banco_service.atualizar_investimento(id_investimento, tipo, valor_investido, ativo, chave_idempotencia, if_match)
+    definir_etag(response, resultado)
+    return resultado
     
 
 #deletar investimento
 @app.delete('/investimento/excluir/{id_investimento}')
-def deletar_investimento(id_investimento: str, documento: str, valor_investido: float):
-    try:
-        investimento = busca_investimento_db(id_investimento)
-        if not investimento:
-            raise HTTPException(status_code = 404, detail = 'Investimento não encontrado.')
-        retirada_investimento_db(id_investimento, valor_investido, documento)
-        return ('Investimento excluído com sucesso.')
-    except Exception as e:
-        raise HTTPException(status_code = 500, detail = f'Erro ao excluir investimento: {e}')
+def deletar_investimento(id_investimento: str, documento: str, valor_investido: float, chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
+    return banco_service.excluir_investimento(id_investimento, documento, valor_investido, chave_idempotencia)
     
+#patrimônio atualizado de todos os clientes (NDJSON, um cliente por linha)
+@app.get('/investimento/posicao/todos')
+def posicao_todos_clientes():
+    linhas = (json.dumps(item, ensure_ascii = False) + '\n' for item in iterar_posicoes_todos())
+    return StreamingResponse(linhas, media_type = 'application/x-ndjson')
+
+#posição atual do cliente: renda fixa com juros até hoje e renda variável marcada a mercado
+@app.get('/investimento/{documento}/posicao')
+def posicao_investimentos(documento: str):
+    return banco_service.posicao(documento)
+
+#investimentos do cliente paginados por cursor (data_aplicacao, id_investimento)
+@app.get('/investimento/{documento}/pagina')
+def pagina_investimentos(documento: str, limite: int = Query(50, ge = 1, le = 500), cursor: Optional[str] = None):
+    return banco_service.pagina_investimentos(documento, limite, cursor)
+
+#todos os investimentos do cliente em NDJSON (um objeto por linha), lidos do banco em lotes
+@app.get('/investimento/{documento}/stream')
+def stream_investimentos(documento: str):
+    return StreamingResponse(banco_service.linhas_investimentos(documento), media_type = 'application/x-ndjson')
+
 #listar investimentos do cliente
-@app.get('/investimento/{documento}')
+@rota_leitura('/investimento/{documento}')
 def investimentos_por_cliente(documento: str):
-    try:
-        lista_inv = busca_investimento_doc(documento)
-    except Exception as e:
-        raise HTTPException(status_code = 404, detail = f'Nenhum investimento encontrado para o CPF {documento}')
-    return lista_inv
+    return banco_service.investimentos_doc(documento)
 
 
 
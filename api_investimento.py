@@ -1,25 +1,41 @@
 from sys import exception
 from typing import Optional
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, Header, HTTPException, Depends, Request
 from contextlib import asynccontextmanager
 
 from pydantic import BaseModel
-from app import URL_CORE_BANCO, busca_investidor
+from app import busca_investidor
 from services.cliente_investidor_service import validar_cliente_conta, validar_investidor
 from models.schemas import RENTABILIDADE_PERFIL, InvestidorIn, PerfilEnum, TipoEnum
-import requests
-from services.database import busca_investidor_db, cadastrar_investidor_db, atualiza_investidor_db, create_tables
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from services.database import busca_investidor_db, cadastrar_investidor_db, atualiza_investidor_db, create_tables, iniciar_pool, fechar_pool, checkpoint_wal, CHECKPOINT_INTERVALO, tickers_em_carteira_db
+from services.agendador import Agendador
 from services.investimento_service import validacao_investimento
 from fastapi.middleware.cors import CORSMiddleware
-from services.market_service import validar_ticker
+from services.market_service import validar_ticker, buscar_ativo, buscar_ativos, atualizar_cotacoes, COTACAO_AQUECER_INTERVALO
+from services.core_banco import ErroCoreBanco, iniciar_core_banco, fechar_core_banco, get_core_banco
+from services.metricas import instrumentar
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    iniciar_pool()
     create_tables()
+    await iniciar_core_banco()
+    agendador = Agendador('api_investimento')
+    agendador.agendar('checkpoint-wal', CHECKPOINT_INTERVALO, checkpoint_wal)
+    agendador.agendar('aquecer-cotacoes', COTACAO_AQUECER_INTERVALO, lambda: atualizar_cotacoes(tickers_em_carteira_db()))
     yield
+    agendador.parar()
+    await fechar_core_banco()
+    checkpoint_wal('TRUNCATE')
+    fechar_pool()
 
 app = FastAPI(title= 'PyInvest', lifespan= lifespan)
+instrumentar(app, 'api_investimento')
+
+MAX_TICKERS_COTACAO = 100
 
 
 
@@ -30,11 +46,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def login_investimentos(documento: str):
-    url = f'{URL_CORE_BANCO}/clientes/investidor/{documento}'
-    resposta = requests.get(url)
+@app.exception_handler(ErroCoreBanco)
+async def erro_core_banco(request: Request, e: ErroCoreBanco):
+    return JSONResponse(status_code = e.status_code, content = {"detail": e.detalhe}, headers = e.cabecalhos)
+
+async def login_investimentos(documento: str):
+    try:
+        investidor = await get_core_banco().buscar_investidor(documento)
+    except ErroCoreBanco:
+        investidor = None
 
-    if resposta.status_code != 200:
+    if investidor is None:
         raise HTTPException(status_code = 403, detail = 'Investidor não encontrado')
     return documento
 
@@ -43,42 +65,67 @@ def login_investimentos(documento: str):
 @app.get('/investimento/busca/{ticker}')
 def consulta_ticker(ticker: str):
     try:
-        dados_ativo = validar_ticker(ticker)
+        dados_ativo = buscar_ativo(ticker) if validar_ticker(ticker) else None
 
         if not dados_ativo:
             raise HTTPException(status_code = 404, detail = 'Ativo não localizado em Yahoo Finance.')
         return dados_ativo
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code = 400, detail = f'Erro inesperado: {e}')
     
 
+#cotações de vários tickers numa chamada: /investimento/cotacoes?tickers=PETR4.SA,VALE3.SA
+@app.get('/investimento/cotacoes')
+def consulta_cotacoes(tickers: str):
+    lista = [t for t in tickers.split(',') if validar_ticker(t)]
+    if not lista:
+        raise HTTPException(status_code = 400, detail = 'Informe ao menos um ticker válido.')
+    if len(lista) > MAX_TICKERS_COTACAO:
+        raise HTTPException(status_code = 400, detail = f'Informe no máximo {MAX_TICKERS_COTACAO} tickers por consulta.')
+    return buscar_ativos(lista)
+    
+
 #rota usada pelo front para validar o login
 @app.get('/investimentos/acesso/{documento}')
-def acesso_investidor(documento: str):
-    url = f'{URL_CORE_BANCO}/clientes/investidor/{documento}'
-    resposta = requests.get(url)
+async def acesso_investidor(documento: str):
+    try:
+        investidor = await get_core_banco().buscar_investidor(documento)
+    except ErroCoreBanco as e:
+        raise HTTPException(status_code = 403, detail = f'Erro no core: {e.status_code}')
 
-    if resposta.status_code == 200:
+    if investidor is not None:
         return {"documento" : documento}
     
-    raise HTTPException(status_code = 403, detail = f'Erro no core: {resposta.status_code}')
+    raise HTTPException(status_code = 403, detail = 'Erro no core: 404')
 
 
 #cadastrar investimento
 @app.post('/investimento/novo')
-def criar_investimento(documento: str, tipo: str, valor_investido: float, ativo: bool, ticker: Optional[str] = None):
+async def criar_investimento(documento: str, tipo: str, valor_investido: float, ativo: bool, ticker: Optional[str] = None,
+                             chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
     try:
         ticker_valido = ticker.strip() if ticker else None
         # print(f"DEBUG: Tipo={tipo}, Ticker={ticker}")
-        dados_validados = validacao_investimento(documento, tipo, valor_investido, ativo, ticker)
+        dados_validados = await run_in_threadpool(validacao_investimento, documento, tipo, valor_investido, ativo, ticker)
         if not dados_validados:
             raise ValueError('Dados de investimento inválidos')
-        resposta = requests.post(f'{URL_CORE_BANCO}/investimento/novo', params = dados_validados)
-
-        if resposta.status_code != 200:
-            raise Exception(resposta.json().get('detail'))
-        
-        return resposta.json()
+        #a cotação é buscada aqui, antes de chamar o core: vira o preço de compra da posição
+        preco_aplicacao = None
+        if dados_validados['tipo'] != TipoEnum.RENDA_FIXA:
+            cotacao = await run_in_threadpool(buscar_ativo, dados_validados['ticker'])
+            if not cotacao or cotacao.get('preco') is None:
+                raise HTTPException(status_code = 503, detail = f'Cotação indisponível para {dados_validados["ticker"]}. Tente novamente.')
+            preco_aplicacao = cotacao['preco']
+        return await get_core_banco().novo_investimento(
+            dados_validados['documento'], dados_validados['tipo'], dados_validados['valor_investido'], dados_validados['ativo'], dados_validados['ticker'],
+            chave_idempotencia = chave_idempotencia, preco_aplicacao = preco_aplicacao
+        )
+    except HTTPException:
+        raise
+    except ErroCoreBanco as e:
+        raise HTTPException(status_code = 400, detail = str(e.detalhe))
     except Exception as e:
         raise HTTPException(status_code = 400, detail = str(e))
     
@@ -86,37 +133,53 @@ def criar_investimento(documento: str, tipo: str, valor_investido: float, ativo:
     
 #buscar investimento pelo id do cliente
 @app.get('/investimento/{documento}')
-def busca_investimento_pelo_doc(documento: str, id_investidor = Depends(login_investimentos)):
-    resposta = requests.get(f'{URL_CORE_BANCO}/investimento/{documento}')
-    if resposta.status_code != 200:
+async def busca_investimento_pelo_doc(documento: str, id_investidor = Depends(login_investimentos)):
+    investimentos = await get_core_banco().investimentos_doc(documento)
+    if investimentos is None:
         raise HTTPException(status_code = 404, detail = 'Investimento não encontrado.')
     
-    return resposta.json()
+    return investimentos
+
+#posição atualizada do investidor (valor de mercado e rendimento)
+@app.get('/investimento/{documento}/posicao')
+async def posicao_investidor(documento: str, id_investidor = Depends(login_investimentos)):
+    posicao = await get_core_banco().posicao(documento)
+    if posicao is None:
+        raise HTTPException(status_code = 404, detail = f'Nenhum investimento ativo para o CPF {documento}')
+    return posicao
+
+#página de investimentos (repassa o cursor opaco do core)
+@app.get('/investimento/{documento}/pagina')
+async def pagina_investimentos_doc(documento: str, limite: int = 50, cursor: Optional[str] = None, id_investidor = Depends(login_investimentos)):
+    return await get_core_banco().pagina_investimentos(documento, limite, cursor)
+
+#repassa o NDJSON do core em pedaços, sem montar a lista inteira em memória
+@app.get('/investimento/{documento}/stream')
+async def stream_investimentos_doc(documento: str, id_investidor = Depends(login_investimentos)):
+    pedacos = await get_core_banco().stream_investimentos(documento)
+    return StreamingResponse(pedacos, media_type = 'application/x-ndjson')
 
 #rota para buscar um investidor
 @app.get('/investimentos/buscar-perfil/{documento}')
-def buscar_investidor_api(documento: str):
+async def buscar_investidor_api(documento: str):
     try:
-        url = f'{URL_CORE_BANCO}/clientes/investidor/{documento}'
-        resposta = requests.get(url)
-
-        if resposta.status_code == 200:
-            dados_investidor = resposta.json()
-            return{
-                "documento" : dados_investidor.get('documento'),
-                "nome" : dados_investidor.get('nome')
-            }
-        raise HTTPException(status_code = 404, detail = 'Investidor não cadastrado.')
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code = 503, detail = f'Erro de conexão: {e}')
+        dados_investidor = await get_core_banco().buscar_investidor(documento)
+    except ErroCoreBanco as e:
+        raise HTTPException(status_code = e.status_code, detail = f'Erro de conexão: {e.detalhe}')
+
+    if dados_investidor is not None:
+        return{
+            "documento" : dados_investidor.get('documento'),
+            "nome" : dados_investidor.get('nome')
+        }
+    raise HTTPException(status_code = 404, detail = 'Investidor não cadastrado.')
     
 
 @app.delete('/investimento/excluir/{id_investimento}')
-def deletar_investimento(id_investimento: str, valor_investido: float, id_investidor = Depends(login_investimentos)):
-    resposta = requests.delete(f'{URL_CORE_BANCO}/investimento/excluir/id_investimento')
-    if resposta.status_code in (200, 204):
-        return 'Investimento excluído com sucesso.'
+async def deletar_investimento(id_investimento: str, valor_investido: float, id_investidor = Depends(login_investimentos),
+                              chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
     try:
-        detail = resposta.json().get('detail', 'Erro ao excluir investimento.')
-    except Exception as e:
-        raise HTTPException(f'Erro inesperado: {e}')
\ No newline at end of file
+        await get_core_banco().excluir_investimento(id_investimento, id_investidor, valor_investido, chave_idempotencia = chave_idempotencia)
+    except ErroCoreBanco as e:
+        raise HTTPException(status_code = e.status_code, detail = e.detalhe or 'Erro ao excluir investimento.')
+    return 'Investimento excluído com sucesso.'
\ No newline at end of file
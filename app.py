@@ -1,20 +1,28 @@
 from tkinter import EW
-from fastapi import FastAPI, HTTPException, params
-import requests
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request, Response, params
+from fastapi.responses import JSONResponse
 from services.cliente_service import validar_cliente
 from services.conta_service import verificacao_conta
 from services.database import create_tables
-from services.score_credito import calcular_score
-from models.schemas import ClienteIn, InvestidorIn
+from models.schemas import ClienteIn, ClienteLoteIn, InvestidorIn
 from services.cliente_investidor_service import validar_investidor, validar_cliente_conta
 from models.schemas import PerfilEnum
-from typing import Optional
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from services.core_banco import ErroCoreBanco, iniciar_core_banco, fechar_core_banco, get_core_banco
+from services.metricas import instrumentar
 
 
-app = FastAPI(title = 'PyInvest')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await iniciar_core_banco()
+    yield
+    await fechar_core_banco()
 
-URL_CORE_BANCO = "http://localhost:8001"
+app = FastAPI(title = 'PyInvest', lifespan = lifespan)
+instrumentar(app, 'app')
 
 
 app.add_middleware(
@@ -24,222 +32,136 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+#erros do core que as rotas não tratam chegam ao cliente com o mesmo status e detalhe
+@app.exception_handler(ErroCoreBanco)
+async def erro_core_banco(request: Request, e: ErroCoreBanco):
+    return JSONResponse(status_code = e.status_code, content = {"detail": e.detalhe}, headers = e.cabecalhos)
 
-#cadastrar cliente
-@app.post('/clientes')
-def cadastrar_cliente(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool, email: Optional[str] = None, patrimonio: Optional[float] = None, perfil: Optional[PerfilEnum] = None):
-    cliente_salvo = None
-    investidor_salvo = None
 
+#cadastrar cliente: cliente, conta e investidor numa única chamada (e transação) do core
+@app.post('/clientes')
+async def cadastrar_cliente(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool, email: Optional[str] = None, patrimonio: Optional[float] = None, perfil: Optional[PerfilEnum] = None,
+                           chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
     try:
         validar_cliente(nome, telefone, documento, correntista, investidor)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f'Erro ao cadastrar cliente: {e}')
-    
+
     try:
-        checagem = requests.get(f'{URL_CORE_BANCO}/clientes/{documento}')
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code = 503, detail = f'Erro desconhecido: {e}')
+        cadastro = await get_core_banco().onboarding(
+            nome, telefone, documento, correntista, investidor,
+            email = email, patrimonio = patrimonio, perfil = perfil.value if perfil is not None else None,
+            chave_idempotencia = chave_idempotencia
+        )
+    except ErroCoreBanco as e:
+        if e.status_code == 409:
+            raise HTTPException(status_code = 409, detail = 'Cliente já cadastrado.')
+        raise HTTPException(status_code=e.status_code, detail=f'Erro ao cadastrar cliente: {e.detalhe}')
+    return{"Investidor" : cadastro['investidor'], "Cliente" : cadastro['cliente']}
 
-    if checagem.status_code == 200:
-        raise HTTPException(status_code = 409, detail = 'Cliente já cadastrado.')
-    
-    params_cliente = {
-        "nome": nome,
-        "telefone": telefone,
-        "documento": documento,
-        "correntista": correntista,
-        "investidor": investidor
-    }
-
-    try:    
-        resposta = requests.post(f'{URL_CORE_BANCO}/clientes', params = params_cliente, timeout=8)
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=503, detail=f'Erro ao cadastrar cliente: {e}')
-
-    if resposta.status_code not in (200, 201):
-        try:
-            detalhe = resposta.json()
-        except Exception:
-            detalhe = resposta.text
-        raise HTTPException(status_code=resposta.status_code, detail=f'Erro ao cadastrar cliente: {detalhe}')
-
-    cliente_salvo = resposta.json()
-
-    if correntista:
-        params_conta = {
-            "documento": cliente_salvo['documento'],
-            "saldo_cc": 0.0
-        }
-        try:
-            resposta_conta = requests.post(f'{URL_CORE_BANCO}/contas', params=params_conta, timeout=5)
-        except requests.exceptions.RequestException as e:
-            raise HTTPException(status_code=503, detail=f'Erro ao criar conta: {e}')
-
-        if resposta_conta.status_code not in (200, 201):
-            try:
-                detalhe = resposta_conta.json()
-            except Exception:
-                detalhe = resposta_conta.text
-            raise HTTPException(status_code=500, detail=f'Erro ao criar cona: {detalhe}')
-        
-    if investidor:
-        try:
-            checagem_investidor = requests.get(f'{URL_CORE_BANCO}/clientes/investidor/{documento}')
-        except requests.exceptions.RequestException as e:
-            raise HTTPException(status_code=503, detail=f'Erro ao buscar investidor: {e}')
-
-        if checagem_investidor.status_code == 200:
-            investidor_salvo = checagem_investidor.json()
-        else:
-            params_investidor = {
-                "documento": documento,
-                "nome": nome,
-                "telefone": telefone,
-                "email": email,
-                "patrimonio": patrimonio,
-                "perfil": (perfil.value if hasattr(perfil, "value") else str(perfil).upper()) if perfil is not None else None
-            }
-            resposta_investidor = requests.post(f'{URL_CORE_BANCO}/investidor', params=params_investidor, timeout=8)
-
-            if resposta_investidor.status_code in (200, 201):
-                investidor_salvo = resposta_investidor.json()
-            else:
-                try:
-                    detalhe = resposta_investidor.json().get('detail', 'Erro desconhecido')
-                except:
-                    detalhe = f'Erro desconhecido: {resposta_investidor.status_code}'
-                raise HTTPException(status_code = 500, detail = f'Erro ao salvar investidor: {detalhe}')
-    return{"Investidor" : investidor_salvo, "Cliente" : cliente_salvo}
 
 
+#cadastro em lote (JSON), repassado para o core em uma única chamada
+@app.post('/clientes/lote')
+async def cadastrar_clientes_lote(clientes: List[ClienteLoteIn]):
+    return await get_core_banco().cadastrar_lote([dict(c) for c in clientes])
+
+#cadastro em lote (CSV no corpo da requisição)
+@app.post('/clientes/lote/csv')
+async def cadastrar_clientes_lote_csv(request: Request):
+    return await get_core_banco().cadastrar_lote_csv(await request.body())
+
 
 #criar contas
 @app.post('/contas/criar_conta')
-def criar_nova_conta(documento: str, saldo_cc: float = 0.0):
-    params_conta = {
-        "documento": documento,
-        "saldo_cc": saldo_cc
-    }
-    resposta = requests.post(f'{URL_CORE_BANCO}/contas', params = params_conta)
-
-    if resposta.status_code != 200 and resposta.status_code != 201:
+async def criar_nova_conta(documento: str, saldo_cc: float = 0.0, chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key')):
+    try:
+        return await get_core_banco().criar_conta(documento, saldo_cc, chave_idempotencia = chave_idempotencia)
+    except ErroCoreBanco:
         raise HTTPException(status_code=500, detail='Erro ao criar conta.')
     
-    return resposta.json()
-    
 
 #busca cliente por documento
 @app.get('/clientes/{documento}')
-def buscar_cliente_app(documento: str):
-        resposta = requests.get(f'{URL_CORE_BANCO}/clientes/{documento}')
-        if resposta.status_code != 200:
+async def buscar_cliente_app(documento: str):
+        cliente = await get_core_banco().buscar_cliente(documento)
+        if cliente is None:
             raise HTTPException(status_code=404, detail='Cliente não encontrado.')
-        return resposta.json()
+        return cliente
 
 #busca cliente por nome
 @app.get('/clientes/busca/nome')
-def buscar_cliente_nome(nome: str):
-    resposta = requests.get(f'{URL_CORE_BANCO}/clientes/busca/nome', params={"nome": nome})
+async def buscar_cliente_nome(nome: str, pagina: int = 1, tamanho: int = 20):
+    clientes = await get_core_banco().buscar_clientes_nome(nome, pagina, tamanho)
     
-    if resposta.status_code != 200:
+    if not clientes:
         raise HTTPException(status_code=404, detail='Cliente não encontrado.')
     
-    return resposta.json()
+    return clientes
 
 
 
 #atualiza saldo da conta
 @app.patch('/contas/atualizar-saldo/{documento}')
-def atualizar_saldo_app(documento: str, novo_saldo: float):
-    params_update_saldo = {
-        "novo_saldo" : novo_saldo
-    }
+async def atualizar_saldo_app(documento: str, novo_saldo: float, chave_idempotencia: Optional[str] = Header(None, alias = 'Idempotency-Key'),
+                              if_match: Optional[str] = Header(None)):
     try:
-        resposta = requests.patch( f'{URL_CORE_BANCO}/contas/{documento}/atualizar_saldo', params = params_update_saldo)
-        if resposta.status_code != 200:
-            raise HTTPException(status_code = resposta.status_code, detail = 'Erro ao atualizar saldo.')
-        return resposta.json()
-    except requests.exceptions.ConnectionError:
-        raise HTTPException(status_code = 503, detail = 'Erro de conexão.')
-    except Exception as e:
-        raise HTTPException(status_code = 500, detail = f'Erro desconhecido: {e}')
+        return await get_core_banco().atualizar_saldo(documento, novo_saldo, chave_idempotencia = chave_idempotencia, if_match = if_match)
+    except ErroCoreBanco as e:
+        #If-Match desatualizado: repassa o detalhe e o ETag atual do core
+        if e.status_code == 412:
+            raise
+        raise HTTPException(status_code = e.status_code, detail = 'Erro de conexão.' if e.status_code == 503 else 'Erro ao atualizar saldo.')
     
     
     
 #atualizar dados do cliente
 @app.patch('/clientes/atualizar/{documento}')
-def atualizar_cliente_app(documento: str, nome: str, telefone: str):
-    params_update_cliente = {
-        "nome": nome,
-        "telefone": telefone
-    }
+async def atualizar_cliente_app(documento: str, nome: str, telefone: str):
     try:
-        resposta = requests.patch(f'{URL_CORE_BANCO}/clientes/{documento}', params = params_update_cliente)
-        if resposta.status_code != 200:
-            raise HTTPException(status_code = resposta.status_code, detail = 'Erro ao atualizar cliente.')
-        return resposta.json()
-    except requests.exceptions.ConnectionError: 
-        raise HTTPException(status_code=503, detail='Erro de conexão.')
-    except Exception as e:
-        raise HTTPException(status_code = 500, detail = f'Erro: {e}')
+        return await get_core_banco().atualizar_cliente(documento, nome, telefone)
+    except ErroCoreBanco as e:
+        raise HTTPException(status_code = e.status_code, detail = 'Erro de conexão.' if e.status_code == 503 else 'Erro ao atualizar cliente.')
 
-#cálculo do score de crédito
+#score de crédito, calculado e guardado pelo core
 @app.get('/contas/score/{documento}')
-def calcular_score_app(documento: str):
-    try:
-        resposta = requests.get(f'{URL_CORE_BANCO}/contas/{documento}')
-        
-        if resposta.status_code == 404:
-             raise HTTPException(status_code=404, detail='Conta não localizada.')
-        
-        dados_conta = resposta.json()
-        saldo = dados_conta.get('saldo_cc')
-        
-        score = calcular_score(saldo)
-        
-        return {
-            "documento": documento, 
-            "score_credito": score
-        }
-
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=503, detail=f"Erro de conexão com o servidor api_banco: {e}")
+async def calcular_score_app(documento: str):
+    score = await get_core_banco().score(documento)
+    if score is None:
+        raise HTTPException(status_code=404, detail='Conta não localizada.')
+    return score
 
 #excluir cadastro
 @app.delete('/clientes/excluir/{documento}')
-def delete_cliente(documento: str):
+async def delete_cliente(documento: str):
     try:
-        #verifica o saldo da conta antes da exclusão
-        resposta_delete = requests.delete(f'{URL_CORE_BANCO}/clientes/{documento}')
-        if resposta_delete.status_code != 200:
-            raise HTTPException(status_code = resposta_delete.status_code, detail = f'Erro inesperado.')
+        await get_core_banco().excluir_cliente(documento)
         return('Cadastro excluído com sucesso!')
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code = 503, detail = f'Erro na exclusão do banco de dados: {e}')
+    except ErroCoreBanco as e:
+        if e.status_code == 503:
+            raise HTTPException(status_code = 503, detail = f'Erro na exclusão do banco de dados: {e.detalhe}')
+        raise HTTPException(status_code = e.status_code, detail = f'Erro inesperado.')
     
 
 
     
 #buscar número da conta pelo doc do cliente
 @app.get('/contas/numero/{documento}')
-def buscar_numero_conta(documento: str):    
-    resposta = requests.get(f'{URL_CORE_BANCO}/contas/{documento}')
-    if resposta.status_code != 200:
+async def buscar_numero_conta(documento: str, response: Response):    
+    dados_conta = await get_core_banco().buscar_conta(documento)
+    if not dados_conta:
         raise HTTPException(status_code = 404, detail = 'Nenhuma conta vinculada ao cliente informado.')
-    dados_conta = resposta.json()
+    #ETag da conta, para o If-Match de /contas/atualizar-saldo
+    response.headers['ETag'] = f'"{dados_conta["versao"]}"'
     return {'Conta: ': dados_conta['numero_conta']}
 
 #buscar inestidor
 @app.get('/investidor/{documento}')
-def busca_investidor(documento: str):
-    try:
-        resposta = requests.get(f'{URL_CORE_BANCO}/clientes/investidor/{documento}')
-        if resposta.status_code == 404:
-            raise HTTPException(status_code = 404, detail = 'Nenhum investidor encontrado.')
-        return resposta.json()
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code = 503, detail = f'Erro ao buscar investidor: {e}')
+async def busca_investidor(documento: str):
+    investidor = await get_core_banco().buscar_investidor(documento)
+    if investidor is None:
+        raise HTTPException(status_code = 404, detail = 'Nenhum investidor encontrado.')
+    return investidor
     
 
 
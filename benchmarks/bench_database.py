@@ -0,0 +1,95 @@
+"""Micro-benchmarks (pytest-benchmark) das funções de services/database.py sobre uma base semeada.
+
+Uso: python -m pytest benchmarks/bench_database.py --benchmark-json benchmarks/resultados/database.json
+Comparação: python -m pytest benchmarks/bench_database.py --benchmark-compare --benchmark-autosave
+O nome do arquivo não segue test_*.py, então a suíte normal (tests/) não roda estes benchmarks.
+"""
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from benchmarks.dados import FonteCotacoesFalsa
+from benchmarks.gerador import semear, termo_busca
+from services import database, market_service
+from services.posicao_service import posicao_cliente
+
+CLIENTES = 2000
+
+
+@pytest.fixture(scope='module')
+def documentos(tmp_path_factory):
+    db_original = database.DB_FILE
+    database.iniciar_pool(tmp_path_factory.mktemp('bench') / 'bench.db')
+    database.create_tables()
+    market_service.configurar_fonte(FonteCotacoesFalsa())
+    docs = semear(CLIENTES)
+    yield docs
+    database.iniciar_pool(db_original)
+
+
+#cada rodada consulta um documento diferente, na mesma ordem entre execuções
+@pytest.fixture
+def proximo_documento(documentos):
+    aleatorio = random.Random(7)
+    return itertools.cycle(aleatorio.sample(documentos, len(documentos))).__next__
+
+
+@pytest.fixture
+def sem_cache():
+    database.CACHE_CONSULTAS, original = False, database.CACHE_CONSULTAS
+    yield
+    database.CACHE_CONSULTAS = original
+
+
+def test_busca_cliente(benchmark, proximo_documento):
+    assert benchmark(lambda: database.busca_cliente(proximo_documento()))
+
+
+def test_busca_cliente_sem_cache(benchmark, proximo_documento, sem_cache):
+    assert benchmark(lambda: database.busca_cliente(proximo_documento()))
+
+
+def test_busca_conta(benchmark, proximo_documento):
+    assert benchmark(lambda: database.busca_conta(proximo_documento()))
+
+
+def test_busca_investidor(benchmark, proximo_documento):
+    assert benchmark(lambda: database.busca_investidor_db(proximo_documento()))
+
+
+def test_busca_cliente_por_nome(benchmark, proximo_documento):
+    assert benchmark(lambda: database.busca_cliente_por_nome(termo_busca(proximo_documento())))
+
+
+def test_pagina_investimentos(benchmark, proximo_documento):
+    assert benchmark(lambda: database.pagina_investimentos_doc(proximo_documento(), 20))
+
+
+def test_extrato(benchmark, proximo_documento):
+    assert benchmark(lambda: database.extrato_db(proximo_documento(), 'CONTA', 20))
+
+
+def test_posicao_cliente(benchmark, proximo_documento):
+    assert benchmark(lambda: posicao_cliente(proximo_documento()))
+
+
+def test_novo_investimento(benchmark, proximo_documento):
+    assert benchmark(lambda: database.novo_investimento_db(proximo_documento(), 'RENDA FIXA', 1.0, 0.1, True))
+
+
+def test_inserir_clientes_lote(benchmark):
+    sequencia = itertools.count(90000000000, 1000)
+
+    def cadastrar():
+        inicio = next(sequencia)
+        return database.inserir_clientes_lote([
+            {"nome": f'Lote {inicio + i}', "telefone": '11999999999', "documento": str(inicio + i),
+             "correntista": True, "investidor": False, "saldo_cc": 10.0}
+            for i in range(1000)
+        ])
+
+    inseridos, erros = benchmark.pedantic(cadastrar, rounds=5, iterations=1)
+    assert inseridos == 1000 and not erros
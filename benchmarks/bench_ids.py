@@ -0,0 +1,102 @@
+"""Compara a vazão de inserção com o esquema antigo de ids (número de conta sorteado e
+uuid4) e o novo (sequência com dígito verificador e UUIDv7).
+
+Cada gerador grava num banco novo `--investimentos` posições e `--contas` contas, em
+transações de `--lote` linhas. Além das linhas por segundo no total e no último décimo
+(quando o índice da chave já não cabe no cache), mostra o tamanho final do arquivo e,
+nas contas, quantos números sorteados colidiram.
+
+Uso: python -m benchmarks.bench_ids [--investimentos 500000] [--contas 200000] [--lote 5000]
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from services import database
+from services.identificadores import GERADORES, configurar_gerador, get_gerador
+
+
+def _medir(linhas: int, lote: int, gravar) -> dict:
+    tempos = []
+    for inicio in range(0, linhas, lote):
+        quantidade = min(lote, linhas - inicio)
+        comeco = time.perf_counter()
+        with database.transacao() as conn:
+            gravar(conn, inicio, quantidade)
+        tempos.append((quantidade, time.perf_counter() - comeco))
+    ultimos = tempos[-max(len(tempos) // 10, 1):]
+    return {
+        "linhas_por_segundo": round(linhas / sum(t for _, t in tempos), 1),
+        "linhas_por_segundo_ultimo_decimo": round(sum(q for q, _ in ultimos) / sum(t for _, t in ultimos), 1),
+    }
+
+
+def medir_gerador(nome: str, pasta: Path, investimentos: int, contas: int, lote: int) -> dict:
+    database.iniciar_pool(pasta / f'ids_{nome}.db', tamanho=1)
+    database.create_tables()
+    configurar_gerador(GERADORES[nome]())
+    gerador = get_gerador()
+    with database.get_connection() as conn:
+        #carga descartável: mede o índice, não o fsync
+        conn.execute('PRAGMA synchronous = OFF;')
+        conn.executemany(
+            'INSERT INTO "clientes" (nome, telefone, documento, correntista, investidor) VALUES (?, ?, ?, 1, 1)',
+            [(f'Cliente {i}', '11999999999', str(10 ** 10 + i)) for i in range(contas)]
+        )
+
+    def gravar_investimentos(conn, inicio, quantidade):
+        conn.executemany(
+            'INSERT INTO "investimento" (id_investimento, documento, tipo, valor_investido, rentabilidade, ativo) VALUES (?, ?, \'RENDA FIXA\', 100.0, 0.01, 1)',
+            [(gerador.id_investimento(), str(10 ** 10 + i % max(contas, 1))) for i in range(inicio, inicio + quantidade)]
+        )
+
+    colisoes = 0
+
+    def gravar_contas(conn, inicio, quantidade):
+        nonlocal colisoes
+        numeros = gerador.numeros_conta(conn, quantidade)
+        gravadas = conn.executemany(
+            'INSERT OR IGNORE INTO "contas" (documento, numero_conta, saldo_cc) VALUES (?, ?, 0.0)',
+            [(str(10 ** 10 + i), numero) for i, numero in zip(range(inicio, inicio + quantidade), numeros)]
+        ).rowcount
+        colisoes += quantidade - gravadas
+
+    resultado = {
+        "investimento": _medir(investimentos, lote, gravar_investimentos),
+        "contas": _medir(contas, lote, gravar_contas),
+    }
+    resultado['contas']['colisoes'] = colisoes
+    with database.get_connection() as conn:
+        resultado['tamanho_mb'] = round(
+            conn.execute('PRAGMA page_count;').fetchone()[0] * conn.execute('PRAGMA page_size;').fetchone()[0] / 2 ** 20, 1
+        )
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--investimentos', type=int, default=500000)
+    parser.add_argument('--contas', type=int, default=200000)
+    parser.add_argument('--lote', type=int, default=5000)
+    args = parser.parse_args()
+    #cada lote passa do limite do log de sql lento; aqui só interessa o total
+    logging.getLogger('services.sql').setLevel(logging.ERROR)
+
+    db_original, gerador_original = database.DB_FILE, get_gerador()
+    resultados = {}
+    try:
+        with tempfile.TemporaryDirectory() as pasta:
+            for nome in ('aleatorio', 'sequencial'):
+                resultados[nome] = medir_gerador(nome, Path(pasta), args.investimentos, args.contas, args.lote)
+            database.fechar_pool()
+    finally:
+        configurar_gerador(gerador_original)
+        database.iniciar_pool(db_original)
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compara requisições por segundo do api_banco com conexão-por-chamada e com o pool.
+
+Sobe o api_banco (uvicorn, pelo harness de benchmarks.carga) duas vezes sobre a mesma
+base semeada: com BANCO_POOL_REUTILIZAR=0, cada bloco abre e fecha a sua conexão; com 1,
+as conexões do pool são reaproveitadas. O cache de consultas fica desligado nas duas,
+para toda requisição chegar ao banco.
+
+Uso: python -m benchmarks.bench_pool [--clientes 2000] [--duracao 5] [--concorrencia 16]
+"""
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.carga import CENARIOS, executar_cenario, parar_servicos, subir_servicos
+from benchmarks.gerador import semear
+from services import database
+
+#leituras do core que passam pelo pool a cada requisição
+LEITURAS = ('core: cliente por documento', 'core: conta', 'core: extrato')
+
+
+async def medir(url: str, documentos: List[str], duracao: float, concorrencia: int) -> Dict[str, float]:
+    vazao = {}
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=30) as cliente:
+        for nome, _, metodo, caminho in (cenario for cenario in CENARIOS if cenario[0] in LEITURAS):
+            #aquecimento: conexões keep-alive e páginas do sqlite em memória
+            await executar_cenario(cliente, url, metodo, caminho, documentos, min(1.0, duracao), concorrencia)
+            vazao[nome] = (await executar_cenario(cliente, url, metodo, caminho, documentos, duracao, concorrencia))['vazao_rps']
+    return vazao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--duracao', type=float, default=5.0, help='segundos por cenário')
+    parser.add_argument('--concorrencia', type=int, default=16)
+    args = parser.parse_args()
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        db_file = Path(pasta) / 'bench.db'
+        database.iniciar_pool(db_file)
+        database.create_tables()
+        documentos = semear(args.clientes)
+        database.fechar_pool()
+
+        for reutilizar in ('0', '1'):
+            urls, processos = subir_servicos(db_file, 'remoto', 0.0, servicos=('api_banco',), ambiente={
+                "BANCO_POOL_REUTILIZAR": reutilizar, "BANCO_CACHE_CONSULTAS": '0',
+            })
+            try:
+                resultados[reutilizar] = asyncio.run(medir(urls['api_banco'], documentos, args.duracao, args.concorrencia))
+            finally:
+                parar_servicos(processos)
+
+    for nome in resultados['1']:
+        antes, depois = resultados['0'][nome], resultados['1'][nome]
+        print(f'{nome:30s} conexão por chamada: {antes:8.1f} req/s   pool: {depois:8.1f} req/s ({depois / antes:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
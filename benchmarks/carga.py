@@ -0,0 +1,206 @@
+"""Teste de carga das três APIs contra uma base semeada, com cotações falsas.
+
+Sobe api_banco, app e api_investimento em subprocessos (uvicorn), dispara
+requisições concorrentes por cenário durante alguns segundos e grava p50/p95/p99
+e vazão de cada endpoint em JSON, junto com o commit, para comparar entre versões.
+
+Uso: python -m benchmarks.carga [--clientes 1000] [--duracao 10] [--concorrencia 16]
+                                [--core-modo remoto] [--saida benchmarks/resultados]
+Base grande: python -m benchmarks.gerador --clientes 1000000 --db /tmp/banco_1m.db
+             python -m benchmarks.carga --db /tmp/banco_1m.db  (os cenários de escrita alteram essa base)
+Comparação: python -m benchmarks.comparar antes.json depois.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+
+from benchmarks.dados import TICKERS
+from benchmarks.gerador import documentos_investidores, semear, termo_busca
+from services import database
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+#(nome, serviço, método, caminho a partir de um documento sorteado)
+CENARIOS: List[Tuple[str, str, str, Callable[[str], str]]] = [
+    ('core: cliente por documento', 'api_banco', 'GET', lambda doc: f'/clientes/{doc}'),
+    ('core: conta', 'api_banco', 'GET', lambda doc: f'/contas/{doc}'),
+    ('core: busca por nome', 'api_banco', 'GET', lambda doc: f'/clientes/busca/nome?nome={quote(termo_busca(doc))}'),
+    ('core: extrato', 'api_banco', 'GET', lambda doc: f'/contas/{doc}/extrato?limite=20'),
+    ('core: investimentos paginados', 'api_banco', 'GET', lambda doc: f'/investimento/{doc}/pagina?limite=20'),
+    ('core: posição', 'api_banco', 'GET', lambda doc: f'/investimento/{doc}/posicao'),
+    ('core: score', 'api_banco', 'GET', lambda doc: f'/contas/score/{doc}'),
+    ('core: novo investimento', 'api_banco', 'POST', lambda doc: f'/investimento/novo?documento={doc}&tipo=RENDA%20FIXA&valor_investido=1&ativo=true'),
+    ('gateway: cliente por documento', 'app', 'GET', lambda doc: f'/clientes/{doc}'),
+    ('gateway: número da conta', 'app', 'GET', lambda doc: f'/contas/numero/{doc}'),
+    ('gateway: score', 'app', 'GET', lambda doc: f'/contas/score/{doc}'),
+    ('investimentos: lista', 'api_investimento', 'GET', lambda doc: f'/investimento/{doc}'),
+    ('investimentos: posição', 'api_investimento', 'GET', lambda doc: f'/investimento/{doc}/posicao'),
+    ('investimentos: cotações', 'api_investimento', 'GET', lambda doc: f'/investimento/cotacoes?tickers={",".join(TICKERS)}'),
+]
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+#`servicos` e `ambiente` permitem subir só parte das APIs ou com outra configuração (ex.: benchmarks.bench_pool)
+def subir_servicos(db_file: Path, core_modo: str, atraso_cotacao: float,
+                   servicos: Tuple[str, ...] = ('api_banco', 'app', 'api_investimento'),
+                   ambiente: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], List[subprocess.Popen]]:
+    portas = {servico: porta_livre() for servico in servicos}
+    ambiente = {
+        **os.environ,
+        "BANCO_DB_FILE": str(db_file),
+        "URL_CORE_BANCO": f'http://127.0.0.1:{portas.get("api_banco", porta_livre())}',
+        "BANCO_CORE_MODO": core_modo,
+        **(ambiente or {}),
+    }
+    processos = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.servidor', servico, str(porta), '--atraso-cotacao', str(atraso_cotacao)],
+            cwd=RAIZ, env=ambiente
+        )
+        for servico, porta in portas.items()
+    ]
+    urls = {servico: f'http://127.0.0.1:{porta}' for servico, porta in portas.items()}
+    limite = time.monotonic() + 30
+    for url in urls.values():
+        while True:
+            try:
+                httpx.get(f'{url}/docs', timeout=1)
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > limite:
+                    parar_servicos(processos)
+                    raise RuntimeError(f'Serviço não respondeu: {url}')
+                time.sleep(0.2)
+    return urls, processos
+
+
+def parar_servicos(processos: List[subprocess.Popen]) -> None:
+    for processo in processos:
+        processo.terminate()
+    for processo in processos:
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+
+#`concorrencia` clientes em laço fechado durante `duracao` segundos; cada um sorteia um documento por requisição
+async def executar_cenario(cliente: httpx.AsyncClient, url: str, metodo: str, caminho: Callable[[str], str],
+                           documentos: List[str], duracao: float, concorrencia: int) -> Dict[str, float]:
+    latencias: List[float] = []
+    erros = 0
+    fim = time.perf_counter() + duracao
+
+    async def usuario(semente: int):
+        nonlocal erros
+        aleatorio = random.Random(semente)
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.request(metodo, url + caminho(aleatorio.choice(documentos)))
+                if resposta.status_code >= 400:
+                    erros += 1
+            except httpx.HTTPError:
+                erros += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(usuario(i) for i in range(concorrencia)))
+    decorrido = time.perf_counter() - inicio
+    ms = np.array(latencias) * 1000
+    return {
+        "requisicoes": len(latencias),
+        "erros": erros,
+        "vazao_rps": round(len(latencias) / decorrido, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+async def executar_cenarios(urls: Dict[str, str], documentos: List[str], duracao: float, concorrencia: int, filtro: str) -> List[Dict]:
+    resultados = []
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=30) as cliente:
+        for nome, servico, metodo, caminho in CENARIOS:
+            if filtro and filtro not in nome:
+                continue
+            #aquecimento: caches, conexões keep-alive e o primeiro cálculo de score/cotação
+            await executar_cenario(cliente, urls[servico], metodo, caminho, documentos, min(1.0, duracao), concorrencia)
+            metricas = await executar_cenario(cliente, urls[servico], metodo, caminho, documentos, duracao, concorrencia)
+            resultados.append({"cenario": nome, "servico": servico, "metodo": metodo, **metricas})
+            print(f'{nome:35s} {metricas["vazao_rps"]:9.1f} req/s  p50 {metricas["p50_ms"]:7.2f}  '
+                  f'p95 {metricas["p95_ms"]:7.2f}  p99 {metricas["p99_ms"]:7.2f} ms  erros {metricas["erros"]}')
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=1000, help='clientes semeados, ou documentos sorteados com --db')
+    parser.add_argument('--db', type=Path, help='base já gerada (benchmarks.gerador); padrão: semeia uma base temporária')
+    parser.add_argument('--duracao', type=float, default=10.0, help='segundos por cenário')
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--core-modo', choices=('remoto', 'local'), default='remoto')
+    parser.add_argument('--atraso-cotacao', type=float, default=0.0, help='latência simulada do provedor (s)')
+    parser.add_argument('--cenario', default='', help='roda só os cenários que contêm este texto')
+    parser.add_argument('--saida', type=Path, default=RAIZ / 'benchmarks' / 'resultados')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db_file = args.db or Path(pasta) / 'carga.db'
+        database.iniciar_pool(db_file)
+        database.create_tables()
+        documentos = documentos_investidores(args.clientes) if args.db else semear(args.clientes)
+        database.fechar_pool()
+
+        urls, processos = subir_servicos(db_file, args.core_modo, args.atraso_cotacao)
+        try:
+            cenarios = asyncio.run(executar_cenarios(urls, documentos, args.duracao, args.concorrencia, args.cenario))
+        finally:
+            parar_servicos(processos)
+
+    commit = commit_atual()
+    resultado = {
+        "commit": commit,
+        "data": datetime.now().isoformat(timespec='seconds'),
+        "parametros": {
+            "clientes": args.clientes, "db": str(args.db or ''), "duracao": args.duracao, "concorrencia": args.concorrencia,
+            "core_modo": args.core_modo, "atraso_cotacao": args.atraso_cotacao,
+        },
+        "cenarios": cenarios,
+    }
+    args.saida.mkdir(parents=True, exist_ok=True)
+    arquivo = args.saida / f'carga-{datetime.now():%Y%m%d-%H%M%S}-{commit or "sem-commit"}.json'
+    arquivo.write_text(json.dumps(resultado, ensure_ascii=False, indent=2))
+    print(f'resultados em {arquivo}')
+
+
+if __name__ == '__main__':
+    main()
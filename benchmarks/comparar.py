@@ -0,0 +1,58 @@
+"""Compara dois resultados do teste de carga (benchmarks.carga) cenário a cenário.
+
+Uso: python -m benchmarks.comparar ANTES.json DEPOIS.json [--tolerancia 0.10] [--metrica p95_ms]
+Sai com código 1 se algum cenário piorou além da tolerância (latência maior ou vazão menor).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+METRICAS = ('p50_ms', 'p95_ms', 'p99_ms', 'vazao_rps')
+
+
+def carregar(arquivo: Path) -> Dict[str, Dict]:
+    return {cenario['cenario']: cenario for cenario in json.loads(arquivo.read_text())['cenarios']}
+
+
+#variação relativa orientada para "pior": positiva quando a latência sobe ou a vazão cai
+def piora(metrica: str, antes: float, depois: float) -> float:
+    if not antes:
+        return 0.0
+    variacao = (depois - antes) / antes
+    return -variacao if metrica == 'vazao_rps' else variacao
+
+
+def comparar(antes: Dict[str, Dict], depois: Dict[str, Dict], metricas: List[str], tolerancia: float) -> List[str]:
+    regressoes = []
+    print(f'{"cenário":35s} ' + '  '.join(f'{m:>22s}' for m in metricas))
+    for nome in [nome for nome in antes if nome in depois]:
+        colunas = []
+        for metrica in metricas:
+            a, d = antes[nome][metrica], depois[nome][metrica]
+            p = piora(metrica, a, d)
+            marca = '!' if p > tolerancia else ' '
+            colunas.append(f'{a:8.2f} -> {d:8.2f} {p:+5.0%}{marca}')
+            if p > tolerancia:
+                regressoes.append(f'{nome}: {metrica} {a} -> {d} ({p:+.0%})')
+        print(f'{nome:35s} ' + '  '.join(colunas))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('antes', type=Path)
+    parser.add_argument('depois', type=Path)
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='piora relativa aceita (0.10 = 10%%)')
+    parser.add_argument('--metrica', action='append', choices=METRICAS, help='padrão: p95_ms e vazao_rps')
+    args = parser.parse_args()
+
+    regressoes = comparar(carregar(args.antes), carregar(args.depois), args.metrica or ['p95_ms', 'vazao_rps'], args.tolerancia)
+    if regressoes:
+        print('\nRegressões:\n' + '\n'.join(regressoes))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Cotações falsas compartilhadas pelos benchmarks."""
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from services.market_service import FonteCotacoes
+
+TICKERS = ['PETR4.SA', 'VALE3.SA', 'ITUB4.SA', 'BBDC4.SA', 'WEGE3.SA', 'ABEV3.SA', 'BBAS3.SA', 'MGLU3.SA']
+
+
+def cotacao_falsa(ticker: str) -> Dict[str, Any]:
+    return {"preco": round(10 + zlib.crc32(ticker.encode()) % 9000 / 100, 2), "ticker": ticker}
+
+
+#preço fixo por ticker (derivado do nome), sem rede; `atraso` (s) simula a latência do provedor por chamada
+class FonteCotacoesFalsa(FonteCotacoes):
+    nome = 'falsa'
+
+    def __init__(self, atraso: float = 0.0):
+        self.atraso = atraso
+
+    def buscar(self, ticker: str) -> Optional[Dict[str, Any]]:
+        time.sleep(self.atraso)
+        return cotacao_falsa(ticker)
+
+    def buscar_varios(self, tickers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        time.sleep(self.atraso)
+        return {ticker: cotacao_falsa(ticker) for ticker in tickers}
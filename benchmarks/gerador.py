@@ -0,0 +1,313 @@
+"""Gera uma base sintética com volume realista: clientes, contas, investidores e investimentos.
+
+CPFs com dígitos verificadores válidos e sem repetição, celulares com DDD, perfis de
+investidor e tipos de investimento sorteados pelas distribuições abaixo. Tudo é gerado
+com numpy em lotes e gravado com executemany, uma transação por lote. A mesma semente,
+o mesmo --lote e a mesma --data-final produzem os mesmos registros.
+
+Uso: python -m benchmarks.gerador --clientes 1000000 --db /tmp/banco_1m.db
+                                  [--semente 42] [--investimentos 3] [--correntistas 0.9]
+                                  [--investidores 0.4] [--anos 5] [--sem-lancamentos]
+"""
+import argparse
+import json
+import time
+import unicodedata
+from datetime import date
+from itertools import count
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.dados import TICKERS, cotacao_falsa
+from models.schemas import RENTABILIDADE_PERFIL, PerfilEnum, TipoEnum
+from services import database
+from services.identificadores import DIGITOS_CONTA, uuid7
+
+NOMES = [
+    'Ana', 'Maria', 'Juliana', 'Fernanda', 'Patrícia', 'Aline', 'Camila', 'Bruna', 'Amanda', 'Letícia',
+    'Beatriz', 'Larissa', 'Gabriela', 'Mariana', 'Vanessa', 'Débora', 'Luíza', 'Helena', 'Sônia', 'Cláudia',
+    'José', 'João', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas', 'Luiz', 'Marcos',
+    'Gabriel', 'Rafael', 'Daniel', 'Marcelo', 'Bruno', 'Eduardo', 'Felipe', 'Rodrigo', 'Gustavo', 'Mateus',
+    'André', 'Fábio', 'Vinícius', 'Leonardo', 'Thiago', 'Diego', 'Ricardo', 'Sérgio', 'Otávio', 'Caio',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+    'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas',
+    'Cardoso', 'Ramos', 'Gonçalves', 'Santana', 'Teixeira', 'Araújo', 'Correia', 'Pinto', 'Cavalcanti', 'Monteiro',
+]
+DOMINIOS = ['gmail.com', 'hotmail.com', 'outlook.com', 'yahoo.com.br', 'uol.com.br']
+DDDS = [11, 12, 13, 19, 21, 24, 27, 31, 34, 41, 43, 47, 48, 51, 54, 61, 62, 65, 67, 71, 79, 81, 85, 91, 92, 98]
+
+DISTRIBUICAO_PERFIS = {PerfilEnum.CONSERVADOR: 0.5, PerfilEnum.MODERADO: 0.35, PerfilEnum.ARROJADO: 0.15}
+DISTRIBUICAO_TIPOS = {TipoEnum.RENDA_FIXA: 0.45, TipoEnum.ACOES: 0.3, TipoEnum.FUNDOS: 0.15, TipoEnum.CRIPTO: 0.1}
+TICKERS_TIPO = {
+    TipoEnum.ACOES: TICKERS,
+    TipoEnum.FUNDOS: ['HGLG11.SA', 'KNRI11.SA', 'XPLG11.SA', 'MXRF11.SA', 'VISC11.SA'],
+    TipoEnum.CRIPTO: ['BTC-USD', 'ETH-USD', 'SOL-USD', 'ADA-USD'],
+}
+#fração das posições já encerradas (ativo = 0)
+FRACAO_INATIVOS = 0.1
+GERADOR_LOTE = 50000
+GATILHOS_SUSPENSOS = ['clientes_fts_insert', 'score_credito_invalidar']
+
+#bijeção afim índice -> CPF (multiplicador primo com o módulo): sem repetição e sem ordem aparente
+_MULTIPLICADOR_CPF = 387420489
+
+
+def _sem_acento(texto: str) -> str:
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+
+
+#dígitos verificadores do CPF para um vetor de bases de 9 dígitos; devolve os CPFs com 11 dígitos
+def calcular_cpfs(bases: np.ndarray) -> np.ndarray:
+    digitos = (bases[:, None] // 10 ** np.arange(8, -1, -1)) % 10
+
+    def verificador(d: np.ndarray) -> np.ndarray:
+        resto = (d * np.arange(d.shape[1] + 1, 1, -1)).sum(axis=1) % 11
+        return np.where(resto < 2, 0, 11 - resto)
+
+    dv1 = verificador(digitos)
+    dv2 = verificador(np.column_stack([digitos, dv1]))
+    return np.char.zfill((bases * 100 + dv1 * 10 + dv2).astype(str), 11)
+
+
+#números de conta como os de identificadores.formatar_numero_conta: sequencial + dígito módulo 11
+def calcular_numeros_conta(sequenciais: np.ndarray) -> np.ndarray:
+    digitos = (sequenciais[:, None] // 10 ** np.arange(DIGITOS_CONTA - 1, -1, -1)) % 10
+    resto = (digitos * (2 + np.arange(DIGITOS_CONTA - 1, -1, -1) % 8)).sum(axis=1) % 11
+    dv = np.where(resto < 2, 0, 11 - resto)
+    return np.char.zfill((sequenciais * 10 + dv).astype(str), DIGITOS_CONTA + 1)
+
+
+def cpf_valido(cpf: str) -> bool:
+    if len(cpf) != 11 or not cpf.isdigit() or len(set(cpf)) == 1:
+        return False
+    return str(calcular_cpfs(np.array([int(cpf[:9])]))[0]) == cpf
+
+
+#bases dos CPFs dos clientes `indices`; as 10 bases com dígitos repetidos (000000000, 111111111...)
+#são inválidas e trocadas por índices reservados do fim do intervalo
+def _bases_cpf(indices: np.ndarray, deslocamento: int, reserva: count) -> np.ndarray:
+    bases = (indices * _MULTIPLICADOR_CPF + deslocamento) % 10 ** 9
+    for posicao in np.flatnonzero(bases % 111111111 == 0):
+        while bases[posicao] % 111111111 == 0:
+            bases[posicao] = (next(reserva) * _MULTIPLICADOR_CPF + deslocamento) % 10 ** 9
+    return bases
+
+
+#um lote de clientes a partir do índice `inicio`; devolve as linhas de cada tabela prontas para o executemany
+def _gerar_lote(rng: np.random.Generator, inicio: int, quantidade: int, deslocamento: int, reserva: count,
+                correntistas: float, investidores: float, investimentos: float, inativos: float, anos: int,
+                data_final: str) -> Dict[str, List[tuple]]:
+    indices = np.arange(inicio, inicio + quantidade, dtype=np.int64)
+    documentos = calcular_cpfs(_bases_cpf(indices, deslocamento, reserva))
+
+    primeiro = rng.integers(len(NOMES), size=quantidade)
+    meio, ultimo = rng.integers(len(SOBRENOMES), size=(2, quantidade))
+    nomes = np.array(NOMES, dtype=object)[primeiro] + ' ' + np.array(SOBRENOMES, dtype=object)[meio] + ' ' + np.array(SOBRENOMES, dtype=object)[ultimo]
+    emails = (
+        np.array([_sem_acento(n) for n in NOMES], dtype=object)[primeiro] + '.'
+        + np.array([_sem_acento(s) for s in SOBRENOMES], dtype=object)[ultimo]
+        + indices.astype(str).astype(object) + '@' + np.array(DOMINIOS, dtype=object)[rng.integers(len(DOMINIOS), size=quantidade)]
+    )
+    telefones = (np.array(DDDS)[rng.integers(len(DDDS), size=quantidade)] * 10 ** 9 + 9 * 10 ** 8
+                 + rng.integers(10 ** 8, size=quantidade)).astype(str)
+
+    #todo investidor é correntista: o investimento é debitado da conta
+    correntista = rng.random(quantidade) < correntistas
+    investidor = correntista & (rng.random(quantidade) < investidores / max(correntistas, 1e-9))
+    saldos = np.round(rng.lognormal(8.0, 1.2, quantidade), 2)
+    #a sequência "contas" continua de onde a base parou (ver gerar_base)
+    contas = calcular_numeros_conta(indices + 1)
+    perfis = np.array([p.value for p in DISTRIBUICAO_PERFIS], dtype=object)[
+        rng.choice(len(DISTRIBUICAO_PERFIS), size=quantidade, p=list(DISTRIBUICAO_PERFIS.values()))
+    ]
+
+    #ao menos uma posição por investidor; o resto segue uma Poisson com a média pedida
+    dono = np.flatnonzero(investidor)
+    por_investidor = 1 + rng.poisson(max(investimentos - 1, 0), size=len(dono))
+    dono = np.repeat(dono, por_investidor)
+    total = len(dono)
+    tipos = np.array(list(DISTRIBUICAO_TIPOS), dtype=object)[
+        rng.choice(len(DISTRIBUICAO_TIPOS), size=total, p=list(DISTRIBUICAO_TIPOS.values()))
+    ]
+    valores = np.round(rng.lognormal(7.5, 1.0, total), 2)
+    ativos = rng.random(total) >= inativos
+    segundos = rng.integers(anos * 365 * 86400, size=total)
+    instantes = np.datetime64(data_final, 's') - segundos.astype('timedelta64[s]')
+    datas = np.char.replace(np.datetime_as_string(instantes, unit='s'), 'T', ' ')
+    milissegundos = instantes.astype(np.int64) * 1000
+    sorteio = rng.random(total)
+    ids = rng.bytes(10 * total)
+    renda_fixa = {p.value: RENTABILIDADE_PERFIL[p] for p in PerfilEnum}
+
+    #patrimônio = soma das posições ativas, como se cada aplicação tivesse passado por novo_investimento_db
+    patrimonio = np.round(np.bincount(dono, weights=valores * ativos, minlength=quantidade), 2)
+    documentos, nomes, telefones, contas, perfis = (a.tolist() for a in (documentos, nomes, telefones, contas, perfis))
+    emails, saldos, patrimonio, correntista, investidor = (a.tolist() for a in (emails, saldos, patrimonio, correntista, investidor))
+
+    investimento, lancamentos = [], []
+    linhas = zip(dono.tolist(), tipos, valores.tolist(), ativos.tolist(), datas.tolist(), milissegundos.tolist(), sorteio.tolist())
+    for i, (j, tipo, valor, ativo, data, ms, sorte) in enumerate(linhas):
+        #UUIDv7 com o instante da aplicação, como se tivesse sido criado por novo_investimento_db naquele dia
+        id_investimento = uuid7(ms, ids[10 * i:10 * i + 10])
+        if tipo is TipoEnum.RENDA_FIXA:
+            ticker, rentabilidade, preco = None, renda_fixa[perfis[j]], None
+        else:
+            opcoes = TICKERS_TIPO[tipo]
+            ticker = opcoes[int(sorte * len(opcoes))]
+            rentabilidade, preco = 0.0, round(cotacao_falsa(ticker)['preco'] * (0.7 + 0.6 * sorte), 2)
+        investimento.append((id_investimento, documentos[j], tipo.value, ticker, valor, data, rentabilidade, int(ativo), preco))
+        lancamentos.append((documentos[j], 'INVESTIMENTO', id_investimento, 'ABERTURA', valor, valor))
+
+    clientes, contas_linhas, investidores_linhas = [], [], []
+    for i in range(quantidade):
+        documento, nome, telefone = documentos[i], nomes[i], telefones[i]
+        clientes.append((nome, telefone, documento, int(correntista[i]), int(investidor[i])))
+        if correntista[i]:
+            contas_linhas.append((documento, contas[i], saldos[i]))
+            lancamentos.append((documento, 'CONTA', contas[i], 'ABERTURA', saldos[i], saldos[i]))
+        if investidor[i]:
+            investidores_linhas.append((documento, nome, telefone, emails[i], patrimonio[i], perfis[i]))
+            if patrimonio[i]:
+                lancamentos.append((documento, 'INVESTIDOR', documento, 'ABERTURA', patrimonio[i], patrimonio[i]))
+    return {
+        "clientes": clientes,
+        "contas": contas_linhas,
+        "investidor": investidores_linhas,
+        "investimento": investimento,
+        "lancamentos": lancamentos,
+    }
+
+
+#cada tabela em ordem de documento: as inserções caem em páginas vizinhas dos índices
+def _gravar_lote(conn, linhas: Dict[str, List[tuple]], lancamentos: bool) -> None:
+    conn.executemany(
+        'INSERT INTO "clientes" (nome, telefone, documento, correntista, investidor) VALUES (?, ?, ?, ?, ?)',
+        sorted(linhas['clientes'], key=itemgetter(2))
+    )
+    conn.executemany('INSERT INTO "contas" (documento, numero_conta, saldo_cc) VALUES (?, ?, ?)', sorted(linhas['contas']))
+    conn.executemany(
+        'INSERT INTO "investidor" (documento, nome, telefone, email, patrimonio, perfil) VALUES (?, ?, ?, ?, ?, ?)',
+        sorted(linhas['investidor'])
+    )
+    conn.executemany(
+        '''
+        INSERT INTO "investimento" (id_investimento, documento, tipo, ticker, valor_investido, data_aplicacao, rentabilidade, ativo, preco_aplicacao)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        sorted(linhas['investimento'], key=itemgetter(1, 5))
+    )
+    if lancamentos:
+        conn.executemany(
+            'INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos) VALUES (?, ?, ?, ?, ?, ?)',
+            sorted(linhas['lancamentos'], key=itemgetter(0, 1))
+        )
+
+
+#gera `clientes` clientes no banco atual do pool (que precisa estar vazio) e devolve as contagens por tabela.
+#saldos e patrimônios entram no razão como lançamentos de ABERTURA, como na migração do razão;
+#`lancamentos=False` pula o razão para quem só quer volume nas tabelas de cadastro
+def gerar_base(clientes: int, semente: int = 42, investimentos: float = 3.0, correntistas: float = 0.9,
+               investidores: float = 0.4, inativos: float = FRACAO_INATIVOS, anos: int = 5, data_final: Optional[str] = None,
+               lancamentos: bool = True, lote: int = GERADOR_LOTE) -> Dict[str, Any]:
+    if clientes < 1 or lote < 1:
+        raise ValueError('A quantidade de clientes e o lote devem ser maiores que zero.')
+    if clientes >= 10 ** 8:
+        raise ValueError('O gerador suporta no máximo 99.999.999 clientes (números de conta com 8 dígitos).')
+    if not 0 <= investidores <= correntistas <= 1 or not 0 <= inativos <= 1:
+        raise ValueError('Use 0 <= investidores <= correntistas <= 1 e 0 <= inativos <= 1.')
+    data_final = date.fromisoformat(data_final or date.today().isoformat()).isoformat()
+
+    with database.get_connection() as conn:
+        if conn.execute('SELECT 1 FROM "clientes" LIMIT 1').fetchone():
+            raise ValueError('O banco já tem clientes; gere a base num arquivo novo.')
+
+    #índice de nomes e invalidação do score linha a linha custam mais que a própria carga:
+    #ficam desligados durante a geração e o índice é reconstruído de uma vez no fim
+    with database.transacao() as conn:
+        gatilhos = conn.execute(
+            'SELECT name, sql FROM sqlite_master WHERE type = \'trigger\' AND name IN (SELECT value FROM json_each(?))',
+            (json.dumps(GATILHOS_SUSPENSOS),)
+        ).fetchall()
+        for nome, _ in gatilhos:
+            conn.execute(f'DROP TRIGGER "{nome}"')
+
+    deslocamento = int(np.random.default_rng(semente).integers(10 ** 9))
+    reserva = count(10 ** 9 - 1, -1)
+    totais = dict.fromkeys(('clientes', 'contas', 'investidor', 'investimento', 'lancamentos'), 0)
+    inicio = time.perf_counter()
+    try:
+        for numero, primeiro in enumerate(range(0, clientes, lote)):
+            #um gerador por lote: o lote n sempre sai igual, qualquer que seja a ordem de execução
+            rng = np.random.default_rng([semente, numero])
+            linhas = _gerar_lote(rng, primeiro, min(lote, clientes - primeiro), deslocamento, reserva,
+                                 correntistas, investidores, investimentos, inativos, anos, data_final)
+            with database.transacao() as conn:
+                _gravar_lote(conn, linhas, lancamentos)
+            for tabela, registros in linhas.items():
+                totais[tabela] += len(registros) if tabela != 'lancamentos' or lancamentos else 0
+    finally:
+        with database.transacao() as conn:
+            for _, sql in gatilhos:
+                conn.execute(sql)
+            conn.execute('UPDATE "sequencias" SET valor = MAX(valor, ?) WHERE nome = \'contas\'', (clientes,))
+        database.reconstruir_indice_nomes()
+        database.limpar_cache_consultas()
+
+    decorrido = time.perf_counter() - inicio
+    return {
+        **totais,
+        "segundos": round(decorrido, 2),
+        "linhas_por_segundo": round(sum(totais.values()) / decorrido, 1) if decorrido else 0.0,
+    }
+
+
+#base pequena dos benchmarks: todo cliente é correntista e investidor com posições ativas; devolve os documentos
+def semear(clientes: int = 1000, investimentos: float = 4.0, semente: int = 42) -> List[str]:
+    gerar_base(clientes, semente, investimentos, correntistas=1.0, investidores=1.0, inativos=0.0)
+    return documentos_investidores(clientes)
+
+
+def documentos_investidores(limite: int) -> List[str]:
+    with database.get_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT documento FROM "investidor" ORDER BY rowid LIMIT ?', (limite,))]
+
+
+#sobrenome para a busca por nome, escolhido pelo documento
+def termo_busca(documento: str) -> str:
+    return SOBRENOMES[int(documento) % len(SOBRENOMES)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, required=True)
+    parser.add_argument('--db', type=Path, required=True, help='arquivo do banco (novo ou sem clientes)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--investimentos', type=float, default=3.0, help='média de posições por investidor')
+    parser.add_argument('--correntistas', type=float, default=0.9, help='fração dos clientes com conta')
+    parser.add_argument('--investidores', type=float, default=0.4, help='fração dos clientes com perfil de investidor')
+    parser.add_argument('--inativos', type=float, default=FRACAO_INATIVOS, help='fração das posições encerradas')
+    parser.add_argument('--anos', type=int, default=5, help='histórico das aplicações, em anos')
+    parser.add_argument('--data-final', help='data da aplicação mais recente (AAAA-MM-DD); padrão: hoje')
+    parser.add_argument('--lote', type=int, default=GERADOR_LOTE, help='clientes por transação')
+    parser.add_argument('--sem-lancamentos', action='store_true', help='não grava o razão')
+    args = parser.parse_args()
+
+    database.iniciar_pool(args.db)
+    database.create_tables()
+    with database.get_connection() as conn:
+        #carga descartável: se cair no meio, gera de novo
+        conn.execute('PRAGMA synchronous = OFF;')
+    resultado = gerar_base(args.clientes, args.semente, args.investimentos, args.correntistas, args.investidores,
+                           args.inativos, args.anos, args.data_final, not args.sem_lancamentos, args.lote)
+    database.fechar_pool()
+    print(json.dumps(resultado, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Sobe uma das APIs com uvicorn usando cotações falsas, para os testes de carga.
+
+Uso: python -m benchmarks.servidor {api_banco,app,api_investimento} PORTA [--atraso-cotacao 0.0]
+O banco e o core vêm do ambiente (BANCO_DB_FILE, URL_CORE_BANCO, BANCO_CORE_MODO).
+"""
+import argparse
+import importlib
+
+import uvicorn
+
+from benchmarks.dados import FonteCotacoesFalsa
+from services import market_service
+
+SERVICOS = ('api_banco', 'app', 'api_investimento')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('servico', choices=SERVICOS)
+    parser.add_argument('porta', type=int)
+    parser.add_argument('--atraso-cotacao', type=float, default=0.0)
+    args = parser.parse_args()
+
+    market_service.configurar_fonte(FonteCotacoesFalsa(args.atraso_cotacao))
+    aplicacao = importlib.import_module(args.servico).app
+    uvicorn.run(aplicacao, host='127.0.0.1', port=args.porta, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -45,6 +45,19 @@ class ContaOut(BaseModel):
     saldo_cc: float
     
 
+#linha do cadastro em lote: cliente + conta + perfil de investidor opcionais
+class ClienteLoteIn(BaseModel):
+    nome: str
+    telefone: str
+    documento: str
+    correntista: bool = False
+    investidor: bool = False
+    saldo_cc: float = 0.0
+    email: Optional[str] = None
+    patrimonio: float = 0.0
+    perfil: Optional[PerfilEnum] = None
+
+
 class InvestidorIn(BaseModel):
     id_cliente: str
     nome: str
@@ -0,0 +1,52 @@
+import logging
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Agendador:
+    """Tarefas periódicas de uma API.
+
+    Cada app cria o seu no lifespan: os nomes só precisam ser únicos dentro dele
+    e `parar` cancela apenas as tarefas que ele agendou, então duas APIs no mesmo
+    processo não se atrapalham.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._tarefas: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    #executa `funcao` a cada `intervalo` segundos em uma thread daemon
+    def agendar(self, nome: str, intervalo: float, funcao: Callable[[], object]) -> None:
+        if intervalo <= 0:
+            raise ValueError('O intervalo do agendamento precisa ser positivo.')
+        with self._lock:
+            if nome in self._tarefas:
+                raise ValueError(f'Já existe uma tarefa agendada com o nome {nome} em {self.nome}.')
+            parar = threading.Event()
+            self._tarefas[nome] = parar
+
+        def executar():
+            while not parar.wait(intervalo):
+                try:
+                    funcao()
+                except Exception:
+                    logger.exception('Falha na tarefa agendada %s de %s', nome, self.nome)
+
+        threading.Thread(target=executar, name=f'agendador-{self.nome}-{nome}', daemon=True).start()
+
+    def cancelar(self, nome: str) -> None:
+        with self._lock:
+            parar = self._tarefas.pop(nome, None)
+        if parar is not None:
+            parar.set()
+
+    #cancela todas as tarefas deste agendador; usado no shutdown da API
+    def parar(self) -> None:
+        with self._lock:
+            tarefas = list(self._tarefas.values())
+            self._tarefas.clear()
+        for parar in tarefas:
+            parar.set()
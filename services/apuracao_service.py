@@ -0,0 +1,159 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from models.schemas import TipoEnum
+from services.database import create_tables, iniciar_pool, invalidar_consultas, transacao
+
+logger = logging.getLogger(__name__)
+
+#posições processadas por transação e intervalo (s) do agendamento dentro da API
+APURACAO_LOTE = int(os.getenv('BANCO_APURACAO_LOTE', '50000'))
+APURACAO_INTERVALO = float(os.getenv('BANCO_APURACAO_INTERVALO', '3600'))
+
+
+def _apuracao(conn, data_referencia: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute('SELECT * FROM "apuracoes" WHERE data_referencia = ?', (data_referencia,)).fetchone()
+    return dict(row) if row else None
+
+
+#aplica os juros de um lote de posições e devolve (posições lidas, juros, último rowid);
+#tudo numa transação: investimento, patrimônio, razão, progresso da apuração e invalidação do cache
+def _apurar_lote(data_referencia: str, apos_rowid: int, lote: int):
+    with transacao() as conn:
+        rows = conn.execute(
+            '''
+            SELECT rowid, documento, valor_investido, rentabilidade,
+                   julianday(?) - julianday(COALESCE(ultima_apuracao, date(data_aplicacao))) AS dias
+            FROM "investimento"
+            WHERE rowid > ? AND tipo = ? AND ativo = 1
+              AND COALESCE(ultima_apuracao, date(data_aplicacao)) < ?
+            ORDER BY rowid
+            LIMIT ?
+            ''',
+            (data_referencia, apos_rowid, TipoEnum.RENDA_FIXA.value, data_referencia, lote)
+        ).fetchall()
+        if not rows:
+            return 0, 0.0, apos_rowid
+
+        rowids = np.array([row['rowid'] for row in rows], dtype=np.int64)
+        valor = np.array([row['valor_investido'] for row in rows], dtype=float)
+        taxa = np.array([row['rentabilidade'] or 0.0 for row in rows], dtype=float)
+        dias = np.array([row['dias'] for row in rows], dtype=float)
+        #capitalização diária equivalente à taxa anual, pelos dias desde a última apuração
+        juros = np.round(valor * (np.power(1.0 + taxa, dias / 365.0) - 1.0), 6)
+
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS "apuracao_lote" (rid INTEGER PRIMARY KEY, documento TEXT NOT NULL, juros REAL NOT NULL)')
+        conn.execute('DELETE FROM "apuracao_lote"')
+        conn.executemany(
+            'INSERT INTO "apuracao_lote" (rid, documento, juros) VALUES (?, ?, ?)',
+            zip(rowids.tolist(), (row['documento'] for row in rows), juros.tolist())
+        )
+        conn.execute(
+            '''
+            UPDATE "investimento" SET valor_investido = valor_investido + l.juros, ultima_apuracao = ?, versao = versao + 1
+            FROM "apuracao_lote" l WHERE "investimento".rowid = l.rid
+            ''',
+            (data_referencia,)
+        )
+        conn.execute(
+            '''
+            INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos)
+            SELECT i.documento, 'INVESTIMENTO', i.id_investimento, 'JUROS', l.juros, i.valor_investido
+            FROM "apuracao_lote" l JOIN "investimento" i ON i.rowid = l.rid
+            WHERE l.juros > 0
+            '''
+        )
+        conn.execute(
+            '''
+            UPDATE "investidor" SET patrimonio = patrimonio + s.juros, versao = versao + 1
+            FROM (SELECT documento, SUM(juros) AS juros FROM "apuracao_lote" WHERE juros > 0 GROUP BY documento) s
+            WHERE "investidor".documento = s.documento
+            '''
+        )
+        conn.execute(
+            '''
+            INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos)
+            SELECT s.documento, 'INVESTIDOR', s.documento, 'JUROS', s.juros, i.patrimonio
+            FROM (SELECT documento, SUM(juros) AS juros FROM "apuracao_lote" WHERE juros > 0 GROUP BY documento) s
+            JOIN "investidor" i ON i.documento = s.documento
+            '''
+        )
+        #patrimônio e versão mudaram: as consultas em cache (e o ETag) desses investidores vencem
+        for documento in {row['documento'] for row in rows}:
+            invalidar_consultas(documento)
+        total = float(juros.sum())
+        ultimo_rowid = int(rowids[-1])
+        conn.execute(
+            'UPDATE "apuracoes" SET ultimo_rowid = ?, posicoes = posicoes + ?, juros = juros + ? WHERE data_referencia = ?',
+            (ultimo_rowid, len(rows), total, data_referencia)
+        )
+        return len(rows), total, ultimo_rowid
+
+
+#apura os juros de todas as posições ativas de renda fixa até `data_referencia` (AAAA-MM-DD).
+#idempotente por data: cada posição guarda até quando já rendeu e uma data concluída não roda de novo;
+#uma execução interrompida continua do último lote gravado
+def apurar_renda_fixa(data_referencia: Optional[str] = None, lote: int = APURACAO_LOTE) -> Dict[str, Any]:
+    if lote < 1:
+        raise ValueError('O lote deve ser maior que zero.')
+    data_referencia = date.fromisoformat(data_referencia or date.today().isoformat()).isoformat()
+
+    with transacao() as conn:
+        apuracao = _apuracao(conn, data_referencia)
+        if apuracao is None:
+            conn.execute('INSERT INTO "apuracoes" (data_referencia) VALUES (?)', (data_referencia,))
+            apuracao = _apuracao(conn, data_referencia)
+    if apuracao['concluida_em'] is not None:
+        return {**apuracao, "executada": False}
+
+    inicio = time.perf_counter()
+    apos_rowid = apuracao['ultimo_rowid']
+    posicoes, juros, lotes = 0, 0.0, 0
+    while True:
+        lidas, juros_lote, apos_rowid = _apurar_lote(data_referencia, apos_rowid, lote)
+        if lidas == 0:
+            break
+        posicoes += lidas
+        juros += juros_lote
+        lotes += 1
+        decorrido = time.perf_counter() - inicio
+        logger.info('Apuração %s: lote %d, %d posições, R$ %.2f de juros, %.0f posições/s',
+                    data_referencia, lotes, posicoes, juros, posicoes / decorrido if decorrido else 0.0)
+        if lidas < lote:
+            break
+
+    with transacao() as conn:
+        conn.execute(
+            'UPDATE "apuracoes" SET concluida_em = datetime(\'now\', \'localtime\') WHERE data_referencia = ?',
+            (data_referencia,)
+        )
+        apuracao = _apuracao(conn, data_referencia)
+    decorrido = time.perf_counter() - inicio
+    return {
+        **apuracao,
+        "executada": True,
+        "lotes": lotes,
+        "segundos": round(decorrido, 3),
+        "posicoes_por_segundo": round(posicoes / decorrido, 1) if decorrido else 0.0,
+    }
+
+
+#uso: python -m services.apuracao_service --data 2026-01-31 [--lote 50000] [--db caminho.db]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apuração diária de juros das posições de renda fixa.')
+    parser.add_argument('--data', help='data de referência (AAAA-MM-DD); padrão: hoje')
+    parser.add_argument('--lote', type=int, default=APURACAO_LOTE, help='posições por transação')
+    parser.add_argument('--db', help='arquivo do banco; padrão: BANCO_DB_FILE')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    iniciar_pool(args.db)
+    create_tables()
+    print(json.dumps(apurar_renda_fixa(args.data, args.lote), ensure_ascii=False))
@@ -0,0 +1,362 @@
+#operações do core bancário sem HTTP: as rotas do api_banco e o CoreBancoLocal (gateway no mesmo
+#processo) chamam as mesmas funções, com a mesma validação e os mesmos erros.
+#Erros saem como ErroCoreBanco com o status e o detalhe da resposta HTTP correspondente
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from models.schemas import RENTABILIDADE_PERFIL, PerfilEnum, TipoEnum
+from services.agendador import Agendador
+from services.apuracao_service import apurar_renda_fixa, APURACAO_INTERVALO
+from services.cliente_service import ler_csv_clientes, validar_cliente, validar_lote_clientes
+from services.conta_service import verificacao_conta
+from services.core_banco import ErroCoreBanco
+from services.database import (
+    CHECKPOINT_INTERVALO,
+    COMPACTACAO_INTERVALO,
+    LANCAMENTOS_RETENCAO_DIAS,
+    atualiza_cliente_db,
+    atualiza_investidor_db,
+    atualiza_investimento_db,
+    atualizar_saldo_db,
+    busca_cliente,
+    busca_cliente_por_nome,
+    busca_conta,
+    busca_investidor_db,
+    busca_investimento_db,
+    busca_investimento_doc,
+    cadastrar_investidor_db,
+    checkpoint_wal,
+    codificar_cursor,
+    compactar_lancamentos,
+    decodificar_cursor,
+    deletar_cliente,
+    inserir_cliente as inserir_cliente_db,
+    inserir_clientes_lote,
+    iterar_investimentos_doc,
+    novo_investimento_db,
+    onboarding_db,
+    pagina_investimentos_doc,
+    retirada_investimento_db,
+)
+from services.idempotencia import (
+    ChaveIdempotenciaInvalida,
+    ChaveIdempotenciaReutilizada,
+    executar_idempotente,
+    impressao_requisicao,
+    limpar_idempotencia,
+    IDEMPOTENCIA_LIMPEZA_INTERVALO,
+)
+from services.market_service import buscar_ativo
+from services.movimentacao import ConflitoVersao
+from services.posicao_service import posicao_cliente
+from services.score_credito import buscar_score, recalcular_scores, SCORE_INTERVALO
+
+
+#tarefas periódicas do core; o lifespan do api_banco e o CoreBancoLocal (gateway com o core
+#no mesmo processo) agendam as mesmas, cada um no seu Agendador
+def agendar_tarefas(agendador: Agendador) -> None:
+    agendador.agendar('checkpoint-wal', CHECKPOINT_INTERVALO, checkpoint_wal)
+    agendador.agendar('compactar-lancamentos', COMPACTACAO_INTERVALO, lambda: compactar_lancamentos(LANCAMENTOS_RETENCAO_DIAS))
+    #roda de hora em hora, mas só apura uma vez por dia
+    agendador.agendar('apurar-renda-fixa', APURACAO_INTERVALO, apurar_renda_fixa)
+    agendador.agendar('recalcular-scores', SCORE_INTERVALO, recalcular_scores)
+    agendador.agendar('limpar-idempotencia', IDEMPOTENCIA_LIMPEZA_INTERVALO, limpar_idempotencia)
+
+
+#mesmos limites dos Query(ge, le) das rotas, para quem chama sem passar pelo FastAPI
+def _intervalo(nome: str, valor: int, minimo: int, maximo: Optional[int] = None) -> int:
+    if valor < minimo or (maximo is not None and valor > maximo):
+        limite = f'entre {minimo} e {maximo}' if maximo is not None else f'maior ou igual a {minimo}'
+        raise ErroCoreBanco(422, f'O parâmetro {nome} deve ser {limite}.')
+    return valor
+
+def _perfil(perfil: Any) -> Optional[PerfilEnum]:
+    if perfil is None or isinstance(perfil, PerfilEnum):
+        return perfil
+    try:
+        return PerfilEnum(perfil)
+    except ValueError:
+        raise ErroCoreBanco(422, f'Perfil inválido: {perfil}. Use {", ".join(p.value for p in PerfilEnum)}.')
+
+
+#mesma Idempotency-Key e mesmos parâmetros: devolve a resposta guardada sem executar a operação de novo
+def idempotente(chave: Optional[str], operacao: Callable[[], Any], rota: str, *argumentos: Any) -> Any:
+    try:
+        return executar_idempotente(chave, impressao_requisicao(rota, *argumentos), operacao)
+    except ChaveIdempotenciaInvalida as e:
+        raise ErroCoreBanco(400, str(e))
+    except ChaveIdempotenciaReutilizada as e:
+        raise ErroCoreBanco(422, str(e))
+
+
+#controle otimista: o ETag é a versão da linha; um PATCH com If-Match só grava se ela não mudou
+def versao_if_match(if_match: Optional[str]) -> Optional[int]:
+    if if_match is None or if_match.strip() == '*':
+        return None
+    valor = if_match.strip()
+    if valor.startswith('W/'):
+        valor = valor[2:]
+    try:
+        return int(valor.strip('"'))
+    except ValueError:
+        raise ErroCoreBanco(400, f'If-Match inválido: {if_match}. Use o ETag devolvido pela busca.')
+
+def conflito_versao(e: ConflitoVersao) -> ErroCoreBanco:
+    return ErroCoreBanco(412, str(e), {"ETag": f'"{e.versao_atual}"'})
+
+
+def buscar_clientes_nome(nome: str, pagina: int = 1, tamanho: int = 20) -> List[Dict[str, Any]]:
+    clientes = busca_cliente_por_nome(nome, _intervalo('pagina', pagina, 1), _intervalo('tamanho', tamanho, 1, 100))
+    if not clientes:
+        raise ErroCoreBanco(404, 'Cliente não encontrado.')
+    return clientes
+
+def buscar_cliente(documento: str) -> Dict[str, Any]:
+    cliente = busca_cliente(documento)
+    if not cliente:
+        raise ErroCoreBanco(404, 'Cliente não encontrado.')
+    return cliente
+
+def cadastrar_cliente(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool) -> Any:
+    try:
+        #usar a funçao da regra de negócio
+        cliente = validar_cliente(nome, telefone, documento, correntista, investidor)
+        if cliente:
+            cliente = inserir_cliente_db(nome, telefone, documento, correntista, investidor)
+        return cliente
+    except Exception as e:
+        raise ErroCoreBanco(400, f'Impossível cadastrar cliente. Erro: {e}')
+
+#cliente, conta e investidor na mesma transação
+def onboarding(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool, saldo_cc: float = 0.0,
+               email: Optional[str] = None, patrimonio: Optional[float] = None, perfil: Any = None,
+               chave_idempotencia: Optional[str] = None) -> Dict[str, Any]:
+    perfil = _perfil(perfil)
+    registro = {
+        "nome": nome, "telefone": telefone, "documento": documento, "correntista": correntista, "investidor": investidor,
+        "saldo_cc": saldo_cc, "email": email, "patrimonio": patrimonio, "perfil": perfil,
+    }
+    _, erros = validar_lote_clientes([registro])
+    if erros:
+        raise ErroCoreBanco(400, f'Impossível cadastrar cliente. Erro: {erros[0]["erro"]}')
+
+    def cadastrar():
+        try:
+            cadastro = onboarding_db(nome, telefone, documento, correntista, investidor, saldo_cc, email, patrimonio, perfil.value if perfil else None)
+        except ValueError as e:
+            raise ErroCoreBanco(400, f'Impossível cadastrar cliente. Erro: {e}')
+        if cadastro is None:
+            raise ErroCoreBanco(409, 'Cliente já cadastrado.')
+        return cadastro
+    return idempotente(chave_idempotencia, cadastrar, 'POST /onboarding', registro)
+
+def cadastrar_lote(registros: List[dict], erros_leitura: List[dict] = ()) -> Dict[str, Any]:
+    validos, erros_validacao = validar_lote_clientes(registros)
+    inseridos, erros_banco = inserir_clientes_lote(validos)
+    erros = sorted([*erros_leitura, *erros_validacao, *erros_banco], key = lambda erro: erro.get('linha') or 0)
+    return {
+        "recebidos": len(registros) + len(erros_leitura),
+        "inseridos": inseridos,
+        "erros": erros
+    }
+
+#CSV com cabeçalho; os erros de leitura entram no relatório junto com os de validação
+def cadastrar_lote_csv(texto: str) -> Dict[str, Any]:
+    registros, erros_leitura = ler_csv_clientes(texto)
+    return cadastrar_lote(registros, erros_leitura)
+
+def excluir_cliente(documento: str) -> str:
+    try:
+        deletar_cliente(documento)
+        return 'Cadastro excluído com sucesso.'
+    except ValueError as e:
+        raise ErroCoreBanco(400, str(e))
+    except Exception as e:
+        raise ErroCoreBanco(500, f'Erro ao excluir cadastro: {e}')
+
+def atualizar_cliente(documento: str, nome: str, telefone: str) -> Dict[str, Any]:
+    try:
+        cliente_atualizado = atualiza_cliente_db(documento, nome, telefone)
+    except Exception as e:
+        # Erros de conexão ou SQL
+        raise ErroCoreBanco(500, f'Erro ao atualizar: {e}')
+    if not cliente_atualizado:
+        # Caso o documento não exista no banco
+        raise ErroCoreBanco(404, 'Cliente não encontrado.')
+    return {
+        "documento": documento,
+        "nome": nome,
+        "telefone": telefone,
+    }
+
+
+def criar_conta(documento: str, saldo_cc: float = 0.0, chave_idempotencia: Optional[str] = None) -> Dict[str, Any]:
+    def criar():
+        try:
+            return verificacao_conta(documento, saldo_cc)
+        except Exception as e:
+            raise ErroCoreBanco(404, f'Impossível criar conta. Erro: {e}')
+    return idempotente(chave_idempotencia, criar, 'POST /contas', documento, saldo_cc)
+
+def buscar_conta(documento: str) -> Optional[Dict[str, Any]]:
+    try:
+        return busca_conta(documento)
+    except Exception:
+        raise ErroCoreBanco(404, 'Nenhuma conta encontrada.')
+
+#score de crédito gravado; recalculado na hora se alguma movimentação o invalidou
+def score(documento: str) -> Dict[str, Any]:
+    score = buscar_score(documento)
+    if score is None:
+        raise ErroCoreBanco(404, 'Conta não localizada.')
+    return {
+        "documento": documento,
+        "score_credito": score['score'],
+        "calculado_em": score['calculado_em'],
+    }
+
+#devolve a mensagem e a versão nova da conta; as duas ficam guardadas pela Idempotency-Key,
+#então um retry recebe o mesmo ETag
+def atualizar_saldo(documento: str, novo_saldo: float, chave_idempotencia: Optional[str] = None,
+                    if_match: Optional[str] = None) -> Dict[str, Any]:
+    versao = versao_if_match(if_match)
+
+    def atualizar():
+        conta = busca_conta(documento)
+        if not conta:
+            raise ErroCoreBanco(404, f'Nenhuma conta vinculada ao CPF {documento}')
+        try:
+            conta = atualizar_saldo_db(conta['numero_conta'], novo_saldo, versao)
+        except ConflitoVersao as e:
+            raise conflito_versao(e)
+        return {"mensagem": f'Saldo atualizado: R${novo_saldo}', "versao": conta['versao']}
+    return idempotente(chave_idempotencia, atualizar, 'PATCH /contas/{documento}/atualizar_saldo', documento, novo_saldo, versao)
+
+
+def cadastrar_investidor(documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: Any) -> Dict[str, Any]:
+    perfil = _perfil(perfil)
+    try:
+        return cadastrar_investidor_db(documento, nome, telefone, email, patrimonio, perfil.value)
+    except ValueError as e:
+        raise ErroCoreBanco(500, f'Erro ao cadastrar investidor: {e}')
+
+def atualizar_investidor(documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: Any,
+                         if_match: Optional[str] = None) -> Dict[str, Any]:
+    perfil = _perfil(perfil)
+    versao = versao_if_match(if_match)
+    try:
+        investidor = atualiza_investidor_db(documento, telefone, email, patrimonio, perfil.value, nome, versao)
+    except ConflitoVersao as e:
+        raise conflito_versao(e)
+    except ValueError:
+        raise ErroCoreBanco(500, 'Cadastro não encontrado')
+    except Exception as e:
+        raise ErroCoreBanco(500, f'Erro ao atualizar cliente: {e}')
+    if not investidor:
+        raise ErroCoreBanco(404, 'Cadastro não encontrado.')
+    return investidor
+
+def buscar_investidor(documento: str) -> Dict[str, Any]:
+    investidor = busca_investidor_db(documento)
+    if not investidor:
+        raise ErroCoreBanco(404, 'Investidor não encontrado.')
+    return investidor
+
+
+#preco_aplicacao: cotação que o gateway já buscou ao validar o ativo; é o preço de compra
+#usado na marcação a mercado da posição
+def novo_investimento(documento: str, tipo: str, valor_investido: float, ativo: bool, ticker: Optional[str] = None,
+                      chave_idempotencia: Optional[str] = None, preco_aplicacao: Optional[float] = None) -> Dict[str, Any]:
+    if tipo == 'RENDA FIXA':
+        investidor = busca_investidor_db(documento)
+        if not investidor:
+            raise ErroCoreBanco(404, 'Investidor não encontrado.')
+        rentabilidade = RENTABILIDADE_PERFIL.get(investidor.get('perfil'))
+        preco_aplicacao = None
+    else:
+        rentabilidade = 0.0
+        #chamada direta ao core, sem o preço: busca aqui, fora da transação da Idempotency-Key
+        #(que segura o lock de escrita), e recusa em vez de gravar uma posição sem preço de compra
+        if preco_aplicacao is None and ticker:
+            cotacao = buscar_ativo(ticker)
+            preco_aplicacao = cotacao.get('preco') if cotacao else None
+            if preco_aplicacao is None:
+                raise ErroCoreBanco(503, f'Cotação indisponível para {ticker}. Tente novamente.')
+
+    def investir():
+        try:
+            return novo_investimento_db(documento, tipo, valor_investido, rentabilidade, ativo, ticker, preco_aplicacao)
+        except Exception as e:
+            raise ErroCoreBanco(400, f'Erro ao salvar investimento: {e}')
+    #o preço da aplicação fica fora da impressão: um retry com a cotação já mudada é a mesma requisição
+    return idempotente(chave_idempotencia, investir, 'POST /investimento/novo', documento, tipo, valor_investido, ativo, ticker)
+
+#aporte adicional em renda fixa: debita a conta, então passa pela Idempotency-Key como as outras movimentações
+def atualizar_investimento(id_investimento: str, tipo: str, valor_investido: float, ativo: bool,
+                           chave_idempotencia: Optional[str] = None, if_match: Optional[str] = None) -> Dict[str, Any]:
+    versao = versao_if_match(if_match)
+
+    def atualizar():
+        investimento = busca_investimento_db(id_investimento)
+        if not investimento:
+            raise ErroCoreBanco(404, 'Investimento não encontrado.')
+        tipo_investimento = investimento.get('tipo')
+        if tipo_investimento != TipoEnum.RENDA_FIXA:
+            raise ErroCoreBanco(400, 'Impossível alterar investimentos em renda variável. Tente vender os ativos.')
+        try:
+            investimento_atualizado = atualiza_investimento_db(id_investimento, valor_investido, ativo, tipo_investimento, investimento.get('documento'), versao)
+        except ConflitoVersao as e:
+            raise conflito_versao(e)
+        except Exception as e:
+            raise ErroCoreBanco(500, f'Erro ao atualizar investimento: {e}')
+        if not investimento_atualizado:
+            raise ErroCoreBanco(404, 'Investimento não encontrado.')
+        return {
+            "id_investimento" : id_investimento,
+            "tipo" : tipo,
+            "valor_investido" : valor_investido,
+            "ativo" : ativo,
+            "versao" : investimento_atualizado['versao']
+        }
+    return idempotente(chave_idempotencia, atualizar, 'PATCH /investimento/atualizar/{id}', id_investimento, tipo, valor_investido, ativo, versao)
+
+def excluir_investimento(id_investimento: str, documento: str, valor_investido: float, chave_idempotencia: Optional[str] = None) -> str:
+    def resgatar():
+        if not busca_investimento_db(id_investimento):
+            raise ErroCoreBanco(404, 'Investimento não encontrado.')
+        try:
+            retirada_investimento_db(id_investimento, valor_investido, documento)
+        except Exception as e:
+            raise ErroCoreBanco(500, f'Erro ao excluir investimento: {e}')
+        return 'Investimento excluído com sucesso.'
+    return idempotente(chave_idempotencia, resgatar, 'DELETE /investimento/excluir/{id}', id_investimento, documento, valor_investido)
+
+def investimentos_doc(documento: str) -> List[Dict[str, Any]]:
+    try:
+        return busca_investimento_doc(documento)
+    except Exception:
+        raise ErroCoreBanco(404, f'Nenhum investimento encontrado para o CPF {documento}')
+
+#posição atual do cliente: renda fixa com juros até hoje e renda variável marcada a mercado
+def posicao(documento: str) -> Dict[str, Any]:
+    posicao = posicao_cliente(documento)
+    if not posicao:
+        raise ErroCoreBanco(404, f'Nenhum investimento ativo para o CPF {documento}')
+    return posicao
+
+#investimentos paginados por cursor (data_aplicacao, id_investimento)
+def pagina_investimentos(documento: str, limite: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+    limite = _intervalo('limite', limite, 1, 500)
+    try:
+        apos = decodificar_cursor(cursor) if cursor else None
+        itens = pagina_investimentos_doc(documento, limite, apos)
+    except ValueError as e:
+        raise ErroCoreBanco(400, str(e))
+    proximo = None
+    if len(itens) == limite:
+        proximo = codificar_cursor(itens[-1]['data_aplicacao'], itens[-1]['id_investimento'])
+    return {"itens": itens, "proximo_cursor": proximo}
+
+#NDJSON (um objeto por linha), lido do banco em lotes conforme é consumido
+def linhas_investimentos(documento: str) -> Iterator[str]:
+    return (json.dumps(item, ensure_ascii = False) + '\n' for item in iterar_investimentos_doc(documento))
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """Cache em memória com limite de itens (LRU) e validade por item (TTL).
+
+    Seguro para uso entre threads. `entrada` devolve o valor mesmo vencido,
+    junto com a idade, para quem quiser servir dado antigo enquanto atualiza.
+    """
+
+    def __init__(self, maximo: int = 1024, ttl: float = 60.0):
+        if maximo < 1:
+            raise ValueError('O cache precisa comportar pelo menos um item.')
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def entrada(self, chave: Hashable) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            self._itens.move_to_end(chave)
+            valor, criado_em = item
+            return valor, time.monotonic() - criado_em
+
+    def obter(self, chave: Hashable, padrao: Any = None) -> Any:
+        item = self.entrada(chave)
+        if item is None or item[1] > self.ttl:
+            self.falhas += 1
+            return padrao
+        self.acertos += 1
+        return item[0]
+
+    def guardar(self, chave: Hashable, valor: Any) -> None:
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic())
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, chave: Hashable) -> None:
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.acertos + self.falhas
+        return {
+            "itens": len(self._itens),
+            "maximo": self.maximo,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 4) if total else 0.0,
+        }
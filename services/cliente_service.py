@@ -1,3 +1,7 @@
+import csv
+import io
+from typing import Any, Dict, List, Tuple
+
 from services.database import busca_cliente, inserir_cliente
 
 def validar_cliente(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool) -> bool:
@@ -14,4 +18,54 @@ def validacao_cadastro(nome: str, telefone: str, documento: str, correntista: bo
     if validar_cliente(nome, telefone, documento, correntista, investidor):
         inserir_cliente(nome, telefone, documento, correntista, investidor)
     else:
-        raise ValueError('Dados do cliente inválidos.')
\ No newline at end of file
+        raise ValueError('Dados do cliente inválidos.')
+
+
+VERDADEIROS = ('1', 'true', 'sim', 's', 'yes', 'y')
+PERFIS_VALIDOS = ('CONSERVADOR', 'MODERADO', 'ARROJADO')
+
+#valida o lote inteiro de uma vez; devolve as linhas aceitas e os erros por linha (linha começa em 1)
+def validar_lote_clientes(registros: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    validos, erros, vistos = [], [], set()
+    for posicao, registro in enumerate(registros, start=1):
+        linha = registro.get('linha', posicao)
+        documento = registro.get('documento')
+        try:
+            validar_cliente(registro.get('nome'), registro.get('telefone'), documento, registro.get('correntista'), registro.get('investidor'))
+            if documento in vistos:
+                raise ValueError('Documento repetido no lote.')
+            if float(registro.get('saldo_cc') or 0) < 0:
+                raise ValueError('Saldo da conta não pode ser negativo.')
+            if registro.get('investidor'):
+                if not registro.get('email'):
+                    raise ValueError('Informe o email do investidor.')
+                perfil = registro.get('perfil')
+                if str(getattr(perfil, 'value', perfil) or '').upper() not in PERFIS_VALIDOS:
+                    raise ValueError('Informe um perfil de investidor válido.')
+        except (ValueError, TypeError) as e:
+            erros.append({"linha": linha, "documento": documento, "erro": str(e)})
+            continue
+        vistos.add(documento)
+        validos.append({**registro, "linha": linha})
+    return validos, erros
+
+#converte um CSV com cabeçalho (nome,telefone,documento,correntista,investidor,saldo_cc,email,patrimonio,perfil)
+def ler_csv_clientes(texto: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    registros, erros = [], []
+    for linha, row in enumerate(csv.DictReader(io.StringIO(texto)), start=1):
+        try:
+            registros.append({
+                "linha": linha,
+                "nome": (row.get('nome') or '').strip(),
+                "telefone": (row.get('telefone') or '').strip(),
+                "documento": (row.get('documento') or '').strip(),
+                "correntista": (row.get('correntista') or '').strip().lower() in VERDADEIROS,
+                "investidor": (row.get('investidor') or '').strip().lower() in VERDADEIROS,
+                "saldo_cc": float(row.get('saldo_cc') or 0),
+                "email": (row.get('email') or '').strip() or None,
+                "patrimonio": float(row.get('patrimonio') or 0),
+                "perfil": (row.get('perfil') or '').strip().upper() or None,
+            })
+        except ValueError as e:
+            erros.append({"linha": linha, "documento": row.get('documento'), "erro": f'Valor inválido: {e}'})
+    return registros, erros
@@ -1,5 +1,4 @@
 from .database import nova_conta, busca_conta
-from .score_credito import calcular_score
 
 def verificacao_conta(id_cliente: str, saldo_cc: float = 0.0):
     if saldo_cc <0:
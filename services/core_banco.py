@@ -0,0 +1,400 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from services.http_client import iniciar_cliente_http, fechar_cliente_http, get_cliente_http, limpar_params
+from services.metricas import medir_chamada, rota_normalizada
+
+#como os gateways (app.py e api_investimento.py) falam com o core bancário:
+#'remoto': HTTP para o api_banco em URL_CORE_BANCO (vários nós);
+#'local': chama a camada de serviço do api_banco no próprio processo, sem socket nem JSON (gateway e core no mesmo nó)
+CORE_BANCO_MODO = os.getenv('BANCO_CORE_MODO', 'remoto')
+URL_CORE_BANCO = os.getenv('URL_CORE_BANCO', "http://localhost:8001")
+#cadastros em lote podem levar bem mais que uma chamada comum
+HTTP_TIMEOUT_LOTE = float(os.getenv('BANCO_HTTP_TIMEOUT_LOTE', '120'))
+
+logger = logging.getLogger(__name__)
+
+
+#erro do core com o status e o detalhe da resposta HTTP; `cabecalhos` vai junto na resposta (ex.: ETag do 412)
+class ErroCoreBanco(Exception):
+    def __init__(self, status_code: int, detalhe: Any, cabecalhos: Optional[Dict[str, str]] = None):
+        super().__init__(detalhe)
+        self.status_code = status_code
+        self.detalhe = detalhe
+        self.cabecalhos = cabecalhos
+
+
+class CoreBanco(ABC):
+    """Operações do core bancário usadas pelos gateways.
+
+    Buscas devolvem None quando o core não encontra o registro; qualquer outro
+    erro do core vira ErroCoreBanco com o status e o detalhe que o api_banco daria.
+    Criações e movimentações aceitam a Idempotency-Key recebida pelo gateway
+    (chave_idempotencia), repassada ao core para que um retry não execute duas vezes.
+    """
+
+    async def iniciar(self) -> None:
+        pass
+
+    async def fechar(self) -> None:
+        pass
+
+    @abstractmethod
+    async def buscar_cliente(self, documento: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def buscar_clientes_nome(self, nome: str, pagina: int = 1, tamanho: int = 20) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    async def cadastrar_cliente(self, nome: str, telefone: str, documento: str, correntista: bool, investidor: bool) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def atualizar_cliente(self, documento: str, nome: str, telefone: str) -> Dict[str, Any]:
+        ...
+
+    #cliente, conta e investidor numa única transação do core
+    @abstractmethod
+    async def onboarding(self, nome: str, telefone: str, documento: str, correntista: bool, investidor: bool, saldo_cc: float = 0.0,
+                         email: Optional[str] = None, patrimonio: Optional[float] = None, perfil: Optional[str] = None,
+                         chave_idempotencia: Optional[str] = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def excluir_cliente(self, documento: str) -> Any:
+        ...
+
+    @abstractmethod
+    async def cadastrar_lote(self, registros: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def cadastrar_lote_csv(self, conteudo: bytes) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def criar_conta(self, documento: str, saldo_cc: float = 0.0, chave_idempotencia: Optional[str] = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def buscar_conta(self, documento: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    #if_match: ETag lido pelo cliente; o core responde 412 se a conta mudou desde então
+    @abstractmethod
+    async def atualizar_saldo(self, documento: str, novo_saldo: float, chave_idempotencia: Optional[str] = None,
+                              if_match: Optional[str] = None) -> Any:
+        ...
+
+    @abstractmethod
+    async def score(self, documento: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def buscar_investidor(self, documento: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def cadastrar_investidor(self, documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: str) -> Dict[str, Any]:
+        ...
+
+    #preco_aplicacao: cotação já buscada pelo gateway, para o core não consultar o provedor de novo
+    @abstractmethod
+    async def novo_investimento(self, documento: str, tipo: str, valor_investido: float, ativo: bool, ticker: Optional[str] = None,
+                                chave_idempotencia: Optional[str] = None, preco_aplicacao: Optional[float] = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def investimentos_doc(self, documento: str) -> Optional[List[Dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    async def posicao(self, documento: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def pagina_investimentos(self, documento: str, limite: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def stream_investimentos(self, documento: str) -> AsyncIterator[Any]:
+        ...
+
+    @abstractmethod
+    async def excluir_investimento(self, id_investimento: str, documento: str, valor_investido: float, chave_idempotencia: Optional[str] = None) -> Any:
+        ...
+
+
+#o core só recebe o cabeçalho quando o cliente do gateway mandou uma chave
+def cabecalho_idempotencia(chave: Optional[str]) -> Optional[Dict[str, str]]:
+    return {"Idempotency-Key": chave} if chave is not None else None
+
+
+def _detalhe(resposta: httpx.Response) -> Any:
+    try:
+        return resposta.json().get('detail', resposta.text)
+    except Exception:
+        return resposta.text
+
+
+class CoreBancoRemoto(CoreBanco):
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or URL_CORE_BANCO
+
+    async def iniciar(self) -> None:
+        await iniciar_cliente_http()
+
+    async def fechar(self) -> None:
+        await fechar_cliente_http()
+
+    async def _chamar(self, metodo: str, caminho: str, buscar: bool = False, **opcoes) -> Any:
+        try:
+            with medir_chamada('core', f'{metodo} {rota_normalizada(caminho)}'):
+                resposta = await get_cliente_http().request(metodo, f'{self.url}{caminho}', **opcoes)
+        except httpx.RequestError as e:
+            raise ErroCoreBanco(503, f'Erro de conexão com o core bancário: {e}')
+        if buscar and resposta.status_code == 404:
+            return None
+        if resposta.status_code not in (200, 201, 204):
+            #o ETag do 412 diz ao cliente em que versão o registro está
+            etag = resposta.headers.get('ETag')
+            raise ErroCoreBanco(resposta.status_code, _detalhe(resposta), {"ETag": etag} if etag else None)
+        return resposta.json() if resposta.content else None
+
+    async def buscar_cliente(self, documento):
+        return await self._chamar('GET', f'/clientes/{documento}', buscar = True)
+
+    async def buscar_clientes_nome(self, nome, pagina = 1, tamanho = 20):
+        return await self._chamar('GET', '/clientes/busca/nome', buscar = True, params = {"nome": nome, "pagina": pagina, "tamanho": tamanho})
+
+    async def cadastrar_cliente(self, nome, telefone, documento, correntista, investidor):
+        params = {"nome": nome, "telefone": telefone, "documento": documento, "correntista": correntista, "investidor": investidor}
+        return await self._chamar('POST', '/clientes', params = params)
+
+    async def atualizar_cliente(self, documento, nome, telefone):
+        return await self._chamar('PATCH', f'/clientes/{documento}', params = {"nome": nome, "telefone": telefone})
+
+    async def onboarding(self, nome, telefone, documento, correntista, investidor, saldo_cc = 0.0, email = None, patrimonio = None, perfil = None,
+                         chave_idempotencia = None):
+        params = {
+            "nome": nome, "telefone": telefone, "documento": documento, "correntista": correntista, "investidor": investidor,
+            "saldo_cc": saldo_cc, "email": email, "patrimonio": patrimonio, "perfil": perfil,
+        }
+        return await self._chamar('POST', '/onboarding', params = limpar_params(params), headers = cabecalho_idempotencia(chave_idempotencia))
+
+    async def excluir_cliente(self, documento):
+        return await self._chamar('DELETE', f'/clientes/{documento}')
+
+    async def cadastrar_lote(self, registros):
+        return await self._chamar('POST', '/clientes/lote', json = registros, timeout = HTTP_TIMEOUT_LOTE)
+
+    async def cadastrar_lote_csv(self, conteudo):
+        return await self._chamar('POST', '/clientes/lote/csv', content = conteudo, headers = {"Content-Type": "text/csv"}, timeout = HTTP_TIMEOUT_LOTE)
+
+    async def criar_conta(self, documento, saldo_cc = 0.0, chave_idempotencia = None):
+        params = {"documento": documento, "saldo_cc": saldo_cc}
+        return await self._chamar('POST', '/contas', params = params, headers = cabecalho_idempotencia(chave_idempotencia))
+
+    async def buscar_conta(self, documento):
+        return await self._chamar('GET', f'/contas/{documento}', buscar = True)
+
+    async def atualizar_saldo(self, documento, novo_saldo, chave_idempotencia = None, if_match = None):
+        headers = cabecalho_idempotencia(chave_idempotencia) or {}
+        if if_match is not None:
+            headers['If-Match'] = if_match
+        return await self._chamar('PATCH', f'/contas/{documento}/atualizar_saldo', params = {"novo_saldo": novo_saldo}, headers = headers)
+
+    async def score(self, documento):
+        return await self._chamar('GET', f'/contas/score/{documento}', buscar = True)
+
+    async def buscar_investidor(self, documento):
+        return await self._chamar('GET', f'/clientes/investidor/{documento}', buscar = True)
+
+    async def cadastrar_investidor(self, documento, nome, telefone, email, patrimonio, perfil):
+        params = {"documento": documento, "nome": nome, "telefone": telefone, "email": email, "patrimonio": patrimonio, "perfil": perfil}
+        return await self._chamar('POST', '/investidor', params = limpar_params(params))
+
+    async def novo_investimento(self, documento, tipo, valor_investido, ativo, ticker = None, chave_idempotencia = None, preco_aplicacao = None):
+        params = {
+            "documento": documento, "tipo": tipo, "valor_investido": valor_investido, "ativo": ativo, "ticker": ticker,
+            "preco_aplicacao": preco_aplicacao,
+        }
+        return await self._chamar('POST', '/investimento/novo', params = limpar_params(params), headers = cabecalho_idempotencia(chave_idempotencia))
+
+    async def investimentos_doc(self, documento):
+        return await self._chamar('GET', f'/investimento/{documento}', buscar = True)
+
+    async def posicao(self, documento):
+        return await self._chamar('GET', f'/investimento/{documento}/posicao', buscar = True)
+
+    async def pagina_investimentos(self, documento, limite = 50, cursor = None):
+        return await self._chamar('GET', f'/investimento/{documento}/pagina', params = limpar_params({"limite": limite, "cursor": cursor}))
+
+    #repassa o NDJSON do core em pedaços; a resposta é fechada quando o iterador termina
+    async def stream_investimentos(self, documento):
+        cliente = get_cliente_http()
+        try:
+            with medir_chamada('core', 'GET /investimento/{id}/stream'):
+                resposta = await cliente.send(cliente.build_request('GET', f'{self.url}/investimento/{documento}/stream'), stream = True)
+        except httpx.RequestError as e:
+            raise ErroCoreBanco(503, f'Erro de conexão com o core bancário: {e}')
+        if resposta.status_code != 200:
+            await resposta.aclose()
+            raise ErroCoreBanco(resposta.status_code, 'Erro ao buscar investimentos.')
+
+        async def pedacos():
+            try:
+                async for pedaco in resposta.aiter_raw():
+                    yield pedaco
+            finally:
+                await resposta.aclose()
+        return pedacos()
+
+    async def excluir_investimento(self, id_investimento, documento, valor_investido, chave_idempotencia = None):
+        params = {"documento": documento, "valor_investido": valor_investido}
+        return await self._chamar('DELETE', f'/investimento/excluir/{id_investimento}', params = params, headers = cabecalho_idempotencia(chave_idempotencia))
+
+
+class CoreBancoLocal(CoreBanco):
+    """Chama a camada de serviço do api_banco (services/banco_service.py) no próprio processo,
+    com as mesmas regras, validações e erros do core."""
+
+    def __init__(self):
+        #import tardio: o modo remoto não precisa carregar o core
+        from services import banco_service, database, database_async
+        from services.agendador import Agendador
+        self.servico = banco_service
+        self.database = database
+        self.database_async = database_async
+        self.agendador = Agendador('core_banco_local')
+
+    #sem o api_banco no ar, as tarefas periódicas do core rodam aqui
+    async def iniciar(self) -> None:
+        await run_in_threadpool(self.database.create_tables)
+        self.database_async.iniciar_executor_db()
+        self.servico.agendar_tarefas(self.agendador)
+
+    async def fechar(self) -> None:
+        self.agendador.parar()
+        self.database_async.fechar_executor_db()
+
+    #erros inesperados vão para o log; o gateway só recebe uma mensagem genérica
+    async def _chamar(self, funcao, *args, buscar: bool = False) -> Any:
+        try:
+            return await self.database_async.executar(funcao, *args)
+        except ErroCoreBanco as e:
+            if buscar and e.status_code == 404:
+                return None
+            raise
+        except Exception:
+            logger.exception('Falha no core bancário local em %s', funcao.__name__)
+            raise ErroCoreBanco(500, 'Erro interno do core bancário.')
+
+    async def buscar_cliente(self, documento):
+        return await self._chamar(self.servico.buscar_cliente, documento, buscar = True)
+
+    async def buscar_clientes_nome(self, nome, pagina = 1, tamanho = 20):
+        return await self._chamar(self.servico.buscar_clientes_nome, nome, pagina, tamanho, buscar = True)
+
+    async def cadastrar_cliente(self, nome, telefone, documento, correntista, investidor):
+        return await self._chamar(self.servico.cadastrar_cliente, nome, telefone, documento, correntista, investidor)
+
+    async def atualizar_cliente(self, documento, nome, telefone):
+        return await self._chamar(self.servico.atualizar_cliente, documento, nome, telefone)
+
+    async def onboarding(self, nome, telefone, documento, correntista, investidor, saldo_cc = 0.0, email = None, patrimonio = None, perfil = None,
+                         chave_idempotencia = None):
+        return await self._chamar(self.servico.onboarding, nome, telefone, documento, correntista, investidor, saldo_cc, email, patrimonio, perfil, chave_idempotencia)
+
+    async def excluir_cliente(self, documento):
+        return await self._chamar(self.servico.excluir_cliente, documento)
+
+    async def cadastrar_lote(self, registros):
+        return await self._chamar(self.servico.cadastrar_lote, registros)
+
+    async def cadastrar_lote_csv(self, conteudo):
+        return await self._chamar(self.servico.cadastrar_lote_csv, conteudo.decode('utf-8-sig'))
+
+    async def criar_conta(self, documento, saldo_cc = 0.0, chave_idempotencia = None):
+        return await self._chamar(self.servico.criar_conta, documento, saldo_cc, chave_idempotencia)
+
+    async def buscar_conta(self, documento):
+        return await self._chamar(self.servico.buscar_conta, documento, buscar = True)
+
+    async def atualizar_saldo(self, documento, novo_saldo, chave_idempotencia = None, if_match = None):
+        resultado = await self._chamar(self.servico.atualizar_saldo, documento, novo_saldo, chave_idempotencia, if_match)
+        return resultado['mensagem']
+
+    async def score(self, documento):
+        return await self._chamar(self.servico.score, documento, buscar = True)
+
+    async def buscar_investidor(self, documento):
+        return await self._chamar(self.servico.buscar_investidor, documento, buscar = True)
+
+    async def cadastrar_investidor(self, documento, nome, telefone, email, patrimonio, perfil):
+        return await self._chamar(self.servico.cadastrar_investidor, documento, nome, telefone, email, patrimonio, perfil)
+
+    async def novo_investimento(self, documento, tipo, valor_investido, ativo, ticker = None, chave_idempotencia = None, preco_aplicacao = None):
+        return await self._chamar(self.servico.novo_investimento, documento, tipo, valor_investido, ativo, ticker, chave_idempotencia, preco_aplicacao)
+
+    async def investimentos_doc(self, documento):
+        return await self._chamar(self.servico.investimentos_doc, documento, buscar = True)
+
+    async def posicao(self, documento):
+        return await self._chamar(self.servico.posicao, documento, buscar = True)
+
+    async def pagina_investimentos(self, documento, limite = 50, cursor = None):
+        return await self._chamar(self.servico.pagina_investimentos, documento, limite, cursor)
+
+    #as linhas são lidas do banco em lotes numa thread, conforme o gateway consome
+    async def stream_investimentos(self, documento):
+        linhas = await self._chamar(self.servico.linhas_investimentos, documento)
+        return iterate_in_threadpool(linhas)
+
+    async def excluir_investimento(self, id_investimento, documento, valor_investido, chave_idempotencia = None):
+        return await self._chamar(self.servico.excluir_investimento, id_investimento, documento, valor_investido, chave_idempotencia)
+
+
+def criar_core_banco(modo: str = None) -> CoreBanco:
+    modo = modo or CORE_BANCO_MODO
+    if modo == 'remoto':
+        return CoreBancoRemoto()
+    if modo == 'local':
+        return CoreBancoLocal()
+    raise ValueError(f'Modo do core bancário inválido: {modo}. Use remoto ou local.')
+
+
+_core: Optional[CoreBanco] = None
+_usuarios = 0
+
+
+#chamado no lifespan de cada gateway; compartilhado se as apps rodarem no mesmo processo
+async def iniciar_core_banco() -> CoreBanco:
+    global _usuarios
+    _usuarios += 1
+    core = get_core_banco()
+    if _usuarios == 1:
+        await core.iniciar()
+    return core
+
+
+async def fechar_core_banco() -> None:
+    global _core, _usuarios
+    _usuarios = max(_usuarios - 1, 0)
+    if _usuarios == 0 and _core is not None:
+        await _core.fechar()
+        _core = None
+
+
+def get_core_banco() -> CoreBanco:
+    global _core
+    if _core is None:
+        _core = criar_core_banco()
+    return _core
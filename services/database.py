@@ -1,21 +1,298 @@
 
 from math import e
 from multiprocessing import Value
+import base64
+import json
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional, Any
-import uuid
+from typing import Dict, Iterator, Optional, Any, Tuple
 
 from models.schemas import TipoEnum
+from services import metricas, movimentacao
+from services.identificadores import get_gerador
+from services.cache import CacheTTL
 
 ROOT_DIR = Path(__file__).resolve().parent
-DB_FILE = ROOT_DIR / 'db_banco.db'
+DB_FILE = Path(os.getenv('BANCO_DB_FILE', ROOT_DIR / 'db_banco.db'))
+#quantidade máxima de conexões abertas pelo pool
+POOL_TAMANHO = int(os.getenv('BANCO_POOL_TAMANHO', '8'))
+#tempo máximo (s) esperando uma conexão livre ou o lock do sqlite
+POOL_TIMEOUT = float(os.getenv('BANCO_POOL_TIMEOUT', '30'))
+#conexões paradas por mais tempo que isso são testadas antes de voltar ao uso
+POOL_VERIFICAR_APOS = float(os.getenv('BANCO_POOL_VERIFICAR_APOS', '30'))
+#'0' fecha cada conexão ao fim do bloco (uma conexão por chamada, como antes do pool); só para comparar nos benchmarks
+POOL_REUTILIZAR = os.getenv('BANCO_POOL_REUTILIZAR', '1') == '1'
+
+#pragmas aplicados em cada conexão nova, conforme o perfil de armazenamento
+#oltp: WAL + synchronous NORMAL, prioriza vazão (pode perder as últimas transações numa queda de energia)
+#safe: WAL + synchronous FULL, toda transação confirmada é durável
+PERFIS_ARMAZENAMENTO = {
+    'oltp': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+    },
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16384,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 30000,
+        'wal_autocheckpoint': 1000,
+    },
+}
+PERFIL_ARMAZENAMENTO = os.getenv('BANCO_PERFIL_ARMAZENAMENTO', 'safe')
+#intervalo (s) do checkpoint periódico do WAL
+CHECKPOINT_INTERVALO = float(os.getenv('BANCO_CHECKPOINT_INTERVALO', '60'))
+#compactação do razão: roda a cada COMPACTACAO_INTERVALO segundos e mantém RETENCAO_DIAS na tabela quente
+COMPACTACAO_INTERVALO = float(os.getenv('BANCO_COMPACTACAO_INTERVALO', '86400'))
+LANCAMENTOS_RETENCAO_DIAS = int(os.getenv('BANCO_LANCAMENTOS_RETENCAO_DIAS', '90'))
+#cache das buscas por documento (cliente, conta, investidor); '0' desliga para quem precisa de leitura sempre do banco.
+#dentro do processo as escritas invalidam na hora; o TTL limita o atraso para escritas feitas por outro processo
+CACHE_CONSULTAS = os.getenv('BANCO_CACHE_CONSULTAS', '1') == '1'
+CACHE_CONSULTAS_TTL = float(os.getenv('BANCO_CACHE_CONSULTAS_TTL', '5'))
+CACHE_CONSULTAS_MAXIMO = int(os.getenv('BANCO_CACHE_CONSULTAS_MAXIMO', '10000'))
+
+
+def aplicar_perfil(conn: sqlite3.Connection, perfil: str = None) -> None:
+    perfil = perfil or PERFIL_ARMAZENAMENTO
+    pragmas = PERFIS_ARMAZENAMENTO.get(perfil)
+    if pragmas is None:
+        raise ValueError(f'Perfil de armazenamento inválido: {perfil}. Use um de {list(PERFIS_ARMAZENAMENTO)}.')
+    for nome, valor in pragmas.items():
+        conn.execute(f'PRAGMA {nome} = {valor};')
+
+
+class PoolConexoes:
+    """Pool de conexões sqlite de longa duração.
+
+    As conexões são abertas sob demanda até o limite `tamanho` e devolvidas ao
+    pool no fim de cada bloco `with`. Uma chamada aninhada na mesma thread
+    reaproveita a conexão que a thread já está usando.
+    """
+
+    def __init__(self, db_file: Path, tamanho: int = POOL_TAMANHO, timeout: float = POOL_TIMEOUT):
+        if tamanho < 1:
+            raise ValueError('O pool precisa de pelo menos uma conexão.')
+        self.db_file = db_file
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self._livres = queue.LifoQueue()
+        self._abertas = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._fechado = False
+
+    def _abrir(self) -> sqlite3.Connection:
+        fabrica = metricas.ConexaoInstrumentada if metricas.METRICAS else sqlite3.Connection
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False, factory=fabrica)
+        aplicar_perfil(conn)
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _descartar(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._abertas -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _saudavel(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def adquirir(self) -> sqlite3.Connection:
+        if self._fechado:
+            raise RuntimeError('O pool de conexões já foi encerrado.')
+        try:
+            conn, devolvida_em = self._livres.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                pode_abrir = self._abertas < self.tamanho
+                if pode_abrir:
+                    self._abertas += 1
+            if pode_abrir:
+                try:
+                    return self._abrir()
+                except Exception:
+                    with self._lock:
+                        self._abertas -= 1
+                    raise
+            try:
+                conn, devolvida_em = self._livres.get(timeout=self.timeout)
+            except queue.Empty:
+                raise RuntimeError('Nenhuma conexão disponível no pool.')
+
+        #health check só para conexões que ficaram paradas
+        if time.monotonic() - devolvida_em > POOL_VERIFICAR_APOS and not self._saudavel(conn):
+            self._descartar(conn)
+            return self.adquirir()
+        return conn
+
+    def devolver(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+        if self._fechado or not POOL_REUTILIZAR:
+            self._descartar(conn)
+            return
+        self._livres.put((conn, time.monotonic()))
+
+    @contextmanager
+    def conexao(self):
+        atual = getattr(self._local, 'conn', None)
+        if atual is not None:
+            yield atual
+            return
+        conn = self.adquirir()
+        self._local.conn = conn
+        try:
+            #mesmo comportamento do "with sqlite3.connect(...)": commit ou rollback no fim do bloco
+            with conn:
+                yield conn
+        finally:
+            self._local.conn = None
+            self.devolver(conn)
+
+    def fechar(self) -> None:
+        self._fechado = True
+        while True:
+            try:
+                conn, _ = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {
+            "tamanho": self.tamanho,
+            "abertas": self._abertas,
+            "livres": self._livres.qsize(),
+        }
+
+
+_pool: Optional[PoolConexoes] = None
+_pool_lock = threading.Lock()
+
+#(re)inicia o pool, opcionalmente apontando para outro arquivo de banco
+def iniciar_pool(db_file: Optional[Path] = None, tamanho: Optional[int] = None) -> PoolConexoes:
+    global _pool, DB_FILE
+    with _pool_lock:
+        if db_file is not None:
+            DB_FILE = Path(db_file)
+        if _pool is not None:
+            _pool.fechar()
+        _pool = PoolConexoes(DB_FILE, tamanho or POOL_TAMANHO)
+        limpar_cache_consultas()
+        return _pool
+
+#fecha todas as conexões livres; usado no shutdown das APIs
+def fechar_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.fechar()
+            _pool = None
+
+def get_pool() -> PoolConexoes:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexoes(DB_FILE, POOL_TAMANHO)
+    return _pool
 
 def get_connection():
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_pool().conexao()
+
+#transação de escrita que já começa com o lock de escrita (BEGIN IMMEDIATE),
+#evitando que duas transações leiam o mesmo saldo antes de gravar
+@contextmanager
+def transacao():
+    with get_connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE;')
+        _invalidacoes_local.pendentes = set()
+        try:
+            yield conn
+        finally:
+            pendentes, _invalidacoes_local.pendentes = _invalidacoes_local.pendentes, None
+    #de novo depois do commit: uma leitura feita antes dele pode ter guardado o valor antigo
+    for documento in pendentes:
+        invalidar_consultas(documento)
+
+
+CACHES_CONSULTA = {
+    tabela: CacheTTL(CACHE_CONSULTAS_MAXIMO, CACHE_CONSULTAS_TTL) for tabela in ('clientes', 'contas', 'investidor')
+}
+_invalidacoes_local = threading.local()
+_invalidacoes = 0
+_invalidacoes_lock = threading.Lock()
+
+
+#tira o documento de todos os caches de busca; dentro de transacao() repete depois do commit
+def invalidar_consultas(documento: str) -> None:
+    global _invalidacoes
+    with _invalidacoes_lock:
+        _invalidacoes += 1
+    for cache in CACHES_CONSULTA.values():
+        cache.invalidar(documento)
+    pendentes = getattr(_invalidacoes_local, 'pendentes', None)
+    if pendentes is not None:
+        pendentes.add(documento)
+
+def limpar_cache_consultas() -> None:
+    for cache in CACHES_CONSULTA.values():
+        cache.limpar()
+
+def estatisticas_cache_consultas() -> Dict[str, Any]:
+    return {
+        "habilitado": CACHE_CONSULTAS,
+        **{tabela: cache.estatisticas() for tabela, cache in CACHES_CONSULTA.items()},
+    }
+
+#read-through: só guarda o que foi encontrado e só se nenhuma escrita invalidou algo durante a leitura
+def _consulta_em_cache(tabela: str, documento: str, ler) -> Optional[Dict[str, Any]]:
+    if not CACHE_CONSULTAS:
+        return ler(documento)
+    cache = CACHES_CONSULTA[tabela]
+    valor = cache.obter(documento)
+    if valor is None:
+        invalidacoes = _invalidacoes
+        valor = ler(documento)
+        if valor is None:
+            return None
+        if invalidacoes == _invalidacoes:
+            cache.guardar(documento, valor)
+    #cópia: quem chama pode alterar o dict
+    return dict(valor)
+
+#move as páginas do WAL para o arquivo principal; PASSIVE não bloqueia leitores nem escritores
+def checkpoint_wal(modo: str = 'PASSIVE') -> Dict[str, int]:
+    if modo not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f'Modo de checkpoint inválido: {modo}')
+    with get_connection() as conn:
+        ocupado, paginas_log, paginas_copiadas = conn.execute(f'PRAGMA wal_checkpoint({modo});').fetchone()
+    return {"ocupado": ocupado, "paginas_log": paginas_log, "paginas_copiadas": paginas_copiadas}
 
 def create_tables() -> None:
     with get_connection() as conn:
@@ -73,6 +350,202 @@ def create_tables() -> None:
             '''
         )
         conn.commit()
+        migrar_schema(conn)
+
+
+#migrações do schema, aplicadas em ordem e registradas no PRAGMA user_version
+#cada passo é um comando SQL ou uma função que recebe a conexão
+MIGRACOES = [
+    (1, [
+        'CREATE INDEX IF NOT EXISTS "idx_contas_documento" ON "contas" (documento)',
+        'CREATE INDEX IF NOT EXISTS "idx_investimento_documento" ON "investimento" (documento, data_aplicacao, id_investimento)',
+    ]),
+    #índice full-text dos nomes: sem acentos e sem diferença de maiúsculas, com índice de prefixo
+    (2, [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS "clientes_fts" USING fts5(
+            nome,
+            content = 'clientes',
+            content_rowid = 'rowid',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS "clientes_fts_insert" AFTER INSERT ON "clientes" BEGIN
+            INSERT INTO "clientes_fts" (rowid, nome) VALUES (new.rowid, new.nome);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS "clientes_fts_delete" AFTER DELETE ON "clientes" BEGIN
+            INSERT INTO "clientes_fts" ("clientes_fts", rowid, nome) VALUES ('delete', old.rowid, old.nome);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS "clientes_fts_update" AFTER UPDATE OF nome ON "clientes" BEGIN
+            INSERT INTO "clientes_fts" ("clientes_fts", rowid, nome) VALUES ('delete', old.rowid, old.nome);
+            INSERT INTO "clientes_fts" (rowid, nome) VALUES (new.rowid, new.nome);
+        END
+        ''',
+        'INSERT INTO "clientes_fts" ("clientes_fts") VALUES (\'rebuild\')',
+    ]),
+    #razão (append-only) de todas as variações de saldo; contas.saldo_cc, investidor.patrimonio e
+    #investimento.valor_investido passam a ser o total materializado desses lançamentos
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS "lancamentos" (
+            id_lancamento INTEGER PRIMARY KEY AUTOINCREMENT,
+            documento TEXT NOT NULL,
+            origem TEXT NOT NULL,
+            referencia TEXT NOT NULL,
+            historico TEXT NOT NULL,
+            valor REAL NOT NULL,
+            saldo_apos REAL NOT NULL,
+            data_lancamento TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            CONSTRAINT origem_valida CHECK (origem IN ('CONTA', 'INVESTIDOR', 'INVESTIMENTO'))
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS "idx_lancamentos_documento" ON "lancamentos" (documento, origem, id_lancamento)',
+        #lançamentos compactados saem da tabela quente, mas continuam guardados aqui
+        'CREATE TABLE IF NOT EXISTS "lancamentos_arquivo" AS SELECT * FROM "lancamentos" WHERE 0',
+        'CREATE UNIQUE INDEX IF NOT EXISTS "idx_lancamentos_arquivo_id" ON "lancamentos_arquivo" (id_lancamento)',
+        '''
+        CREATE TABLE IF NOT EXISTS "saldos_snapshot" (
+            origem TEXT NOT NULL,
+            referencia TEXT NOT NULL,
+            documento TEXT NOT NULL,
+            saldo REAL NOT NULL,
+            ate_lancamento INTEGER NOT NULL,
+            data_snapshot TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            PRIMARY KEY (origem, referencia)
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS "lancamentos_sem_update" BEFORE UPDATE ON "lancamentos" BEGIN
+            SELECT RAISE(ABORT, 'Lançamentos não podem ser alterados.');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS "lancamentos_sem_delete" BEFORE DELETE ON "lancamentos"
+        WHEN NOT EXISTS (SELECT 1 FROM "lancamentos_arquivo" WHERE id_lancamento = old.id_lancamento) BEGIN
+            SELECT RAISE(ABORT, 'Lançamentos só podem sair da tabela depois de arquivados.');
+        END
+        ''',
+        #saldos que já existiam antes do razão entram como lançamento de abertura
+        '''
+        INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos)
+        SELECT documento, 'CONTA', numero_conta, 'ABERTURA', saldo_cc, saldo_cc FROM "contas" WHERE saldo_cc <> 0
+        ''',
+        '''
+        INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos)
+        SELECT documento, 'INVESTIDOR', documento, 'ABERTURA', patrimonio, patrimonio FROM "investidor" WHERE patrimonio <> 0
+        ''',
+        '''
+        INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos)
+        SELECT documento, 'INVESTIMENTO', id_investimento, 'ABERTURA', valor_investido, valor_investido FROM "investimento" WHERE valor_investido <> 0
+        ''',
+    ]),
+    #índice parcial só com as posições de renda variável ativas, para listar os tickers em carteira
+    (4, [
+        'CREATE INDEX IF NOT EXISTS "idx_investimento_ticker" ON "investimento" (ticker) WHERE ativo = 1 AND ticker IS NOT NULL',
+    ]),
+    #preço do ativo na aplicação, para marcar a mercado as posições de renda variável
+    (5, [
+        'ALTER TABLE "investimento" ADD COLUMN preco_aplicacao REAL',
+    ]),
+    #apuração diária de juros da renda fixa: data até onde cada posição já rendeu e o controle de cada execução
+    (6, [
+        'ALTER TABLE "investimento" ADD COLUMN ultima_apuracao TEXT',
+        '''
+        CREATE TABLE IF NOT EXISTS "apuracoes" (
+            data_referencia TEXT PRIMARY KEY NOT NULL,
+            ultimo_rowid INTEGER NOT NULL DEFAULT 0,
+            posicoes INTEGER NOT NULL DEFAULT 0,
+            juros REAL NOT NULL DEFAULT 0.0,
+            iniciada_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            concluida_em TEXT
+        )
+        ''',
+    ]),
+    #score de crédito calculado em lote; qualquer lançamento de conta ou patrimônio invalida o score do cliente
+    (7, [
+        '''
+        CREATE TABLE IF NOT EXISTS "score_credito" (
+            documento TEXT PRIMARY KEY NOT NULL,
+            score INTEGER NOT NULL,
+            saldo_medio REAL NOT NULL,
+            patrimonio REAL NOT NULL,
+            movimentacoes INTEGER NOT NULL,
+            calculado_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (documento) REFERENCES clientes(documento) ON DELETE CASCADE
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS "score_credito_invalidar" AFTER INSERT ON "lancamentos"
+        WHEN new.origem IN ('CONTA', 'INVESTIDOR') BEGIN
+            DELETE FROM "score_credito" WHERE documento = new.documento;
+        END
+        ''',
+    ]),
+    #respostas guardadas por Idempotency-Key (services/idempotencia.py); expira_em em segundos unix
+    (8, [
+        '''
+        CREATE TABLE IF NOT EXISTS "idempotencia" (
+            chave TEXT PRIMARY KEY NOT NULL,
+            impressao BLOB NOT NULL,
+            resposta TEXT NOT NULL,
+            expira_em REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS "idx_idempotencia_expira_em" ON "idempotencia" (expira_em)',
+    ]),
+    #sequência dos números de conta (services/identificadores.py); os números sequenciais têm 9 dígitos
+    #com o verificador, então não colidem com os de 8 dígitos sorteados antes desta versão
+    (9, [
+        '''
+        CREATE TABLE IF NOT EXISTS "sequencias" (
+            nome TEXT PRIMARY KEY NOT NULL,
+            valor INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        'INSERT OR IGNORE INTO "sequencias" (nome, valor) VALUES (\'contas\', 0)',
+    ]),
+    #versão de cada linha para o controle otimista (ETag/If-Match nas rotas PATCH do api_banco);
+    #toda escrita nessas tabelas soma 1
+    (10, [
+        'ALTER TABLE "contas" ADD COLUMN versao INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE "investidor" ADD COLUMN versao INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE "investimento" ADD COLUMN versao INTEGER NOT NULL DEFAULT 1',
+    ]),
+]
+
+
+def versao_schema(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version;').fetchone()[0]
+
+
+#leva um banco existente até a última versão; seguro com várias apps subindo ao mesmo tempo
+def migrar_schema(conn: sqlite3.Connection) -> int:
+    if versao_schema(conn) >= MIGRACOES[-1][0]:
+        return versao_schema(conn)
+    conn.execute('BEGIN IMMEDIATE;')
+    try:
+        atual = versao_schema(conn)
+        for versao, passos in MIGRACOES:
+            if versao <= atual:
+                continue
+            for passo in passos:
+                if callable(passo):
+                    passo(conn)
+                else:
+                    conn.execute(passo)
+            conn.execute(f'PRAGMA user_version = {versao};')
+            atual = versao
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return atual
 
 
 
@@ -102,8 +575,129 @@ def inserir_cliente(nome: str, telefone: str, documento: str, correntista: bool,
             raise ValueError(f'O documento {documento} já está cadastrado.')
     
 
+#cadastro em lote: cliente, conta e investidor com executemany, uma transação por lote de `tamanho_lote` linhas.
+#recebe registros já validados (ver cliente_service.validar_lote_clientes) e devolve (inseridos, erros por linha)
+def inserir_clientes_lote(registros: list[Dict[str, Any]], tamanho_lote: int = 5000) -> Tuple[int, list[Dict[str, Any]]]:
+    inseridos, erros = 0, []
+    for inicio in range(0, len(registros), tamanho_lote):
+        lote = registros[inicio:inicio + tamanho_lote]
+        with transacao() as conn:
+            existentes = {row[0] for row in conn.execute(
+                'SELECT documento FROM "clientes" WHERE documento IN (SELECT value FROM json_each(?))',
+                (json.dumps([r['documento'] for r in lote]),)
+            )}
+            novos = []
+            for registro in lote:
+                if registro['documento'] in existentes:
+                    erros.append({"linha": registro.get('linha'), "documento": registro['documento'], "erro": f'O documento {registro["documento"]} já está cadastrado.'})
+                else:
+                    novos.append(registro)
+            try:
+                conn.execute('SAVEPOINT lote')
+                _inserir_lote(conn, novos)
+                conn.execute('RELEASE lote')
+                inseridos += len(novos)
+            except sqlite3.IntegrityError:
+                #alguma linha conflitou (ex.: documento repetido no arquivo): refaz linha a linha para isolar o erro
+                conn.execute('ROLLBACK TO lote')
+                conn.execute('RELEASE lote')
+                tentativas = get_gerador().tentativas_conta
+                for registro in novos:
+                    #com o gerador aleatório, um número de conta repetido é sorteado de novo
+                    for tentativa in range(tentativas):
+                        try:
+                            conn.execute('SAVEPOINT linha')
+                            _inserir_lote(conn, [registro])
+                            conn.execute('RELEASE linha')
+                            inseridos += 1
+                            break
+                        except sqlite3.IntegrityError as e:
+                            conn.execute('ROLLBACK TO linha')
+                            conn.execute('RELEASE linha')
+                            if tentativa == tentativas - 1 or 'numero_conta' not in str(e):
+                                erros.append({"linha": registro.get('linha'), "documento": registro['documento'], "erro": f'Impossível cadastrar: {e}'})
+                                break
+    return inseridos, erros
+
+def _inserir_lote(conn: sqlite3.Connection, registros: list[Dict[str, Any]]) -> None:
+    clientes, contas, investidores, lancamentos = [], [], [], []
+    numeros_conta = iter(get_gerador().numeros_conta(conn, sum(1 for r in registros if r.get('correntista'))))
+    for r in registros:
+        clientes.append((r['nome'], r['telefone'], r['documento'], 1 if r.get('correntista') else 0, 1 if r.get('investidor') else 0))
+        if r.get('correntista'):
+            numero_conta = next(numeros_conta)
+            saldo = float(r.get('saldo_cc') or 0)
+            contas.append((r['documento'], numero_conta, saldo))
+            if saldo:
+                lancamentos.append((r['documento'], 'CONTA', numero_conta, 'ABERTURA', saldo, saldo))
+        if r.get('investidor'):
+            perfil = getattr(r['perfil'], 'value', r['perfil'])
+            patrimonio = float(r.get('patrimonio') or 0)
+            investidores.append((r['documento'], r['nome'], r['telefone'], r['email'], patrimonio, str(perfil).upper()))
+            if patrimonio:
+                lancamentos.append((r['documento'], 'INVESTIDOR', r['documento'], 'ABERTURA', patrimonio, patrimonio))
+    conn.executemany('INSERT INTO "clientes" (nome, telefone, documento, correntista, investidor) VALUES (?, ?, ?, ?, ?)', clientes)
+    conn.executemany('INSERT INTO "contas" (documento, numero_conta, saldo_cc) VALUES (?, ?, ?)', contas)
+    conn.executemany('INSERT INTO "investidor" (documento, nome, telefone, email, patrimonio, perfil) VALUES (?, ?, ?, ?, ?, ?)', investidores)
+    conn.executemany('INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos) VALUES (?, ?, ?, ?, ?, ?)', lancamentos)
+    
+
+#cadastro completo numa única transação: cliente, conta (se correntista) e investidor (se investidor);
+#uma falha no meio desfaz tudo. Devolve None se o documento já estava cadastrado
+def onboarding_db(nome: str, telefone: str, documento: str, correntista: bool, investidor: bool, saldo_cc: float = 0.0,
+                  email: Optional[str] = None, patrimonio: Optional[float] = None, perfil: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    saldo_cc, patrimonio = float(saldo_cc or 0), float(patrimonio or 0)
+    with transacao() as conn:
+        cliente = conn.execute(
+            '''
+            INSERT INTO "clientes" (nome, telefone, documento, correntista, investidor) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (documento) DO NOTHING RETURNING *
+            ''',
+            (nome, telefone, documento, 1 if correntista else 0, 1 if investidor else 0)
+        ).fetchone()
+        if cliente is None:
+            return None
+
+        conta = None
+        if correntista:
+            gerador = get_gerador()
+            for tentativa in range(gerador.tentativas_conta):
+                try:
+                    conta = conn.execute(
+                        'INSERT INTO "contas" (documento, numero_conta, saldo_cc) VALUES (?, ?, ?) RETURNING *',
+                        (documento, gerador.numeros_conta(conn)[0], saldo_cc)
+                    ).fetchone()
+                    break
+                except sqlite3.IntegrityError:
+                    if tentativa == gerador.tentativas_conta - 1:
+                        raise ValueError('Impossível gerar um número de conta livre.')
+            if saldo_cc:
+                movimentacao.registrar_lancamento(conn, documento, 'CONTA', conta['numero_conta'], 'ABERTURA', saldo_cc, saldo_cc)
+
+        investidor_row = None
+        if investidor:
+            try:
+                investidor_row = conn.execute(
+                    'INSERT INTO "investidor" (documento, nome, telefone, email, patrimonio, perfil) VALUES (?, ?, ?, ?, ?, ?) RETURNING *',
+                    (documento, nome, telefone, email, patrimonio, str(getattr(perfil, 'value', perfil) or '').upper())
+                ).fetchone()
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f'Impossível cadastrar investidor: {e}')
+            if patrimonio:
+                movimentacao.registrar_lancamento(conn, documento, 'INVESTIDOR', documento, 'ABERTURA', patrimonio, patrimonio)
+        invalidar_consultas(documento)
+        return {
+            "cliente": dict(cliente),
+            "conta": dict(conta) if conta else None,
+            "investidor": dict(investidor_row) if investidor_row else None,
+        }
+
+
 #busca o cliente por CPF
 def busca_cliente(documento: str) -> Optional[Dict[str, Any]]:
+    return _consulta_em_cache('clientes', documento, _busca_cliente)
+
+def _busca_cliente(documento: str) -> Optional[Dict[str, Any]]:
     with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
@@ -113,21 +707,34 @@ def busca_cliente(documento: str) -> Optional[Dict[str, Any]]:
         row = cursor.fetchone()
         return dict(row) if row else None
 
-#buscar cliente por nome
-def busca_cliente_por_nome(nome: str) -> list[Dict[str, Any]]:
+#buscar cliente por nome (full-text, cada palavra casa pelo prefixo, ex.: "jo silv" -> "João da Silva")
+def busca_cliente_por_nome(nome: str, pagina: int = 1, tamanho: int = 20) -> list[Dict[str, Any]]:
+    if pagina < 1 or tamanho < 1:
+        raise ValueError('Página e tamanho devem ser maiores que zero.')
+    termos = re.findall(r'\w+', nome or '')
+    if not termos:
+        return []
+    #cada termo vira uma string fts entre aspas, então caracteres especiais não quebram a consulta
+    consulta = ' '.join(f'"{termo}"*' for termo in termos)
     with get_connection() as conn:
-        conn.row_factory = sqlite3.Row
-
         cursor = conn.cursor()
-        #collate nocase ignora letras maiusculas e minusculas
         cursor.execute(
-            'SELECT * FROM "clientes" WHERE nome LIKE ? COLLATE NOCASE',
-            (f"%{nome}%",)
+            '''
+            SELECT c.* FROM "clientes_fts" f
+            JOIN "clientes" c ON c.rowid = f.rowid
+            WHERE "clientes_fts" MATCH ?
+            ORDER BY f.rank
+            LIMIT ? OFFSET ?
+            ''',
+            (consulta, tamanho, (pagina - 1) * tamanho)
         )
-        rows = cursor.fetchall()
-        print(f'Linhas encontradas{len(rows)}')
-        return [dict(r) for r in rows]
-    
+        return [dict(r) for r in cursor.fetchall()]
+
+#o índice usa o rowid de clientes, que o VACUUM pode renumerar: reconstruir depois de um VACUUM
+def reconstruir_indice_nomes() -> None:
+    with get_connection() as conn:
+        conn.execute('INSERT INTO "clientes_fts" ("clientes_fts") VALUES (\'rebuild\')')
+
 #atualiza cadastro do client    
 def atualiza_cliente_db(documento: str, nome: str, telefone: str) -> Dict[str, Any]:
     with get_connection() as conn:
@@ -137,6 +744,7 @@ def atualiza_cliente_db(documento: str, nome: str, telefone: str) -> Dict[str, A
             (nome, telefone, documento)
         )
         conn.commit()
+        invalidar_consultas(documento)
         if cursor.rowcount == 0:
             return None
         return (f'Cliente atualizado: \n Documento: {documento},\n Nome: {nome}, \n Telefone: {telefone}\n')
@@ -164,6 +772,7 @@ def deletar_cliente(documento: str):
             cursor = conn.cursor()
             cursor.execute('DELETE FROM "clientes" WHERE documento = ?', (documento,))
             conn.commit()
+            invalidar_consultas(documento)
             return True
         except Exception as e:
             conn.rollback()
@@ -182,26 +791,26 @@ def nova_conta(documento: str, saldo_cc: float) -> Dict[str, Any]:
 
         if cursor.fetchone() is None:
             raise ValueError(f'Nenhum cliente cadastrado com o CPF: {documento}')
-        numero_conta = str(int(uuid.uuid4().int % 10 ** 8)).zfill(8)
+        numero_conta = get_gerador().numeros_conta(conn)[0]
         try:
             cursor.execute(
-                'INSERT INTO "contas" (documento, numero_conta, saldo_cc) VALUES (?,?,?)',
+                'INSERT INTO "contas" (documento, numero_conta, saldo_cc) VALUES (?,?,?) RETURNING *',
                 (documento, numero_conta, saldo_cc)
             )
+            row = cursor.fetchone()
         except sqlite3.IntegrityError as e:
             raise ValueError(f'Impossível criar conta: {e}')
-        
-        conta_id = cursor.lastrowid
-        cursor.execute(
-            'SELECT * FROM "contas" WHERE numero_conta = ?',
-            (numero_conta,)
-        )
 
-        row = cursor.fetchone()
-        return dict(row)
+        if saldo_cc:
+            movimentacao.registrar_lancamento(conn, documento, 'CONTA', numero_conta, 'ABERTURA', saldo_cc, saldo_cc)
+    invalidar_consultas(documento)
+    return dict(row)
     
 #busca conta pelo cpf do cliente
 def busca_conta(documento: str):
+    return _consulta_em_cache('contas', documento, _busca_conta)
+
+def _busca_conta(documento: str):
     with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
@@ -215,24 +824,12 @@ def busca_conta(documento: str):
             return None
         
         
-#atualizar saldo da conta
-def atualizar_saldo_db(numero_conta: str, novo_saldo: float) -> Dict[str, Any]:
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE "contas" SET saldo_cc = ? WHERE numero_conta = ?',
-            (novo_saldo, numero_conta,)
-        )
-        conn.commit()
-        cursor.execute(
-            'SELECT * FROM "contas" WHERE numero_conta = ?',
-            (numero_conta,)
-        )
-        row = cursor.fetchone()
-        if row:
-            return dict(row)
-        else:
-            raise ValueError(f'Conta não encontrada.')
+#atualizar saldo da conta; com `versao`, levanta ConflitoVersao se a conta já mudou
+def atualizar_saldo_db(numero_conta: str, novo_saldo: float, versao: Optional[int] = None) -> Dict[str, Any]:
+    with transacao() as conn:
+        conta = movimentacao.ajustar_saldo_conta(conn, numero_conta, novo_saldo, versao=versao)
+        invalidar_consultas(conta['documento'])
+        return conta
         
 #cadastro do investidor
 def cadastrar_investidor_db(documento: str, nome: str, telefone: str, email: str, patrimonio: float, perfil: str):
@@ -243,6 +840,8 @@ def cadastrar_investidor_db(documento: str, nome: str, telefone: str, email: str
                 'INSERT INTO "investidor" (documento, nome, telefone, email, patrimonio, perfil) VALUES (?, ?, ?, ?, ?, ?)',
                 (documento, nome, telefone, email, patrimonio, perfil)
             )
+            if patrimonio:
+                movimentacao.registrar_lancamento(conn, documento, 'INVESTIDOR', documento, 'ABERTURA', patrimonio, patrimonio)
             conn.commit()
             cursor.execute('SELECT * FROM "investidor" WHERE documento = ?', (documento,))
             row = cursor.fetchone()
@@ -255,25 +854,38 @@ def cadastrar_investidor_db(documento: str, nome: str, telefone: str, email: str
 
 
 #atualizar dados do investidor
-def atualiza_investidor_db(documento: str, telefone: str, email: str, patrimonio: float, perfil: str):
-    with get_connection() as conn:
+#devolve o investidor atualizado (None se não existe); com `versao`, levanta ConflitoVersao se ele já mudou
+def atualiza_investidor_db(documento: str, telefone: str, email: str, patrimonio: float, perfil: str,
+                           nome: Optional[str] = None, versao: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    with transacao() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE "investidor" SET telefone = ?, email = ?, patrimonio = ?, perfil = ? WHERE documento = ?',
-            (telefone, email, patrimonio, perfil, documento)
-        )
-        conn.commit()
-        if cursor.rowcount == 0:
+        anterior = cursor.execute('SELECT patrimonio, versao FROM "investidor" WHERE documento = ?', (documento,)).fetchone()
+        if anterior is None:
             return None
-        return(f'Cliente atualizado: \n CPF: {documento}, \n Email: {email}, \n Telefone: {telefone}, \n Patrimônio: {patrimonio}, \n Perfil: {perfil}')
+        row = cursor.execute(
+            '''
+            UPDATE "investidor" SET nome = COALESCE(?, nome), telefone = ?, email = ?, patrimonio = ?, perfil = ?, versao = versao + 1
+            WHERE documento = ? AND versao = ? RETURNING *
+            ''',
+            (nome, telefone, email, patrimonio, perfil, documento, anterior['versao'] if versao is None else versao)
+        ).fetchone()
+        if row is None:
+            raise movimentacao.ConflitoVersao(anterior['versao'])
+        invalidar_consultas(documento)
+        if float(patrimonio) != anterior['patrimonio']:
+            movimentacao.registrar_lancamento(conn, documento, 'INVESTIDOR', documento, 'AJUSTE', float(patrimonio) - anterior['patrimonio'], patrimonio)
+        return dict(row)
 
        
 #buscar cadastro do investidor pelo documento
 def busca_investidor_db(documento: str):
+    return _consulta_em_cache('investidor', documento, _busca_investidor_db)
+
+def _busca_investidor_db(documento: str):
     with get_connection() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute('SELECT documento, nome, perfil FROM "investidor" WHERE documento = ?', (documento,))
+        cursor.execute('SELECT documento, nome, perfil, versao FROM "investidor" WHERE documento = ?', (documento,))
         row = cursor.fetchone()
 
         if row:
@@ -281,51 +893,33 @@ def busca_investidor_db(documento: str):
         return None
         
 
-#criar novo investimento
-def novo_investimento_db(documento: str, tipo: TipoEnum, valor_investido: float, rentabilidade: float, ativo: bool, ticker: str = None):
+#criar novo investimento: débito na conta, aplicação e patrimônio numa única transação
+def novo_investimento_db(documento: str, tipo: TipoEnum, valor_investido: float, rentabilidade: float, ativo: bool, ticker: str = None, preco_aplicacao: float = None):
     ativo = 1 if ativo else 0
-    id_investimento = str(uuid.uuid4())
-    with get_connection() as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        #antes de criar o investimento, verificar se o cliente existe e se é investidor
+    id_investimento = get_gerador().id_investimento()
+    with transacao() as conn:
         cursor = conn.cursor()
+        #antes de criar o investimento, verificar se o cliente existe e se é investidor
         cursor.execute('SELECT 1 FROM "investidor" WHERE documento = ?', (documento,))
         if cursor.fetchone() is None:
             raise ValueError(f'O CPF {documento} não está associado à nenhum investidor.')
-        #verificar se o cliente tem saldo disponível para investir
         try:
-            saldo = cursor.execute('SELECT saldo_cc FROM "contas" WHERE documento = ?', (documento,)).fetchone()
-            saldo = float(saldo[0])
-            if valor_investido > saldo:
-                raise ValueError('Saldo insuficiente para realizar o investimento.')
-            else:
-                saldo -= valor_investido
-        except sqlite3.IntegrityError as e:
-            raise Exception(f'Erro ao verificar o saldo da conta: {e}')
-
+            movimentacao.debitar_conta(conn, documento, valor_investido, 'INVESTIMENTO')
+        except ValueError as e:
+            raise ValueError(f'Impossível realizar o investimento: {e}')
 
         try:
             cursor.execute(
-                'INSERT INTO "investimento" (id_investimento, documento, tipo, ticker, valor_investido, rentabilidade, ativo) VALUES (?, ?, ?, ?, ?, ?, ?)', 
-                (id_investimento, documento, tipo, ticker, valor_investido, rentabilidade, ativo) 
+                'INSERT INTO "investimento" (id_investimento, documento, tipo, ticker, valor_investido, rentabilidade, ativo, preco_aplicacao) VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING *', 
+                (id_investimento, documento, tipo, ticker, valor_investido, rentabilidade, ativo, preco_aplicacao) 
             )
+            row = cursor.fetchone()
         except sqlite3.IntegrityError as e:
             raise ValueError(f'Impossível criar investimento: {e}')
-        
-        investimento_salvo = cursor.lastrowid
-        cursor.execute('SELECT * FROM "investimento" WHERE id_investimento = ?', (id_investimento,))
-        row = cursor.fetchone()
-        
-        patrimonio = cursor.execute('SELECT patrimonio from "investidor" WHERE documento = ?', (documento,)).fetchone()
-        patrimonio = float(patrimonio[0])
-
-
-        patrimonio += valor_investido
-        if row:
-            cursor.execute('UPDATE "contas" SET saldo_cc = ? WHERE documento = ?', (saldo, documento,))
-            cursor.execute('UPDATE "investidor" SET patrimonio = ? WHERE documento = ?', (patrimonio, documento,))
-            conn.commit()
 
+        movimentacao.registrar_lancamento(conn, documento, 'INVESTIMENTO', id_investimento, 'APLICACAO', valor_investido, valor_investido)
+        movimentacao.ajustar_patrimonio(conn, documento, valor_investido, 'INVESTIMENTO')
+        invalidar_consultas(documento)
         return dict(row)
     
 #buscar investimento pelo ID
@@ -352,57 +946,162 @@ def busca_investimento_doc(documento: str):
         else:
             return None
 
-#atualizar dados do investimentoados do investimento
-def atualiza_investimento_db(id_investimento: str,  novo_valor: float, ativo: bool, tipo: TipoEnum, documento: str):
+#documentos com posição ativa, em ordem e em páginas (para avaliar a base inteira em lotes)
+def documentos_com_posicao_db(limite: int = 10000, apos: str = '') -> list[str]:
+    with get_connection() as conn:
+        rows = conn.execute(
+            'SELECT DISTINCT documento FROM "investimento" WHERE documento > ? AND ativo = 1 ORDER BY documento LIMIT ?',
+            (apos, limite)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+#tickers distintos com posição ativa (percorre só o índice parcial)
+def tickers_em_carteira_db() -> list[str]:
+    with get_connection() as conn:
+        rows = conn.execute('SELECT DISTINCT ticker FROM "investimento" WHERE ativo = 1 AND ticker IS NOT NULL').fetchall()
+        return [row[0] for row in rows]
+
+#página de investimentos do cliente em ordem de aplicação; `apos` é a chave (data_aplicacao, id_investimento)
+#do último item da página anterior, então cada página é uma busca direta no índice, sem OFFSET
+def pagina_investimentos_doc(documento: str, limite: int = 50, apos: Optional[Tuple[str, str]] = None) -> list[Dict[str, Any]]:
+    if limite < 1:
+        raise ValueError('O limite deve ser maior que zero.')
+    data_apos, id_apos = apos if apos else ('', '')
     with get_connection() as conn:
         cursor = conn.cursor()
-        patrimonio = cursor.execute('SELECT patrimonio from "investidor" WHERE documento = ?', (documento,)).fetchone()
-        patrimonio = float(patrimonio[0])
-        valor_investido = cursor.execute('SELECT valor_investido from "investimento" WHERE id_investimento = ?', (id_investimento,)).fetchone()
-        valor_investido = float(valor_investido[0])
-        novo_valor += valor_investido
+        cursor.execute(
+            '''
+            SELECT * FROM "investimento"
+            WHERE documento = ? AND (data_aplicacao, id_investimento) > (?, ?)
+            ORDER BY data_aplicacao, id_investimento
+            LIMIT ?
+            ''',
+            (documento, data_apos, id_apos, limite)
+        )
+        return [dict(row) for row in cursor.fetchall()]
 
-        if tipo == 'RENDA FIXA':
-            try:
-                saldo = cursor.execute('SELECT saldo_cc FROM "contas" WHERE documento = ?', (documento,)).fetchone()
-                saldo = float(saldo[0])
-                if novo_valor > saldo:
-                    raise ValueError('Saldo insuficiente para realizar o investimento.')
-            except sqlite3.IntegrityError as e:
-                raise Exception(f'Erro ao verificar o saldo da conta: {e}')
-            cursor.execute('UPDATE "investimento" SET valor_investido = ?, ativo = ? WHERE id_investimento = ?', (novo_valor, ativo, id_investimento))
-            conn.commit()
-            if cursor.rowcount == 0:
-                return None
-        
-        return (f'Investimento atualizado: \n ID: {id_investimento}, \n Valor investido: R${novo_valor}, \n Tipo: {tipo}, \n Status: {ativo}')
+#percorre todos os investimentos do cliente em lotes, sem carregar a lista inteira
+def iterar_investimentos_doc(documento: str, lote: int = 500) -> Iterator[Dict[str, Any]]:
+    apos = None
+    while True:
+        pagina = pagina_investimentos_doc(documento, lote, apos)
+        yield from pagina
+        if len(pagina) < lote:
+            return
+        apos = (pagina[-1]['data_aplicacao'], pagina[-1]['id_investimento'])
+
+#cursor opaco usado nas respostas paginadas
+def codificar_cursor(*chave: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+
+#o cursor vem do cliente: além do base64/json, confere que é a chave (data_aplicacao, id_investimento)
+def decodificar_cursor(cursor: str, campos: int = 2) -> list:
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor de paginação inválido.')
+    if not isinstance(chave, list) or len(chave) != campos or not all(isinstance(valor, str) for valor in chave):
+        raise ValueError('Cursor de paginação inválido.')
+    return chave
+
+#aporte adicional em renda fixa: debita a conta e soma ao valor investido na mesma transação
+def atualiza_investimento_db(id_investimento: str,  novo_valor: float, ativo: bool, tipo: TipoEnum, documento: str, versao: Optional[int] = None):
+    if novo_valor < 0:
+        raise ValueError('O valor do aporte não pode ser negativo.')
+    ativo = 1 if ativo else 0
+    if tipo != TipoEnum.RENDA_FIXA:
+        return (f'Investimento atualizado: \n ID: {id_investimento}, \n Tipo: {tipo}, \n Status: {ativo}')
+
+    with transacao() as conn:
+        #a transação já tem o lock de escrita: a versão lida aqui é a que o UPDATE abaixo incrementa
+        if versao is not None:
+            atual = conn.execute(
+                'SELECT versao FROM "investimento" WHERE id_investimento = ? AND documento = ?', (id_investimento, documento)
+            ).fetchone()
+            if atual is not None and atual['versao'] != versao:
+                raise movimentacao.ConflitoVersao(atual['versao'])
+        if novo_valor > 0:
+            #o que já estava aplicado rende até hoje antes do aporte: a apuração seguinte conta os dias
+            #a partir daqui sobre o valor novo, sem juros retroativos para o dinheiro que acabou de entrar
+            movimentacao.apurar_juros_posicao(conn, id_investimento, documento, time.strftime('%Y-%m-%d'))
+            movimentacao.debitar_conta(conn, documento, novo_valor, 'INVESTIMENTO')
+            movimentacao.aplicar_investimento(conn, id_investimento, documento, novo_valor, 'APORTE')
+            movimentacao.ajustar_patrimonio(conn, documento, novo_valor, 'INVESTIMENTO')
+            invalidar_consultas(documento)
+        row = conn.execute(
+            'UPDATE "investimento" SET ativo = ?, versao = versao + 1 WHERE id_investimento = ? AND documento = ? RETURNING *',
+            (ativo, id_investimento, documento)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(row)
     
     
-# #excluir investimento
+#retirada (total ou parcial) do investimento: o valor volta para a conta na mesma transação
 def retirada_investimento_db(id_investimento: str, valor_retirada: float, documento: str):
-    valor = busca_investimento_db(id_investimento).get('valor_investido')
-    valor = float(valor)
-    #verifica se a retirada é maior do que o valor investido
-    if valor < valor_retirada:
-        raise Exception('Saldo insuficiente para retirada.')
-    else:
-        valor -= valor_retirada
-        saldo_conta_atualizado = busca_conta(documento).get('saldo_cc') + valor_retirada
-        patrimonio_atualizado = busca_investidor_db(documento).get('patrimonio') - valor
-
-        with get_connection() as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE "investimentos" SET valor_investido = ? WHERE id_investimento = ?', (valor, id_investimento,)
-            )
-            #atualizar o saldo da conta com o valor do saque
-            cursor.execute('UPDATE "contas" SET saldo_cc = ? WHERE documento = ?', (saldo_conta_atualizado, documento,))
-            #atualizar patrimonio do investidor
-            cursor.execute('UPDATE "investidor" SET patrimonio = ? WHERE documento = ?', (patrimonio_atualizado, documento,))
+    with transacao() as conn:
+        movimentacao.resgatar_investimento(conn, id_investimento, documento, valor_retirada)
+        #atualizar o saldo da conta com o valor do saque
+        movimentacao.creditar_conta(conn, documento, valor_retirada, 'RESGATE')
+        #atualizar patrimonio do investidor
+        movimentacao.ajustar_patrimonio(conn, documento, -valor_retirada, 'RESGATE')
+        invalidar_consultas(documento)
+    return (f'Uma retirada no valor de R${valor_retirada} foi iniciada. Verifique o saldo em conta.')
 
-            conn.commit()
-        return (f'Uma retirada no valor de R${valor} foi iniciada. Verifique o saldo em conta.')
+
+#extrato do razão, do lançamento mais recente para o mais antigo; antes_de é o id do último item da página anterior
+def extrato_db(documento: str, origem: str = 'CONTA', limite: int = 50, antes_de: Optional[int] = None) -> list[Dict[str, Any]]:
+    if limite < 1:
+        raise ValueError('O limite deve ser maior que zero.')
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT id_lancamento, referencia, historico, valor, saldo_apos, data_lancamento FROM "lancamentos"
+            WHERE documento = ? AND origem = ? AND id_lancamento < ?
+            ORDER BY id_lancamento DESC
+            LIMIT ?
+            ''',
+            (documento, origem, antes_de if antes_de is not None else 2 ** 63 - 1, limite)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+#percorre o extrato inteiro em lotes, do mais recente para o mais antigo
+def iterar_extrato(documento: str, origem: str = 'CONTA', lote: int = 500) -> Iterator[Dict[str, Any]]:
+    antes_de = None
+    while True:
+        pagina = extrato_db(documento, origem, lote, antes_de)
+        yield from pagina
+        if len(pagina) < lote:
+            return
+        antes_de = pagina[-1]['id_lancamento']
+
+#grava o saldo de cada conta/investidor/investimento no último lançamento anterior a `ate_data`
+def gerar_snapshot_saldos(ate_data: str) -> int:
+    with transacao() as conn:
+        cursor = conn.execute(
+            '''
+            INSERT OR REPLACE INTO "saldos_snapshot" (origem, referencia, documento, saldo, ate_lancamento)
+            SELECT origem, referencia, documento, saldo_apos, MAX(id_lancamento) FROM "lancamentos"
+            WHERE data_lancamento < ?
+            GROUP BY origem, referencia
+            ''',
+            (ate_data,)
+        )
+        return cursor.rowcount
+
+#tira da tabela quente os lançamentos cobertos por um snapshot, movendo-os para lancamentos_arquivo
+def compactar_lancamentos(dias_retencao: int = 90) -> Dict[str, int]:
+    with get_connection() as conn:
+        ate_data = conn.execute("SELECT datetime('now', 'localtime', ?)", (f'{-int(dias_retencao)} days',)).fetchone()[0]
+    snapshots = gerar_snapshot_saldos(ate_data)
+    with transacao() as conn:
+        limite = conn.execute('SELECT MAX(id_lancamento) FROM "lancamentos" WHERE data_lancamento < ?', (ate_data,)).fetchone()[0]
+        if limite is None:
+            return {"snapshots": snapshots, "arquivados": 0}
+        conn.execute('INSERT OR IGNORE INTO "lancamentos_arquivo" SELECT * FROM "lancamentos" WHERE id_lancamento <= ?', (limite,))
+        arquivados = conn.execute('DELETE FROM "lancamentos" WHERE id_lancamento <= ?', (limite,)).rowcount
+    return {"snapshots": snapshots, "arquivados": arquivados}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from services import database
+
+#'dedicado': executor próprio do banco, do mesmo tamanho do pool de conexões
+#'padrao': usa o executor padrão do event loop (comportamento das rotas síncronas)
+DB_EXECUTOR = os.getenv('BANCO_DB_EXECUTOR', 'dedicado')
+DB_WORKERS = int(os.getenv('BANCO_DB_WORKERS', str(database.POOL_TAMANHO)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def iniciar_executor_db() -> None:
+    global _executor
+    if DB_EXECUTOR == 'dedicado' and _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='banco-db')
+
+
+def fechar_executor_db() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+#roda uma função bloqueante da camada de dados sem travar o event loop; leva junto o contexto
+#(ex.: a contagem de sql da requisição), como o run_in_threadpool
+async def executar(funcao: Callable[..., Any], *args, **kwargs) -> Any:
+    if DB_EXECUTOR == 'dedicado' and _executor is None:
+        iniciar_executor_db()
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(contexto.run, funcao, *args, **kwargs))
+
+
+async def busca_cliente(documento: str) -> Optional[Dict[str, Any]]:
+    return await executar(database.busca_cliente, documento)
+
+
+async def busca_conta(documento: str) -> Optional[Dict[str, Any]]:
+    return await executar(database.busca_conta, documento)
+
+
+async def busca_investidor_db(documento: str) -> Optional[Dict[str, Any]]:
+    return await executar(database.busca_investidor_db, documento)
+
+
+async def busca_investimento_doc(documento: str) -> Optional[List[Dict[str, Any]]]:
+    return await executar(database.busca_investimento_doc, documento)
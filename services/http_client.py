@@ -0,0 +1,55 @@
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+#timeout padrão (s) de cada chamada ao core bancário; pode ser sobrescrito por chamada
+HTTP_TIMEOUT = float(os.getenv('BANCO_HTTP_TIMEOUT', '8'))
+HTTP_TIMEOUT_CONEXAO = float(os.getenv('BANCO_HTTP_TIMEOUT_CONEXAO', '2'))
+#limites do pool keep-alive; conexões ociosas são reaproveitadas em vez de abrir um socket por chamada
+HTTP_MAX_CONEXOES = int(os.getenv('BANCO_HTTP_MAX_CONEXOES', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('BANCO_HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRA = float(os.getenv('BANCO_HTTP_KEEPALIVE_EXPIRA', '30'))
+
+_cliente: Optional[httpx.AsyncClient] = None
+_usuarios = 0
+
+
+def _novo_cliente() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_TIMEOUT_CONEXAO),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONEXOES,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRA,
+        ),
+    )
+
+
+#chamado no lifespan de cada app; o cliente é compartilhado se as apps rodarem no mesmo processo
+async def iniciar_cliente_http() -> httpx.AsyncClient:
+    global _cliente, _usuarios
+    _usuarios += 1
+    if _cliente is None:
+        _cliente = _novo_cliente()
+    return _cliente
+
+
+async def fechar_cliente_http() -> None:
+    global _cliente, _usuarios
+    _usuarios = max(_usuarios - 1, 0)
+    if _usuarios == 0 and _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+def get_cliente_http() -> httpx.AsyncClient:
+    global _cliente
+    if _cliente is None:
+        _cliente = _novo_cliente()
+    return _cliente
+
+
+#o requests ignorava parâmetros None; o httpx os enviaria vazios
+def limpar_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {chave: valor for chave, valor in params.items() if valor is not None}
@@ -0,0 +1,71 @@
+#Idempotency-Key: a resposta de uma criação ou movimentação fica guardada pela chave; a repetição da
+#mesma requisição (retry depois de timeout) recebe a resposta guardada sem executar a operação de novo
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from services.database import get_connection, transacao
+
+#por quanto tempo (segundos) uma chave responde com a resposta guardada
+IDEMPOTENCIA_TTL = float(os.getenv('BANCO_IDEMPOTENCIA_TTL', '86400'))
+IDEMPOTENCIA_LIMPEZA_INTERVALO = float(os.getenv('BANCO_IDEMPOTENCIA_LIMPEZA_INTERVALO', '3600'))
+IDEMPOTENCIA_CHAVE_MAXIMO = 255
+
+
+class ChaveIdempotenciaInvalida(ValueError):
+    """Chave vazia ou maior que IDEMPOTENCIA_CHAVE_MAXIMO."""
+
+
+class ChaveIdempotenciaReutilizada(ValueError):
+    """A chave já foi usada numa requisição com outra rota ou outros parâmetros."""
+
+
+#resumo da operação e dos argumentos: a mesma chave só vale para a mesma requisição
+def impressao_requisicao(operacao: str, *argumentos: Any) -> bytes:
+    conteudo = json.dumps([operacao, *argumentos], default = str, separators = (',', ':'))
+    return hashlib.blake2b(conteudo.encode('utf-8'), digest_size = 16).digest()
+
+
+def _resposta_guardada(conn, chave: str, impressao: bytes) -> Tuple[bool, Any]:
+    row = conn.execute(
+        'SELECT impressao, resposta FROM "idempotencia" WHERE chave = ? AND expira_em > ?',
+        (chave, time.time())
+    ).fetchone()
+    if row is None:
+        return False, None
+    if bytes(row['impressao']) != impressao:
+        raise ChaveIdempotenciaReutilizada(f'Idempotency-Key {chave} já usada em outra requisição.')
+    return True, json.loads(row['resposta'])
+
+
+#sem chave só executa; com chave, a operação e o registro da resposta entram na mesma transação,
+#então um retry concorrente espera o lock de escrita e encontra a resposta já guardada.
+#Erros não são guardados: a transação é desfeita e a requisição pode ser repetida com a mesma chave
+def executar_idempotente(chave: Optional[str], impressao: bytes, operacao: Callable[[], Any]) -> Any:
+    if chave is None:
+        return operacao()
+    if not chave or len(chave) > IDEMPOTENCIA_CHAVE_MAXIMO:
+        raise ChaveIdempotenciaInvalida(f'Idempotency-Key deve ter entre 1 e {IDEMPOTENCIA_CHAVE_MAXIMO} caracteres.')
+    #caminho rápido: leitura pela chave primária, sem pegar o lock de escrita
+    with get_connection() as conn:
+        encontrada, resposta = _resposta_guardada(conn, chave, impressao)
+    if encontrada:
+        return resposta
+    with transacao() as conn:
+        encontrada, resposta = _resposta_guardada(conn, chave, impressao)
+        if encontrada:
+            return resposta
+        resposta = operacao()
+        conn.execute(
+            'INSERT OR REPLACE INTO "idempotencia" (chave, impressao, resposta, expira_em) VALUES (?, ?, ?, ?)',
+            (chave, impressao, json.dumps(resposta, ensure_ascii = False, default = str), time.time() + IDEMPOTENCIA_TTL)
+        )
+    return resposta
+
+
+#apaga as chaves vencidas (roda no agendador do api_banco)
+def limpar_idempotencia() -> int:
+    with transacao() as conn:
+        return conn.execute('DELETE FROM "idempotencia" WHERE expira_em <= ?', (time.time(),)).rowcount
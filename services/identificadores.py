@@ -0,0 +1,126 @@
+#geração dos identificadores: número de conta por sequência no próprio banco (sem colisão) com dígito
+#verificador e ids de investimento ordenados no tempo (UUIDv7), que entram sempre no fim do índice da chave
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+#'sequencial' (padrão) ou 'aleatorio' (esquema antigo: uuid4 % 10**8 e uuid4, mantido para comparação)
+GERADOR_IDS = os.getenv('BANCO_GERADOR_IDS', 'sequencial')
+
+#sequencial de 8 dígitos + dígito verificador: 9 caracteres, nunca igual aos números antigos de 8
+DIGITOS_CONTA = 8
+
+
+#módulo 11 com pesos 2..9 da direita para a esquerda; resto 0 ou 1 vira 0
+def digito_verificador(numero: str) -> str:
+    soma = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(numero)))
+    resto = soma % 11
+    return '0' if resto < 2 else str(11 - resto)
+
+
+def formatar_numero_conta(sequencial: int) -> str:
+    if not 0 < sequencial < 10 ** DIGITOS_CONTA:
+        raise ValueError(f'Sequencial de conta fora do intervalo: {sequencial}')
+    numero = str(sequencial).zfill(DIGITOS_CONTA)
+    return numero + digito_verificador(numero)
+
+
+def numero_conta_valido(numero_conta: str) -> bool:
+    return (len(numero_conta) == DIGITOS_CONTA + 1 and numero_conta.isdigit()
+            and digito_verificador(numero_conta[:-1]) == numero_conta[-1])
+
+
+#UUIDv7 (RFC 9562): 48 bits de milissegundos unix, versão, 12 bits de rand_a, variante e 62 bits de rand_b.
+#`aleatorio` (10 bytes) permite gerar ids determinísticos, como no gerador de bases
+def uuid7(milissegundos: Optional[int] = None, aleatorio: Optional[bytes] = None) -> str:
+    if milissegundos is None:
+        milissegundos = time.time_ns() // 1_000_000
+    aleatorio = int.from_bytes(aleatorio if aleatorio is not None else secrets.token_bytes(10), 'big')
+    rand_a = (aleatorio >> 62) & 0xFFF
+    rand_b = aleatorio & ((1 << 62) - 1)
+    valor = ((milissegundos & ((1 << 48) - 1)) << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b
+    return str(uuid.UUID(int=valor))
+
+
+class GeradorIds(ABC):
+    """Gera números de conta e ids de investimento.
+
+    numeros_conta roda dentro da transação de quem grava a conta, então pode
+    reservar números no próprio banco; id_investimento não precisa do banco.
+    """
+
+    nome = 'base'
+    #quantas vezes gravar uma conta com números novos quando o número já existe (só quem sorteia colide)
+    tentativas_conta = 1
+
+    @abstractmethod
+    def numeros_conta(self, conn: sqlite3.Connection, quantidade: int = 1) -> List[str]:
+        ...
+
+    @abstractmethod
+    def id_investimento(self) -> str:
+        ...
+
+
+class GeradorSequencial(GeradorIds):
+    nome = 'sequencial'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ultimo = (0, 0)
+
+    #reserva `quantidade` números de uma vez; o UPDATE pega o lock de escrita, então duas transações
+    #nunca recebem o mesmo número, e um rollback devolve os números junto com as contas
+    def numeros_conta(self, conn, quantidade = 1):
+        if quantidade < 1:
+            return []
+        fim = conn.execute(
+            'UPDATE "sequencias" SET valor = valor + ? WHERE nome = \'contas\' RETURNING valor', (quantidade,)
+        ).fetchone()[0]
+        return [formatar_numero_conta(sequencial) for sequencial in range(fim - quantidade + 1, fim + 1)]
+
+    #monotônico no processo: no mesmo milissegundo, rand_a vira contador
+    def id_investimento(self):
+        aleatorio = secrets.token_bytes(10)
+        with self._lock:
+            agora = time.time_ns() // 1_000_000
+            ultimo_ms, contador = self._ultimo
+            if agora > ultimo_ms:
+                ultimo_ms, contador = agora, (aleatorio[0] << 8 | aleatorio[1]) >> 5
+            else:
+                contador += 1
+                if contador > 0xFFF:
+                    ultimo_ms, contador = ultimo_ms + 1, 0
+            self._ultimo = (ultimo_ms, contador)
+        return uuid7(ultimo_ms, (contador << 62 | int.from_bytes(aleatorio, 'big') & ((1 << 62) - 1)).to_bytes(10, 'big'))
+
+
+class GeradorAleatorio(GeradorIds):
+    nome = 'aleatorio'
+    tentativas_conta = 3
+
+    def numeros_conta(self, conn, quantidade = 1):
+        return [str(int(uuid.uuid4().int % 10 ** 8)).zfill(8) for _ in range(quantidade)]
+
+    def id_investimento(self):
+        return str(uuid.uuid4())
+
+
+GERADORES = {gerador.nome: gerador for gerador in (GeradorSequencial, GeradorAleatorio)}
+
+_gerador: GeradorIds = GERADORES[GERADOR_IDS]()
+
+
+def get_gerador() -> GeradorIds:
+    return _gerador
+
+
+#troca o gerador (benchmarks e testes)
+def configurar_gerador(gerador: GeradorIds) -> None:
+    global _gerador
+    _gerador = gerador
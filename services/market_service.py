@@ -1,8 +1,46 @@
-import yfinance as yf
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from services.cache import CacheTTL
+from services.metricas import medir_chamada
+
+#cotação considerada fresca por COTACAO_TTL segundos; até COTACAO_STALE segundos ela ainda é servida
+#enquanto uma atualização roda em segundo plano (stale-while-revalidate)
+COTACAO_TTL = float(os.getenv('BANCO_COTACAO_TTL', '30'))
+COTACAO_STALE = float(os.getenv('BANCO_COTACAO_STALE', '300'))
+COTACAO_MAXIMO = int(os.getenv('BANCO_COTACAO_MAXIMO', '2048'))
+#tickers inexistentes também são lembrados, por menos tempo
+COTACAO_TTL_NEGATIVO = float(os.getenv('BANCO_COTACAO_TTL_NEGATIVO', '60'))
+COTACAO_TIMEOUT = float(os.getenv('BANCO_COTACAO_TIMEOUT', '10'))
+#intervalo (s) do aquecimento das cotações dos tickers em carteira; menor que o TTL para nunca vencerem
+COTACAO_AQUECER_INTERVALO = float(os.getenv('BANCO_COTACAO_AQUECER_INTERVALO', '20'))
+
+
+class FonteCotacoes(ABC):
+    """Provedor de cotações. `buscar` devolve {"preco", "ticker"} ou None se o ativo não existir."""
+
+    #destino nas métricas de chamadas externas
+    nome = 'cotacoes'
+
+    @abstractmethod
+    def buscar(self, ticker: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    #provedores que aceitam vários tickers numa chamada devem sobrescrever
+    def buscar_varios(self, tickers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        return {ticker: self.buscar(ticker) for ticker in tickers}
+
+
+class FonteYFinance(FonteCotacoes):
+    nome = 'yfinance'
+
+    def buscar(self, ticker: str) -> Optional[Dict[str, Any]]:
+        import yfinance as yf
 
-def buscar_ativo(ticker: str):
-    try:
-        ticker = ticker.upper().strip()
         ativo = yf.Ticker(ticker)
         info = ativo.fast_info
 
@@ -21,6 +59,161 @@ def buscar_ativo(ticker: str):
                 "ticker" : ticker
             }
         return None
+
+    #um único download para todos os tickers
+    def buscar_varios(self, tickers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        import yfinance as yf
+
+        dados = yf.download(tickers, period = "1d", group_by = "ticker", progress = False, threads = True)
+        cotacoes = {}
+        for ticker in tickers:
+            try:
+                fechamentos = (dados[ticker]['Close'] if len(tickers) > 1 else dados['Close']).dropna()
+            except KeyError:
+                fechamentos = None
+            if fechamentos is None or fechamentos.empty:
+                cotacoes[ticker] = None
+            else:
+                cotacoes[ticker] = {"preco": round(float(fechamentos.iloc[-1]), 2), "ticker": ticker}
+        return cotacoes
+
+
+class CacheCotacoes:
+    """Cache de cotações por ticker na frente de uma FonteCotacoes.
+
+    Buscas simultâneas do mesmo ticker ausente viram uma única chamada à fonte
+    (single-flight); cotações vencidas há pouco são devolvidas na hora e
+    atualizadas em segundo plano.
+    """
+
+    def __init__(self, fonte: FonteCotacoes, ttl: float = COTACAO_TTL, stale: float = COTACAO_STALE, maximo: int = COTACAO_MAXIMO):
+        self.fonte = fonte
+        self.ttl = ttl
+        self.stale = stale
+        self.cache = CacheTTL(maximo, ttl)
+        self._em_voo: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cotacoes')
+
+    def _guardar(self, ticker: str, cotacao: Optional[Dict[str, Any]]) -> None:
+        #None (ativo inexistente) também é guardado, com validade menor
+        validade = self.ttl if cotacao is not None else min(self.ttl, COTACAO_TTL_NEGATIVO)
+        self.cache.guardar(ticker, (cotacao, time.monotonic() + validade))
+
+    #busca na fonte só os tickers que ninguém está buscando; os demais esperam a busca em andamento
+    def _buscar_na_fonte(self, tickers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        meus, alheios = {}, {}
+        with self._lock:
+            for ticker in tickers:
+                if ticker in self._em_voo:
+                    alheios[ticker] = self._em_voo[ticker]
+                else:
+                    meus[ticker] = self._em_voo[ticker] = Future()
+
+        resultado = {}
+        if meus:
+            try:
+                if len(meus) == 1:
+                    ticker = next(iter(meus))
+                    with medir_chamada(self.fonte.nome, 'buscar'):
+                        cotacoes = {ticker: self.fonte.buscar(ticker)}
+                else:
+                    with medir_chamada(self.fonte.nome, 'buscar_varios'):
+                        cotacoes = self.fonte.buscar_varios(list(meus))
+                for ticker, futuro in meus.items():
+                    cotacao = cotacoes.get(ticker)
+                    self._guardar(ticker, cotacao)
+                    futuro.set_result(cotacao)
+                    resultado[ticker] = cotacao
+            except Exception as e:
+                for futuro in meus.values():
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for ticker in meus:
+                        self._em_voo.pop(ticker, None)
+        for ticker, futuro in alheios.items():
+            resultado[ticker] = futuro.result(timeout=COTACAO_TIMEOUT)
+        return resultado
+
+    def _revalidar(self, tickers: List[str]) -> None:
+        with self._lock:
+            tickers = [t for t in tickers if t not in self._em_voo]
+        if tickers:
+            self._executor.submit(self._buscar_na_fonte, tickers)
+
+    #classifica os tickers em frescos (servidos), vencidos há pouco (servidos e revalidados) e ausentes
+    def obter_varios(self, tickers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        resultado, vencidos, ausentes = {}, [], []
+        agora = time.monotonic()
+        for ticker in dict.fromkeys(tickers):
+            item = self.cache.entrada(ticker)
+            if item is not None:
+                (cotacao, vence_em), idade = item
+                if agora <= vence_em:
+                    self.cache.acertos += 1
+                    resultado[ticker] = cotacao
+                    continue
+                if cotacao is not None and idade <= self.stale:
+                    self.cache.acertos += 1
+                    resultado[ticker] = cotacao
+                    vencidos.append(ticker)
+                    continue
+            self.cache.falhas += 1
+            ausentes.append(ticker)
+        if vencidos:
+            self._revalidar(vencidos)
+        if ausentes:
+            resultado.update(self._buscar_na_fonte(ausentes))
+        return resultado
+
+    def obter(self, ticker: str) -> Optional[Dict[str, Any]]:
+        return self.obter_varios([ticker]).get(ticker)
+
+    #ignora o cache e busca de novo (usado pelo aquecimento periódico)
+    def atualizar(self, tickers: List[str], lote: int = 200) -> int:
+        for inicio in range(0, len(tickers), lote):
+            self._buscar_na_fonte(tickers[inicio:inicio + lote])
+        return len(tickers)
+
+    def fechar(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_cotacoes = CacheCotacoes(FonteYFinance())
+
+
+#troca o provedor (ex.: uma fonte falsa nos testes) e zera o cache
+def configurar_fonte(fonte: FonteCotacoes, **opcoes) -> CacheCotacoes:
+    global _cotacoes
+    _cotacoes.fechar()
+    _cotacoes = CacheCotacoes(fonte, **opcoes)
+    return _cotacoes
+
+
+def estatisticas_cotacoes() -> Dict[str, Any]:
+    return _cotacoes.cache.estatisticas()
+
+
+#cotações de vários tickers com uma única chamada ao provedor para os que não estão no cache
+def buscar_ativos(tickers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    normalizados = [t.upper().strip() for t in tickers if t and t.strip()]
+    try:
+        return _cotacoes.obter_varios(normalizados)
+    except Exception:
+        return {ticker: None for ticker in normalizados}
+
+#mantém quentes as cotações informadas (ex.: todos os tickers em carteira)
+def atualizar_cotacoes(tickers: List[str]) -> int:
+    return _cotacoes.atualizar([t.upper().strip() for t in tickers if t])
+
+
+def buscar_ativo(ticker: str):
+    try:
+        ticker = ticker.upper().strip()
+        return _cotacoes.obter(ticker)
     except Exception:
         return None
     
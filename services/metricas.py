@@ -0,0 +1,440 @@
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+#'0' desliga o middleware e a instrumentação das consultas sql
+METRICAS = os.getenv('BANCO_METRICAS', '1') == '1'
+#'1' expõe /debug/perfil (profiler por amostragem); desligado por padrão
+PROFILER = os.getenv('BANCO_PROFILER', '0') == '1'
+PROFILER_MAX_SEGUNDOS = float(os.getenv('BANCO_PROFILER_MAX_SEGUNDOS', '60'))
+#'1' expõe /admin/sql/top nas apps instrumentadas com admin (só o api_banco); desligado por padrão
+ADMIN = os.getenv('BANCO_ADMIN', '0') == '1'
+#comandos sql acima deste tempo (ms) vão para o log "services.sql", sem os valores dos parâmetros
+SQL_LENTO_MS = float(os.getenv('BANCO_SQL_LENTO_MS', '100'))
+#comandos distintos acompanhados; o que passar disso é somado em SQL_OUTROS
+SQL_MAX_COMANDOS = int(os.getenv('BANCO_SQL_MAX_COMANDOS', '2000'))
+
+logger_sql = logging.getLogger('services.sql')
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Metrica(ABC):
+    """Série de valores por combinação de rótulos, exposta no formato texto do Prometheus."""
+
+    tipo = ''
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._valores: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def _rotulos(self, valores: Tuple[str, ...], extra: str = '') -> str:
+        pares = [f'{nome}="{_escapar(str(valor))}"' for nome, valor in zip(self.rotulos, valores)]
+        if extra:
+            pares.append(extra)
+        return '{' + ','.join(pares) + '}' if pares else ''
+
+    @abstractmethod
+    def linhas(self) -> List[str]:
+        ...
+
+    def expor(self) -> str:
+        return '\n'.join([f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}', *self.linhas()])
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._valores.clear()
+
+
+class Contador(Metrica):
+    tipo = 'counter'
+
+    def somar(self, *rotulos: str, valor: float = 1.0) -> None:
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0.0) + valor
+
+    def valor(self, *rotulos: str) -> float:
+        return self._valores.get(rotulos, 0.0)
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            itens = list(self._valores.items())
+        return [f'{self.nome}{self._rotulos(r)} {v}' for r, v in itens]
+
+
+class Medidor(Contador):
+    tipo = 'gauge'
+
+
+#contador sem rótulos lido de uma função na hora da exposição, para caminhos quentes que já somam por conta própria
+class ContadorFuncao(Metrica):
+    tipo = 'counter'
+
+    def __init__(self, nome: str, ajuda: str, ler: Callable[[], float]):
+        super().__init__(nome, ajuda)
+        self.ler = ler
+
+    def linhas(self) -> List[str]:
+        return [f'{self.nome} {self.ler()}']
+
+
+class Histograma(Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    #por série: [contagem por bucket (+Inf no fim), soma, total]
+    def observar(self, valor: float, *rotulos: str) -> None:
+        with self._lock:
+            serie = self._valores.get(rotulos)
+            if serie is None:
+                serie = self._valores[rotulos] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][bisect_left(self.buckets, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def total(self, *rotulos: str) -> int:
+        serie = self._valores.get(rotulos)
+        return serie[2] if serie else 0
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            itens = [(r, list(s[0]), s[1], s[2]) for r, s in self._valores.items()]
+        linhas = []
+        for rotulos, contagens, soma, total in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                le = f'le="{limite}"'
+                linhas.append(f'{self.nome}_bucket{self._rotulos(rotulos, le)} {acumulado}')
+            le = 'le="+Inf"'
+            linhas.append(f'{self.nome}_bucket{self._rotulos(rotulos, le)} {total}')
+            linhas.append(f'{self.nome}_sum{self._rotulos(rotulos)} {soma}')
+            linhas.append(f'{self.nome}_count{self._rotulos(rotulos)} {total}')
+        return linhas
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_registro: List[Metrica] = []
+
+REQUISICOES_SEGUNDOS = Histograma('banco_http_requisicoes_segundos', 'Duração das requisições HTTP até o fim do corpo da resposta.', ('app', 'metodo', 'rota', 'status'))
+REQUISICOES_EM_ANDAMENTO = Medidor('banco_http_requisicoes_em_andamento', 'Requisições HTTP sendo atendidas.', ('app',))
+SQL_CONSULTAS_REQUISICAO = Histograma('banco_sql_consultas_por_requisicao', 'Comandos sql por requisição HTTP.', ('app', 'rota'), BUCKETS_CONSULTAS)
+SQL_SEGUNDOS_REQUISICAO = Histograma('banco_sql_segundos_por_requisicao', 'Tempo de sql por requisição HTTP.', ('app', 'rota'))
+CHAMADAS_EXTERNAS_SEGUNDOS = Histograma('banco_chamadas_externas_segundos', 'Latência das chamadas a serviços externos (core bancário, cotações).', ('destino', 'operacao', 'resultado'))
+
+
+def expor_metricas() -> str:
+    return '\n'.join(metrica.expor() for metrica in _registro) + '\n'
+
+
+def limpar_metricas() -> None:
+    for metrica in _registro:
+        metrica.limpar()
+    with _sql_lock:
+        _sql_totais[:] = [0, 0.0]
+    limpar_sql()
+
+
+#consultas sql da requisição atual; chega às threads do banco pelo contexto (run_in_threadpool e database_async)
+class _SqlRequisicao:
+    __slots__ = ('consultas', 'segundos')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+
+_sql_requisicao: ContextVar[Optional[_SqlRequisicao]] = ContextVar('sql_requisicao', default = None)
+
+
+#[comandos, segundos] de todo o processo e estatísticas por comando normalizado, sob um único lock (roda a cada comando sql)
+_sql_totais = [0, 0.0]
+_sql_comandos: Dict[str, List[float]] = {}
+_sql_normalizados: Dict[str, str] = {}
+_sql_lock = threading.Lock()
+SQL_CONSULTAS = ContadorFuncao('banco_sql_consultas_total', 'Comandos sql executados.', lambda: _sql_totais[0])
+SQL_SEGUNDOS = ContadorFuncao('banco_sql_segundos_total', 'Tempo gasto executando comandos sql.', lambda: _sql_totais[1])
+SQL_OUTROS = '<outros comandos>'
+
+_LITERAIS_SQL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+#espaços colapsados e literais trocados por ?, para agrupar o mesmo comando montado com valores diferentes
+def normalizar_sql(sql: str) -> str:
+    return _LITERAIS_SQL.sub('?', ' '.join(sql.split()))
+
+
+#só a quantidade e o tipo dos parâmetros: valores (documentos, saldos) nunca vão para o log
+def _parametros_redigidos(parametros) -> str:
+    if parametros is None:
+        return 'lote'
+    if isinstance(parametros, dict):
+        return '{' + ', '.join(f'{nome}: {type(valor).__name__}' for nome, valor in parametros.items()) + '}'
+    return '(' + ', '.join(type(valor).__name__ for valor in parametros) + ')'
+
+
+#`comandos` = 0 soma só o tempo (leitura das linhas de um comando já contado)
+def registrar_sql(sql: str, segundos: float, parametros = (), comandos: int = 1) -> None:
+    with _sql_lock:
+        _sql_totais[0] += comandos
+        _sql_totais[1] += segundos
+        normalizado = _sql_normalizados.get(sql)
+        if normalizado is None:
+            normalizado = normalizar_sql(sql)
+            if len(_sql_normalizados) < 4 * SQL_MAX_COMANDOS:
+                _sql_normalizados[sql] = normalizado
+        #[execuções, segundos, maior tempo, lentos]
+        estatistica = _sql_comandos.get(normalizado)
+        if estatistica is None:
+            if len(_sql_comandos) >= SQL_MAX_COMANDOS:
+                normalizado = SQL_OUTROS
+            estatistica = _sql_comandos.setdefault(normalizado, [0, 0.0, 0.0, 0])
+        lento = segundos * 1000 >= SQL_LENTO_MS
+        estatistica[0] += comandos
+        estatistica[1] += segundos
+        if segundos > estatistica[2]:
+            estatistica[2] = segundos
+        if lento:
+            estatistica[3] += 1
+    atual = _sql_requisicao.get()
+    if atual is not None:
+        atual.consultas += comandos
+        atual.segundos += segundos
+    if lento:
+        logger_sql.warning('sql lento (%.1f ms, %s): %s parâmetros: %s', segundos * 1000,
+                           'execução' if comandos else 'leitura', normalizado, _parametros_redigidos(parametros))
+
+
+#comandos ordenados por total, media, maximo, execucoes ou lentos
+def top_sql(ordem: str = 'total', limite: int = 20) -> List[Dict[str, object]]:
+    chaves = {'total': 1, 'execucoes': 0, 'maximo': 2, 'lentos': 3, 'media': None}
+    if ordem not in chaves:
+        raise ValueError(f'Ordem inválida: {ordem}. Use uma de {list(chaves)}.')
+    with _sql_lock:
+        itens = [(sql, list(estatistica)) for sql, estatistica in _sql_comandos.items()]
+    comandos = [
+        {
+            "sql": sql,
+            "execucoes": int(execucoes),
+            "total_ms": round(segundos * 1000, 3),
+            "media_ms": round(segundos * 1000 / execucoes, 3) if execucoes else 0.0,
+            "maximo_ms": round(maximo * 1000, 3),
+            "lentos": int(lentos),
+        }
+        for sql, (execucoes, segundos, maximo, lentos) in itens
+    ]
+    campo = {'total': 'total_ms', 'media': 'media_ms', 'maximo': 'maximo_ms'}.get(ordem, ordem)
+    return sorted(comandos, key = lambda c: c[campo], reverse = True)[:limite]
+
+
+def limpar_sql() -> None:
+    with _sql_lock:
+        _sql_comandos.clear()
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    def execute(self, sql, parametros = ()):
+        self._sql = sql
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            registrar_sql(sql, time.perf_counter() - inicio, parametros)
+
+    def executemany(self, sql, parametros):
+        self._sql = sql
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            registrar_sql(sql, time.perf_counter() - inicio, None)
+
+    #a leitura em bloco entra no tempo do comando; fetchone e a iteração linha a linha ficam de fora (custo por linha)
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            if getattr(self, '_sql', None):
+                registrar_sql(self._sql, time.perf_counter() - inicio, comandos = 0)
+
+    def fetchmany(self, *args):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            if getattr(self, '_sql', None):
+                registrar_sql(self._sql, time.perf_counter() - inicio, comandos = 0)
+
+
+#factory do sqlite3.connect: todo comando passa por um CursorInstrumentado, inclusive o atalho conn.execute
+class ConexaoInstrumentada(sqlite3.Connection):
+    def cursor(self, factory = CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros = ()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+
+_SEGMENTO_VARIAVEL = re.compile(r'/[^/]*\d[^/]*')
+
+
+#caminho sem documentos, ids e números, para não criar uma série por cliente
+def rota_normalizada(caminho: str) -> str:
+    return _SEGMENTO_VARIAVEL.sub('/{id}', caminho.split('?', 1)[0])
+
+
+@contextmanager
+def medir_chamada(destino: str, operacao: str):
+    inicio = time.perf_counter()
+    resultado = 'erro'
+    try:
+        yield
+        resultado = 'ok'
+    finally:
+        CHAMADAS_EXTERNAS_SEGUNDOS.observar(time.perf_counter() - inicio, destino, operacao, resultado)
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: latência por rota, requisições em andamento e sql por requisição.
+
+    A duração vai até o último pedaço do corpo, então respostas em streaming
+    contam o tempo todo. O cabeçalho Server-Timing leva o total e o tempo de sql
+    conhecidos no início da resposta.
+    """
+
+    def __init__(self, app, nome: str):
+        self.app = app
+        self.nome = nome
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        sql = _SqlRequisicao()
+        token = _sql_requisicao.set(sql)
+        status = 500
+        REQUISICOES_EM_ANDAMENTO.somar(self.nome)
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem['type'] == 'http.response.start':
+                status = mensagem['status']
+                tempo = (time.perf_counter() - inicio) * 1000
+                cabecalho = f'app;dur={tempo:.1f}, db;dur={sql.segundos * 1000:.1f};desc="{sql.consultas} consultas"'
+                mensagem.setdefault('headers', []).append((b'server-timing', cabecalho.encode()))
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _sql_requisicao.reset(token)
+            REQUISICOES_EM_ANDAMENTO.somar(self.nome, valor = -1)
+            rota = getattr(scope.get('route'), 'path', None) or 'sem_rota'
+            REQUISICOES_SEGUNDOS.observar(time.perf_counter() - inicio, self.nome, scope['method'], rota, str(status))
+            SQL_CONSULTAS_REQUISICAO.observar(sql.consultas, self.nome, rota)
+            SQL_SEGUNDOS_REQUISICAO.observar(sql.segundos, self.nome, rota)
+
+
+_perfil_lock = threading.Lock()
+
+
+def _pilha(frame) -> List[str]:
+    nomes = []
+    while frame is not None:
+        codigo = frame.f_code
+        nomes.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return nomes[::-1]
+
+
+#amostra as pilhas de todas as threads a cada `intervalo` segundos; devolve {pilha "thread;f1;f2...": amostras}
+#no formato "collapsed" (flamegraph.pl, speedscope). Só um perfil por vez
+def amostrar_pilhas(segundos: float, intervalo: float = 0.005) -> Dict[str, int]:
+    if not 0 < segundos <= PROFILER_MAX_SEGUNDOS or intervalo <= 0:
+        raise ValueError(f'Use 0 < segundos <= {PROFILER_MAX_SEGUNDOS:g} e intervalo > 0.')
+    if not _perfil_lock.acquire(blocking = False):
+        raise RuntimeError('Já existe um perfil em andamento.')
+    try:
+        propria = threading.get_ident()
+        contagem = Counter()
+        fim = time.monotonic() + segundos
+        while time.monotonic() < fim:
+            nomes_threads = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != propria:
+                    contagem[';'.join([nomes_threads.get(ident, str(ident)), *_pilha(frame)])] += 1
+            time.sleep(intervalo)
+        return dict(contagem.most_common())
+    finally:
+        _perfil_lock.release()
+
+
+#liga o middleware e a rota /metrics numa app FastAPI; /admin/sql/top só com `admin` e BANCO_ADMIN=1,
+#/debug/perfil só com BANCO_PROFILER=1
+def instrumentar(app, nome: str, admin: bool = False) -> None:
+    from fastapi import HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+    from starlette.concurrency import run_in_threadpool
+
+    if not METRICAS:
+        return
+    app.add_middleware(MiddlewareMetricas, nome = nome)
+
+    async def metricas():
+        return PlainTextResponse(expor_metricas(), media_type = 'text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_api_route('/metrics', metricas, methods = ['GET'], include_in_schema = False)
+
+    if admin and ADMIN:
+        #comandos sql mais caros deste processo (texto normalizado, sem parâmetros)
+        async def sql_top(ordem: str = 'total', limite: int = Query(20, ge = 1, le = 500)):
+            try:
+                return top_sql(ordem, limite)
+            except ValueError as e:
+                raise HTTPException(status_code = 400, detail = str(e))
+
+        async def sql_limpar():
+            limpar_sql()
+            return 'Estatísticas de sql zeradas.'
+
+        app.add_api_route('/admin/sql/top', sql_top, methods = ['GET'], include_in_schema = False)
+        app.add_api_route('/admin/sql/top', sql_limpar, methods = ['DELETE'], include_in_schema = False)
+
+    if PROFILER:
+        async def perfil(segundos: float = Query(10.0, gt = 0), intervalo: float = Query(0.005, gt = 0), top: int = Query(200, ge = 1)):
+            try:
+                pilhas = await run_in_threadpool(amostrar_pilhas, segundos, intervalo)
+            except ValueError as e:
+                raise HTTPException(status_code = 400, detail = str(e))
+            except RuntimeError as e:
+                raise HTTPException(status_code = 409, detail = str(e))
+            linhas = [f'{pilha} {amostras}' for pilha, amostras in list(pilhas.items())[:top]]
+            return PlainTextResponse('\n'.join(linhas) + '\n')
+
+        app.add_api_route('/debug/perfil', perfil, methods = ['GET'], include_in_schema = False)
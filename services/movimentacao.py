@@ -0,0 +1,147 @@
+import sqlite3
+from typing import Any, Dict, Optional
+
+#motor de movimentação: débitos e créditos relativos, sempre dentro da transação recebida
+#(database.transacao abre com BEGIN IMMEDIATE), então o saldo lido e o gravado são o mesmo.
+#toda variação de saldo gera um lançamento no razão ("lancamentos") na mesma transação.
+#toda escrita em contas, investidor e investimento soma 1 em "versao" (controle otimista das APIs)
+
+
+class ConflitoVersao(Exception):
+    """O registro mudou depois da versão que o cliente leu (If-Match desatualizado)."""
+
+    def __init__(self, versao_atual: int):
+        super().__init__(f'O registro está na versão {versao_atual}; leia de novo antes de alterar.')
+        self.versao_atual = versao_atual
+
+
+def _valor_positivo(valor: float) -> float:
+    valor = float(valor)
+    if valor <= 0:
+        raise ValueError('O valor da movimentação deve ser maior que zero.')
+    return valor
+
+
+#grava uma linha no razão; valor é assinado (crédito > 0, débito < 0) e saldo_apos é o total materializado
+def registrar_lancamento(conn: sqlite3.Connection, documento: str, origem: str, referencia: str, historico: str, valor: float, saldo_apos: float) -> None:
+    conn.execute(
+        'INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos) VALUES (?, ?, ?, ?, ?, ?)',
+        (documento, origem, referencia, historico, valor, saldo_apos)
+    )
+
+
+#um CPF pode ter mais de uma conta: débitos e créditos por CPF caem sempre na primeira aberta,
+#então o UPDATE mexe numa linha só e o lançamento do razão é dessa linha
+def _conta_principal(conn: sqlite3.Connection, documento: str) -> str:
+    row = conn.execute('SELECT numero_conta FROM "contas" WHERE documento = ? ORDER BY rowid LIMIT 1', (documento,)).fetchone()
+    if row is None:
+        raise ValueError(f'Nenhuma conta vinculada ao CPF {documento}')
+    return row['numero_conta']
+
+
+def debitar_conta(conn: sqlite3.Connection, documento: str, valor: float, historico: str = 'DEBITO') -> Dict[str, Any]:
+    valor = _valor_positivo(valor)
+    numero_conta = _conta_principal(conn, documento)
+    row = conn.execute(
+        'UPDATE "contas" SET saldo_cc = saldo_cc - ?, versao = versao + 1 WHERE numero_conta = ? AND saldo_cc >= ? RETURNING *',
+        (valor, numero_conta, valor)
+    ).fetchone()
+    if row is None:
+        raise ValueError('Saldo insuficiente para realizar a operação.')
+    registrar_lancamento(conn, documento, 'CONTA', numero_conta, historico, -valor, row['saldo_cc'])
+    return dict(row)
+
+
+def creditar_conta(conn: sqlite3.Connection, documento: str, valor: float, historico: str = 'CREDITO') -> Dict[str, Any]:
+    valor = _valor_positivo(valor)
+    numero_conta = _conta_principal(conn, documento)
+    row = conn.execute(
+        'UPDATE "contas" SET saldo_cc = saldo_cc + ?, versao = versao + 1 WHERE numero_conta = ? RETURNING *',
+        (valor, numero_conta)
+    ).fetchone()
+    registrar_lancamento(conn, documento, 'CONTA', numero_conta, historico, valor, row['saldo_cc'])
+    return dict(row)
+
+
+#define o saldo da conta diretamente (ajuste manual), registrando a diferença no razão;
+#com `versao`, só grava se a conta ainda estiver nela (compare-and-swap)
+def ajustar_saldo_conta(conn: sqlite3.Connection, numero_conta: str, novo_saldo: float, historico: str = 'AJUSTE',
+                        versao: Optional[int] = None) -> Dict[str, Any]:
+    anterior = conn.execute('SELECT saldo_cc, versao FROM "contas" WHERE numero_conta = ?', (numero_conta,)).fetchone()
+    if anterior is None:
+        raise ValueError('Conta não encontrada.')
+    row = conn.execute(
+        'UPDATE "contas" SET saldo_cc = ?, versao = versao + 1 WHERE numero_conta = ? AND versao = ? RETURNING *',
+        (novo_saldo, numero_conta, anterior['versao'] if versao is None else versao)
+    ).fetchone()
+    if row is None:
+        raise ConflitoVersao(anterior['versao'])
+    variacao = float(novo_saldo) - float(anterior['saldo_cc'])
+    if variacao:
+        registrar_lancamento(conn, row['documento'], 'CONTA', numero_conta, historico, variacao, row['saldo_cc'])
+    return dict(row)
+
+
+#o patrimônio pode ter sido editado manualmente, então nunca fica negativo
+def ajustar_patrimonio(conn: sqlite3.Connection, documento: str, variacao: float, historico: str = 'AJUSTE') -> Dict[str, Any]:
+    anterior = conn.execute('SELECT patrimonio FROM "investidor" WHERE documento = ?', (documento,)).fetchone()
+    if anterior is None:
+        raise ValueError(f'O CPF {documento} não está associado à nenhum investidor.')
+    row = conn.execute(
+        'UPDATE "investidor" SET patrimonio = MAX(patrimonio + ?, 0), versao = versao + 1 WHERE documento = ? RETURNING documento, patrimonio',
+        (float(variacao), documento)
+    ).fetchone()
+    variacao_real = row['patrimonio'] - anterior['patrimonio']
+    if variacao_real:
+        registrar_lancamento(conn, documento, 'INVESTIDOR', documento, historico, variacao_real, row['patrimonio'])
+    return dict(row)
+
+
+def aplicar_investimento(conn: sqlite3.Connection, id_investimento: str, documento: str, valor: float, historico: str = 'APLICACAO') -> Dict[str, Any]:
+    valor = _valor_positivo(valor)
+    row = conn.execute(
+        'UPDATE "investimento" SET valor_investido = valor_investido + ?, versao = versao + 1 WHERE id_investimento = ? AND documento = ? RETURNING *',
+        (valor, id_investimento, documento)
+    ).fetchone()
+    if row is None:
+        raise ValueError('Investimento não encontrado.')
+    registrar_lancamento(conn, documento, 'INVESTIMENTO', id_investimento, historico, valor, row['valor_investido'])
+    return dict(row)
+
+
+def resgatar_investimento(conn: sqlite3.Connection, id_investimento: str, documento: str, valor: float, historico: str = 'RESGATE') -> Dict[str, Any]:
+    valor = _valor_positivo(valor)
+    row = conn.execute(
+        'UPDATE "investimento" SET valor_investido = valor_investido - ?, versao = versao + 1 WHERE id_investimento = ? AND documento = ? AND valor_investido >= ? RETURNING *',
+        (valor, id_investimento, documento, valor)
+    ).fetchone()
+    if row is None:
+        if conn.execute('SELECT 1 FROM "investimento" WHERE id_investimento = ? AND documento = ?', (id_investimento, documento)).fetchone() is None:
+            raise ValueError('Investimento não encontrado.')
+        raise ValueError('Saldo insuficiente para retirada.')
+    registrar_lancamento(conn, documento, 'INVESTIMENTO', id_investimento, historico, -valor, row['valor_investido'])
+    return dict(row)
+
+
+#rende a posição de renda fixa até `data_referencia` (AAAA-MM-DD) com a mesma conta da apuração diária
+#(services.apuracao_service); usado antes de um aporte, para o valor novo não render pelos dias anteriores a ele
+def apurar_juros_posicao(conn: sqlite3.Connection, id_investimento: str, documento: str, data_referencia: str) -> float:
+    row = conn.execute(
+        '''
+        SELECT valor_investido, rentabilidade,
+               julianday(?) - julianday(COALESCE(ultima_apuracao, date(data_aplicacao))) AS dias
+        FROM "investimento" WHERE id_investimento = ? AND documento = ? AND ativo = 1
+        ''',
+        (data_referencia, id_investimento, documento)
+    ).fetchone()
+    if row is None or row['dias'] <= 0:
+        return 0.0
+    juros = round(row['valor_investido'] * ((1.0 + (row['rentabilidade'] or 0.0)) ** (row['dias'] / 365.0) - 1.0), 6)
+    atualizado = conn.execute(
+        'UPDATE "investimento" SET valor_investido = valor_investido + ?, ultima_apuracao = ?, versao = versao + 1 WHERE id_investimento = ? AND documento = ? RETURNING valor_investido',
+        (juros, data_referencia, id_investimento, documento)
+    ).fetchone()
+    if juros > 0:
+        registrar_lancamento(conn, documento, 'INVESTIMENTO', id_investimento, 'JUROS', juros, atualizado['valor_investido'])
+        ajustar_patrimonio(conn, documento, juros, 'JUROS')
+    return juros
@@ -0,0 +1,101 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from models.schemas import TipoEnum
+from services.database import documentos_com_posicao_db, get_connection
+from services.market_service import buscar_ativos
+
+COLUNAS_POSICAO = ['id_investimento', 'documento', 'tipo', 'ticker', 'valor_investido', 'data_aplicacao', 'rentabilidade', 'preco_aplicacao', 'ultima_apuracao']
+
+
+#posições ativas de um ou vários clientes num DataFrame (uma consulta para todos os documentos)
+def carregar_posicoes(documentos: List[str]) -> pd.DataFrame:
+    if not documentos:
+        return pd.DataFrame(columns=COLUNAS_POSICAO)
+    with get_connection() as conn:
+        return pd.read_sql_query(
+            f'''
+            SELECT {', '.join(COLUNAS_POSICAO)} FROM "investimento"
+            WHERE documento IN (SELECT value FROM json_each(?)) AND ativo = 1
+            ''',
+            conn,
+            params=(json.dumps(documentos),)
+        )
+
+
+#calcula valor_atual de todas as linhas de uma vez:
+#renda fixa rende juros compostos pela taxa anual desde a última apuração (ou desde a aplicação);
+#ações, fundos e cripto são marcados a mercado (quantidade = valor aplicado / preço na aplicação);
+#sem cotação ou sem preço de aplicação, a posição fica pelo custo
+def avaliar_posicoes(posicoes: pd.DataFrame, data_referencia: Optional[datetime] = None) -> pd.DataFrame:
+    df = posicoes.copy()
+    if df.empty:
+        return df.assign(preco_atual=[], valor_atual=[], rendimento=[])
+    data_referencia = pd.Timestamp(data_referencia or datetime.now())
+
+    valor = df['valor_investido'].to_numpy(dtype=float)
+    #valor_investido já inclui os juros apurados até ultima_apuracao; conta dias corridos, como a apuração
+    inicio = pd.to_datetime(df['ultima_apuracao'].fillna(df['data_aplicacao'].str[:10]))
+    dias = (data_referencia.normalize() - inicio).dt.days.clip(lower=0).to_numpy(dtype=float)
+    taxa = pd.to_numeric(df['rentabilidade'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    renda_fixa = (df['tipo'] == TipoEnum.RENDA_FIXA.value).to_numpy()
+
+    tickers = df.loc[~renda_fixa & df['ticker'].notna(), 'ticker'].str.upper().unique().tolist()
+    cotacoes = buscar_ativos(tickers) if tickers else {}
+    precos = {ticker: cotacao['preco'] for ticker, cotacao in cotacoes.items() if cotacao}
+    preco_atual = df['ticker'].str.upper().map(precos).to_numpy(dtype=float)
+    preco_aplicacao = pd.to_numeric(df['preco_aplicacao'], errors='coerce').to_numpy(dtype=float)
+
+    valor_rf = valor * np.power(1.0 + taxa, dias / 365.0)
+    marcavel = ~np.isnan(preco_atual) & (preco_aplicacao > 0)
+    valor_mercado = np.where(marcavel, valor / np.where(marcavel, preco_aplicacao, 1.0) * np.nan_to_num(preco_atual), valor)
+
+    df['preco_atual'] = np.where(renda_fixa, np.nan, preco_atual)
+    df['valor_atual'] = np.round(np.where(renda_fixa, valor_rf, valor_mercado), 2)
+    df['rendimento'] = np.round(df['valor_atual'] - valor, 2)
+    return df
+
+
+def _resumo(df: pd.DataFrame) -> Dict[str, Any]:
+    return {
+        "valor_investido": round(float(df['valor_investido'].sum()), 2),
+        "valor_atual": round(float(df['valor_atual'].sum()), 2),
+        "rendimento": round(float(df['rendimento'].sum()), 2),
+    }
+
+
+#posição consolidada de um cliente: totais, totais por tipo e cada posição avaliada
+def posicao_cliente(documento: str, data_referencia: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    df = avaliar_posicoes(carregar_posicoes([documento]), data_referencia)
+    if df.empty:
+        return None
+    por_tipo = {tipo: _resumo(grupo) for tipo, grupo in df.groupby('tipo')}
+    #NaN não é JSON válido
+    posicoes = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+    return {
+        "documento": documento,
+        "data_referencia": pd.Timestamp(data_referencia or datetime.now()).isoformat(),
+        **_resumo(df),
+        "por_tipo": por_tipo,
+        "posicoes": posicoes,
+    }
+
+
+#patrimônio atualizado de todos os clientes, avaliando `lote` clientes por vez
+def iterar_posicoes_todos(lote: int = 10000, data_referencia: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    apos = ''
+    while True:
+        documentos = documentos_com_posicao_db(lote, apos)
+        if not documentos:
+            return
+        df = avaliar_posicoes(carregar_posicoes(documentos), data_referencia)
+        totais = df.groupby('documento')[['valor_investido', 'valor_atual', 'rendimento']].sum().round(2)
+        for documento, linha in totais.iterrows():
+            yield {"documento": documento, **{coluna: float(valor) for coluna, valor in linha.items()}}
+        if len(documentos) < lote:
+            return
+        apos = documentos[-1]
@@ -1,15 +1,121 @@
-def calcular_score(saldo_cc: float) -> int:
-    #saldo zerado/negativo: score zerado
-    #score varia de 0 a 1000
-
-    try:
-        saldo = float(saldo_cc)
-
-        if saldo <= 0:
-            return 0
-        elif saldo > 10000:
-            return 1000
-        return int(saldo * 0.1)
-    except Exception as e:
-        raise ValueError(f'Erro ao calcular score: {e}')
-    
\ No newline at end of file
+#motor de score em lote: indicadores de todos os clientes de um lote numa consulta,
+#cálculo vetorizado e gravação em "score_credito" (invalidado por trigger a cada lançamento)
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.database import create_tables, get_connection, iniciar_pool, transacao
+
+logger = logging.getLogger(__name__)
+
+SCORE_JANELA_DIAS = int(os.getenv('BANCO_SCORE_JANELA_DIAS', '90'))
+SCORE_LOTE = int(os.getenv('BANCO_SCORE_LOTE', '10000'))
+SCORE_INTERVALO = float(os.getenv('BANCO_SCORE_INTERVALO', '86400'))
+
+#cada indicador dá no máximo o seu peso; a referência é o valor que já garante a nota cheia
+PESOS_SCORE = {"saldo_medio": 600, "patrimonio": 300, "movimentacoes": 100}
+REFERENCIAS_SCORE = {"saldo_medio": 10000.0, "patrimonio": 50000.0, "movimentacoes": 20}
+
+COLUNAS_SCORE = ['documento', 'score', 'saldo_medio', 'patrimonio', 'movimentacoes']
+
+
+#saldo atual, saldo médio do histórico da conta na janela, patrimônio e quantidade de movimentações.
+#o saldo médio é ponderado pelo tempo: cada saldo_apos pesa pelo intervalo até o lançamento seguinte
+#(o último, até agora); sem intervalo na janela (lançamentos no mesmo instante) vale o saldo atual
+def carregar_indicadores(conn, documentos: List[str], janela_dias: int = SCORE_JANELA_DIAS) -> pd.DataFrame:
+    return pd.read_sql_query(
+        '''
+        SELECT c.documento, c.saldo_cc,
+               COALESCE(h.saldo_medio, c.saldo_cc) AS saldo_medio,
+               COALESCE(i.patrimonio, 0.0) AS patrimonio,
+               COALESCE(h.movimentacoes, 0) AS movimentacoes
+        FROM "contas" c
+        LEFT JOIN "investidor" i ON i.documento = c.documento
+        LEFT JOIN (
+            SELECT documento, SUM(saldo_apos * duracao) / NULLIF(SUM(duracao), 0) AS saldo_medio, COUNT(*) AS movimentacoes
+            FROM (
+                SELECT documento, saldo_apos,
+                       julianday(COALESCE(LEAD(data_lancamento) OVER (PARTITION BY documento ORDER BY id_lancamento),
+                                          datetime('now', 'localtime'))) - julianday(data_lancamento) AS duracao
+                FROM "lancamentos"
+                WHERE documento IN (SELECT value FROM json_each(:documentos)) AND origem = 'CONTA'
+                  AND data_lancamento >= datetime('now', 'localtime', :janela)
+            )
+            GROUP BY documento
+        ) h ON h.documento = c.documento
+        WHERE c.documento IN (SELECT value FROM json_each(:documentos))
+        ''',
+        conn,
+        params={"documentos": json.dumps(documentos), "janela": f'{-int(janela_dias)} days'}
+    )
+
+
+#score de 0 a 1000 para todas as linhas de uma vez; saldo atual zerado continua zerando o score
+def calcular_scores(indicadores: pd.DataFrame) -> np.ndarray:
+    total = np.zeros(len(indicadores))
+    for coluna, peso in PESOS_SCORE.items():
+        valores = indicadores[coluna].to_numpy(dtype=float)
+        total += np.clip(valores / REFERENCIAS_SCORE[coluna], 0.0, 1.0) * peso
+    total = np.where(indicadores['saldo_cc'].to_numpy(dtype=float) <= 0, 0.0, total)
+    return np.rint(total).astype(int)
+
+
+def _gravar_scores(conn, documentos: List[str]) -> int:
+    indicadores = carregar_indicadores(conn, documentos)
+    if indicadores.empty:
+        return 0
+    indicadores['score'] = calcular_scores(indicadores)
+    conn.executemany(
+        f'INSERT OR REPLACE INTO "score_credito" ({", ".join(COLUNAS_SCORE)}) VALUES (?, ?, ?, ?, ?)',
+        indicadores[COLUNAS_SCORE].astype(object).itertuples(index=False, name=None)
+    )
+    return len(indicadores)
+
+
+#recalcula o score de todas as contas, `lote` clientes por transação
+def recalcular_scores(lote: int = SCORE_LOTE) -> Dict[str, Any]:
+    if lote < 1:
+        raise ValueError('O lote deve ser maior que zero.')
+    apos, calculados = '', 0
+    while True:
+        with transacao() as conn:
+            documentos = [row[0] for row in conn.execute(
+                'SELECT DISTINCT documento FROM "contas" WHERE documento > ? ORDER BY documento LIMIT ?', (apos, lote)
+            ).fetchall()]
+            if documentos:
+                calculados += _gravar_scores(conn, documentos)
+        if documentos:
+            logger.info('Score de crédito: %d contas calculadas', calculados)
+        if len(documentos) < lote:
+            return {"calculados": calculados}
+        apos = documentos[-1]
+
+
+#score gravado do cliente; se foi invalidado (ou nunca calculado), calcula e grava na hora
+def buscar_score(documento: str) -> Optional[Dict[str, Any]]:
+    with get_connection() as conn:
+        row = conn.execute('SELECT * FROM "score_credito" WHERE documento = ?', (documento,)).fetchone()
+    if row is None:
+        with transacao() as conn:
+            if _gravar_scores(conn, [documento]) == 0:
+                return None
+            row = conn.execute('SELECT * FROM "score_credito" WHERE documento = ?', (documento,)).fetchone()
+    return dict(row)
+
+
+#uso: python -m services.score_credito [--lote 10000] [--db caminho.db]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recalcula o score de crédito de todas as contas.')
+    parser.add_argument('--lote', type=int, default=SCORE_LOTE, help='clientes por transação')
+    parser.add_argument('--db', help='arquivo do banco; padrão: BANCO_DB_FILE')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    iniciar_pool(args.db)
+    create_tables()
+    print(json.dumps(recalcular_scores(args.lote)))
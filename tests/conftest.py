@@ -0,0 +1,54 @@
+from typing import Optional
+
+import pytest
+
+from services import database
+
+
+#banco sqlite isolado por teste; o pool volta para o arquivo original no final
+@pytest.fixture
+def banco_temporario(tmp_path):
+    db_original = database.DB_FILE
+    database.iniciar_pool(tmp_path / 'teste.db', tamanho=1)
+    database.create_tables()
+    yield database
+    database.iniciar_pool(db_original)
+
+
+#api_banco com lifespan, sobre o banco temporário
+@pytest.fixture
+def cliente_api(banco_temporario):
+    from fastapi.testclient import TestClient
+
+    import api_banco
+    with TestClient(api_banco.app) as cliente:
+        yield cliente
+
+
+#cadastra cliente, conta (se saldo_cc) e investidor (se perfil) no banco temporário; devolve a conta
+@pytest.fixture
+def cliente_investidor(banco_temporario):
+    def cadastrar(documento: str, nome: str = 'Investidor Teste', saldo_cc: Optional[float] = None, perfil: Optional[str] = 'MODERADO'):
+        banco_temporario.inserir_cliente(nome, '11999999999', documento, True, perfil is not None)
+        conta = banco_temporario.nova_conta(documento, saldo_cc) if saldo_cc is not None else None
+        if perfil is not None:
+            banco_temporario.cadastrar_investidor_db(documento, nome, '11999999999', f'{documento}@teste.com', 0.0, perfil)
+        return conta
+    return cadastrar
+
+
+#api_banco com o investidor do módulo já cadastrado: DOCUMENTO e, opcionalmente, CADASTRO
+#(argumentos de cliente_investidor, ex.: nome e saldo_cc) vêm do próprio módulo de teste
+@pytest.fixture
+def cliente(request, cliente_api, cliente_investidor):
+    cliente_investidor(request.module.DOCUMENTO, **getattr(request.module, 'CADASTRO', {}))
+    return cliente_api
+
+
+#cotações sem rede: devolve market_service.configurar_fonte para o teste trocar a fonte
+#e volta para o yfinance no final
+@pytest.fixture
+def fonte_cotacoes():
+    from services import market_service
+    yield market_service.configurar_fonte
+    market_service.configurar_fonte(market_service.FonteYFinance())
@@ -0,0 +1,20 @@
+import threading
+
+import pytest
+
+from services.agendador import Agendador
+
+
+def test_agendadores_de_apis_diferentes_sao_independentes():
+    banco, investimento = Agendador('api_banco'), Agendador('api_investimento')
+    rodou = threading.Event()
+    banco.agendar('checkpoint-wal', 60, lambda: None)
+    #o mesmo nome em outra API não conflita
+    investimento.agendar('checkpoint-wal', 0.01, rodou.set)
+    with pytest.raises(ValueError):
+        banco.agendar('checkpoint-wal', 60, lambda: None)
+
+    banco.parar()
+    rodou.clear()
+    assert rodou.wait(1)
+    investimento.parar()
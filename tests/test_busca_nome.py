@@ -0,0 +1,31 @@
+def cadastrar(database, *nomes):
+    for i, nome in enumerate(nomes):
+        database.inserir_cliente(nome, '11999999999', str(30000000000 + i), True, False)
+
+
+def test_busca_ignora_acentos_e_maiusculas(banco_temporario):
+    cadastrar(banco_temporario, 'João da Silva', 'Maria Silveira', 'Ana Souza')
+
+    nomes = [c['nome'] for c in banco_temporario.busca_cliente_por_nome('JOAO silv')]
+    assert nomes == ['João da Silva']
+
+
+def test_busca_acompanha_atualizacao_e_exclusao(banco_temporario):
+    cadastrar(banco_temporario, 'Ana Souza')
+
+    banco_temporario.atualiza_cliente_db('30000000000', 'Beatriz Souza', '11999999999')
+    assert banco_temporario.busca_cliente_por_nome('ana') == []
+    assert banco_temporario.busca_cliente_por_nome('beatriz')[0]['documento'] == '30000000000'
+
+    banco_temporario.deletar_cliente('30000000000')
+    assert banco_temporario.busca_cliente_por_nome('beatriz') == []
+
+
+def test_busca_paginada(banco_temporario):
+    cadastrar(banco_temporario, *[f'Cliente Pagina {i}' for i in range(5)])
+
+    primeira = banco_temporario.busca_cliente_por_nome('pagina', pagina=1, tamanho=3)
+    segunda = banco_temporario.busca_cliente_por_nome('pagina', pagina=2, tamanho=3)
+    assert len(primeira) == 3
+    assert len(segunda) == 2
+    assert not {c['documento'] for c in primeira} & {c['documento'] for c in segunda}
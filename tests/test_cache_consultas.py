@@ -0,0 +1,36 @@
+from services import database
+
+DOCUMENTO = '33344455566'
+
+
+def test_busca_usa_cache_e_escritas_invalidam(banco_temporario, cliente_investidor):
+    conta = cliente_investidor(DOCUMENTO, 'Cache Teste', saldo_cc = 1000.0)
+    contas = banco_temporario.CACHES_CONSULTA['contas']
+
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 1000.0
+    acertos = contas.acertos
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 1000.0
+    assert contas.acertos == acertos + 1
+
+    banco_temporario.atualizar_saldo_db(conta['numero_conta'], 2000.0)
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 2000.0
+
+    banco_temporario.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 500.0, 0.12, True)
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 1500.0
+
+    banco_temporario.busca_cliente(DOCUMENTO)
+    banco_temporario.atualiza_cliente_db(DOCUMENTO, 'Cache Alterado', '11988888888')
+    assert banco_temporario.busca_cliente(DOCUMENTO)['nome'] == 'Cache Alterado'
+
+    banco_temporario.busca_investidor_db(DOCUMENTO)
+    banco_temporario.atualiza_investidor_db(DOCUMENTO, '11988888888', 'cache@teste.com', 500.0, 'CONSERVADOR')
+    assert banco_temporario.busca_investidor_db(DOCUMENTO)['perfil'] == 'CONSERVADOR'
+
+
+def test_cache_desligado_sempre_le_do_banco(banco_temporario, monkeypatch):
+    monkeypatch.setattr(database, 'CACHE_CONSULTAS', False)
+    banco_temporario.inserir_cliente('Cache Teste', '11999999999', DOCUMENTO, True, False)
+    banco_temporario.busca_cliente(DOCUMENTO)
+    banco_temporario.busca_cliente(DOCUMENTO)
+
+    assert banco_temporario.estatisticas_cache_consultas()['clientes']['itens'] == 0
@@ -0,0 +1,37 @@
+from services.cliente_service import ler_csv_clientes, validar_lote_clientes
+
+
+def registro(documento, **extra):
+    return {"nome": f'Cliente {documento}', "telefone": '11999999999', "documento": documento, "correntista": True, "investidor": False, "saldo_cc": 50.0, **extra}
+
+
+def test_lote_insere_validos_e_reporta_erros_por_linha(banco_temporario):
+    banco_temporario.inserir_cliente('Ja Cadastrado', '11999999999', '40000000003', True, False)
+    registros = [
+        registro('40000000001'),
+        registro('40000000002', investidor=True, email='inv@teste.com', patrimonio=10.0, perfil='ARROJADO'),
+        registro('40000000001'),
+        registro('40000000003'),
+        registro('123'),
+    ]
+
+    validos, erros = validar_lote_clientes(registros)
+    inseridos, erros_banco = banco_temporario.inserir_clientes_lote(validos, tamanho_lote=2)
+
+    assert inseridos == 2
+    assert sorted(e['linha'] for e in erros + erros_banco) == [3, 4, 5]
+    assert banco_temporario.busca_conta('40000000002')['saldo_cc'] == 50.0
+    assert banco_temporario.busca_investidor_db('40000000002')['perfil'] == 'ARROJADO'
+    assert banco_temporario.extrato_db('40000000001')[0]['historico'] == 'ABERTURA'
+
+
+def test_csv_converte_booleanos_e_aponta_linhas_invalidas():
+    texto = 'nome,telefone,documento,correntista,investidor,saldo_cc\n' \
+            'Cliente Um,11999999999,40000000010,sim,nao,10\n' \
+            'Cliente Dois,11999999999,40000000011,1,0,abc\n'
+
+    registros, erros = ler_csv_clientes(texto)
+
+    assert [r['documento'] for r in registros] == ['40000000010']
+    assert registros[0]['correntista'] is True and registros[0]['investidor'] is False
+    assert erros[0]['linha'] == 2
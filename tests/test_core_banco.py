@@ -0,0 +1,115 @@
+import asyncio
+import importlib
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import api_banco
+import app as gateway
+from services import core_banco, http_client
+
+DOCUMENTO = '22233344455'
+
+
+#o mesmo fluxo pelo gateway nos dois modos; no remoto o HTTP vai para o api_banco via ASGI, sem servidor
+@pytest.fixture(params = ['remoto', 'local'])
+def cliente_gateway(request, banco_temporario, monkeypatch):
+    monkeypatch.setattr(core_banco, 'CORE_BANCO_MODO', request.param)
+    monkeypatch.setattr(core_banco, '_core', None)
+    if request.param == 'remoto':
+        monkeypatch.setattr(core_banco, 'URL_CORE_BANCO', 'http://core')
+        monkeypatch.setattr(http_client, '_cliente', httpx.AsyncClient(transport = httpx.ASGITransport(app = api_banco.app)))
+    with TestClient(gateway.app) as cliente:
+        yield cliente
+
+
+def test_gateway_nos_dois_modos(cliente_gateway):
+    resposta = cliente_gateway.post('/clientes', params = {
+        "nome": 'Gateway Teste', "telefone": '11999999999', "documento": DOCUMENTO,
+        "correntista": True, "investidor": True, "email": 'gateway@teste.com', "patrimonio": 0.0, "perfil": 'MODERADO',
+    })
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()['Investidor']['perfil'] == 'MODERADO'
+
+    assert cliente_gateway.post('/clientes', params = {
+        "nome": 'Gateway Teste', "telefone": '11999999999', "documento": DOCUMENTO, "correntista": True, "investidor": False,
+    }).status_code == 409
+    assert cliente_gateway.get(f'/clientes/{DOCUMENTO}').json()['nome'] == 'Gateway Teste'
+    assert cliente_gateway.get('/clientes/00000000000').status_code == 404
+    assert 'Conta: ' in cliente_gateway.get(f'/contas/numero/{DOCUMENTO}').json()
+    assert cliente_gateway.patch(f'/contas/atualizar-saldo/{DOCUMENTO}', params = {"novo_saldo": 100.0}).status_code == 200
+    assert cliente_gateway.get(f'/contas/score/{DOCUMENTO}').json()['score_credito'] > 0
+    assert cliente_gateway.delete(f'/clientes/excluir/{DOCUMENTO}').status_code == 400
+
+
+#a Idempotency-Key do cliente do gateway chega ao core: o retry recebe o mesmo cadastro em vez de 409
+def test_gateway_repassa_idempotency_key(cliente_gateway):
+    params = {"nome": 'Gateway Teste', "telefone": '11999999999', "documento": DOCUMENTO, "correntista": True, "investidor": False}
+    respostas = [cliente_gateway.post('/clientes', params = params, headers = {"Idempotency-Key": 'onboarding-1'}) for _ in range(2)]
+    assert [r.status_code for r in respostas] == [200, 200]
+    assert respostas[0].json() == respostas[1].json()
+    assert cliente_gateway.post('/clientes', params = params).status_code == 409
+
+
+#If-Match do gateway chega ao core nos dois modos: ETag antigo dá 412
+def test_gateway_repassa_if_match(cliente_gateway):
+    cliente_gateway.post('/clientes', params = {"nome": 'Gateway Teste', "telefone": '11999999999', "documento": DOCUMENTO, "correntista": True, "investidor": False})
+    etag = cliente_gateway.get(f'/contas/numero/{DOCUMENTO}').headers['etag']
+    atualizar = lambda: cliente_gateway.patch(f'/contas/atualizar-saldo/{DOCUMENTO}', params = {"novo_saldo": 100.0}, headers = {"If-Match": etag})
+    assert atualizar().status_code == 200
+    conflito = atualizar()
+    assert conflito.status_code == 412
+    assert conflito.headers['etag'] == cliente_gateway.get(f'/contas/numero/{DOCUMENTO}').headers['etag'] != etag
+    assert 'versão' in conflito.json()['detail']
+
+
+#o modo local passa pela mesma validação das rotas e não vaza a mensagem de erros inesperados
+def test_core_local_valida_e_esconde_erros_internos(banco_temporario, monkeypatch, caplog):
+    from services import banco_service
+    core = core_banco.CoreBancoLocal()
+
+    with pytest.raises(core_banco.ErroCoreBanco) as erro:
+        asyncio.run(core.pagina_investimentos(DOCUMENTO, limite = 0))
+    assert erro.value.status_code == 422
+    with pytest.raises(core_banco.ErroCoreBanco) as erro:
+        asyncio.run(core.cadastrar_investidor(DOCUMENTO, 'Gateway Teste', '11999999999', 'gateway@teste.com', 0.0, 'NENHUM'))
+    assert erro.value.status_code == 422
+
+    def falhar(documento):
+        raise RuntimeError('detalhe interno')
+    monkeypatch.setattr(banco_service, 'busca_cliente', falhar)
+    with pytest.raises(core_banco.ErroCoreBanco) as erro:
+        asyncio.run(core.buscar_cliente(DOCUMENTO))
+    assert erro.value.status_code == 500 and 'detalhe interno' not in erro.value.detalhe
+    assert 'detalhe interno' in caplog.text
+
+
+#sem o api_banco no ar, o modo local agenda as tarefas periódicas do core e as cancela no shutdown
+def test_core_local_agenda_tarefas_do_core(banco_temporario):
+    core = core_banco.CoreBancoLocal()
+    asyncio.run(core.iniciar())
+    try:
+        assert set(core.agendador._tarefas) == {'checkpoint-wal', 'compactar-lancamentos', 'apurar-renda-fixa', 'recalcular-scores', 'limpar-idempotencia'}
+    finally:
+        asyncio.run(core.fechar())
+    assert not core.agendador._tarefas
+
+
+#as consultas quentes respondem igual (ETag incluído) como async def no executor do banco ou como def comuns
+@pytest.mark.parametrize('modo', ['async', 'sync'])
+def test_rotas_de_leitura_nos_dois_modelos(banco_temporario, cliente_investidor, monkeypatch, modo):
+    monkeypatch.setenv('BANCO_ROTAS_LEITURA', modo)
+    importlib.reload(api_banco)
+    try:
+        rota = next(rota for rota in api_banco.app.routes if rota.path == '/contas/{documento}' and 'GET' in rota.methods)
+        assert asyncio.iscoroutinefunction(rota.endpoint) is (modo == 'async')
+        cliente_investidor(DOCUMENTO, 'Leitura Teste', saldo_cc = 100.0)
+        with TestClient(api_banco.app) as cliente:
+            resposta = cliente.get(f'/contas/{DOCUMENTO}')
+            assert resposta.status_code == 200 and resposta.headers['etag'] == '"1"'
+            assert cliente.get(f'/clientes/investidor/{DOCUMENTO}').json()['nome'] == 'Leitura Teste'
+            assert cliente.get('/clientes/00000000000').status_code == 404
+    finally:
+        monkeypatch.undo()
+        importlib.reload(api_banco)
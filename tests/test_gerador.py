@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks import gerador
+from services import database
+from services.identificadores import numero_conta_valido
+
+
+def _tabelas(conn):
+    return {
+        tabela: conn.execute(f'SELECT * FROM "{tabela}" ORDER BY 1').fetchall()
+        for tabela in ('clientes', 'contas', 'investimento')
+    }
+
+
+def test_cpfs_validos():
+    assert gerador.cpf_valido('52998224725')
+    assert not gerador.cpf_valido('52998224724')
+    assert not gerador.cpf_valido('11111111111')
+
+
+def test_gerar_base_consistente_e_deterministica(banco_temporario, tmp_path):
+    totais = gerador.gerar_base(3000, semente=7, data_final='2026-01-31', lote=1000)
+
+    assert totais['clientes'] == 3000
+    assert 0 < totais['investidor'] <= totais['contas'] < 3000
+    with banco_temporario.get_connection() as conn:
+        documentos = [row[0] for row in conn.execute('SELECT documento FROM "clientes"')]
+        assert len(set(documentos)) == 3000 and all(gerador.cpf_valido(d) for d in documentos)
+        assert {row[0] for row in conn.execute('SELECT DISTINCT perfil FROM "investidor"')} == {'CONSERVADOR', 'MODERADO', 'ARROJADO'}
+        assert len(conn.execute('SELECT DISTINCT tipo FROM "investimento"').fetchall()) == 4
+        #patrimônio e saldos batem com o razão
+        assert conn.execute(
+            '''
+            SELECT COUNT(*) FROM "investidor" i
+            WHERE ABS(i.patrimonio - (SELECT COALESCE(SUM(valor_investido), 0) FROM "investimento" WHERE documento = i.documento AND ativo = 1)) > 0.01
+               OR ABS(i.patrimonio - (SELECT COALESCE(SUM(valor), 0) FROM "lancamentos" WHERE documento = i.documento AND origem = 'INVESTIDOR')) > 0.01
+            '''
+        ).fetchone()[0] == 0
+        #números de conta da mesma sequência que nova_conta continua
+        contas = [row[0] for row in conn.execute('SELECT numero_conta FROM "contas"')]
+        assert all(numero_conta_valido(n) for n in contas)
+        assert conn.execute('SELECT valor FROM "sequencias" WHERE nome = \'contas\'').fetchone()[0] == 3000
+        gatilhos = {row[0] for row in conn.execute('SELECT name FROM sqlite_master WHERE type = \'trigger\'')}
+        assert set(gerador.GATILHOS_SUSPENSOS) <= gatilhos
+        primeira = _tabelas(conn)
+    assert database.busca_cliente_por_nome(gerador.termo_busca(documentos[0]))
+
+    with pytest.raises(ValueError):
+        gerador.gerar_base(10)
+
+    database.iniciar_pool(tmp_path / 'segunda.db', tamanho=1)
+    database.create_tables()
+    gerador.gerar_base(3000, semente=7, data_final='2026-01-31', lote=1000)
+    with database.get_connection() as conn:
+        assert _tabelas(conn) == primeira
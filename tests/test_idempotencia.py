@@ -0,0 +1,57 @@
+
+from services import idempotencia
+
+DOCUMENTO = '33344455566'
+CADASTRO = {"nome": 'Idempotencia Teste'}
+
+
+def test_retry_com_a_mesma_chave_nao_executa_de_novo(cliente, banco_temporario):
+    chave = {"Idempotency-Key": 'conta-1'}
+    primeira = cliente.post('/contas', params = {"documento": DOCUMENTO, "saldo_cc": 500.0}, headers = chave)
+    repetida = cliente.post('/contas', params = {"documento": DOCUMENTO, "saldo_cc": 500.0}, headers = chave)
+    assert primeira.status_code == repetida.status_code == 200
+    assert primeira.json() == repetida.json()
+
+    params = {"documento": DOCUMENTO, "tipo": 'RENDA FIXA', "valor_investido": 100.0, "ativo": True}
+    investimentos = [cliente.post('/investimento/novo', params = params, headers = {"Idempotency-Key": 'aplicacao-1'}) for _ in range(3)]
+    assert len({r.json()['id_investimento'] for r in investimentos}) == 1
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 400.0
+    assert len(banco_temporario.busca_investimento_doc(DOCUMENTO)) == 1
+    #sem chave continua executando sempre
+    cliente.post('/investimento/novo', params = params)
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 300.0
+
+    #mesma chave com outros parâmetros ou em outra rota
+    assert cliente.post('/investimento/novo', params = {**params, "valor_investido": 50.0}, headers = {"Idempotency-Key": 'aplicacao-1'}).status_code == 422
+    assert cliente.patch(f'/contas/{DOCUMENTO}/atualizar_saldo', params = {"novo_saldo": 1.0}, headers = chave).status_code == 422
+    assert cliente.post('/contas', params = {"documento": DOCUMENTO}, headers = {"Idempotency-Key": 'x' * 256}).status_code == 400
+
+
+def test_erro_nao_fica_guardado_e_chave_vencida_e_limpa(cliente, banco_temporario, monkeypatch):
+    chave = {"Idempotency-Key": 'conta-2'}
+    assert cliente.post('/contas', params = {"documento": '00000000000'}, headers = chave).status_code == 404
+    banco_temporario.inserir_cliente('Outro Cliente', '11999999999', '00000000000', True, False)
+    #guardada já vencida: não responde mais e sai na limpeza
+    monkeypatch.setattr(idempotencia, 'IDEMPOTENCIA_TTL', -1.0)
+    primeira = cliente.post('/contas', params = {"documento": '00000000000'}, headers = chave).json()
+    assert cliente.post('/contas', params = {"documento": '00000000000'}, headers = chave).json() != primeira
+    assert idempotencia.limpar_idempotencia() == 1
+
+
+def test_ajuste_de_saldo_e_aporte_repetidos_devolvem_o_mesmo_etag(cliente, banco_temporario):
+    cliente.post('/contas', params = {"documento": DOCUMENTO, "saldo_cc": 500.0})
+    chave = {"Idempotency-Key": 'saldo-1'}
+    primeira, repetida = [cliente.patch(f'/contas/{DOCUMENTO}/atualizar_saldo', params = {"novo_saldo": 800.0}, headers = chave) for _ in range(2)]
+    assert primeira.json() == repetida.json()
+    assert primeira.headers['etag'] == repetida.headers['etag'] == '"2"'
+
+    investimento = banco_temporario.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 100.0, 0.1, True)
+    params = {"tipo": 'RENDA FIXA', "valor_investido": 50.0, "ativo": True}
+    primeira, repetida = [
+        cliente.patch(f'/investimento/atualizar/{investimento["id_investimento"]}', params = params, headers = {"Idempotency-Key": 'aporte-1'})
+        for _ in range(2)
+    ]
+    assert primeira.json() == repetida.json()
+    assert primeira.headers['etag'] == repetida.headers['etag'] == f'"{primeira.json()["versao"]}"'
+    #o aporte debitou a conta uma vez só
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 650.0
@@ -0,0 +1,34 @@
+import uuid
+
+import pytest
+
+from services import identificadores
+from services.identificadores import GeradorSequencial, formatar_numero_conta, numero_conta_valido, uuid7
+
+
+def test_numero_conta_com_digito_verificador():
+    assert formatar_numero_conta(1) == '000000019'
+    assert numero_conta_valido(formatar_numero_conta(12345678))
+    assert not numero_conta_valido('000000018') and not numero_conta_valido('12345678')
+    with pytest.raises(ValueError):
+        formatar_numero_conta(10 ** 8)
+
+
+def test_uuid7_ordenado_no_tempo():
+    gerador = GeradorSequencial()
+    ids = [gerador.id_investimento() for _ in range(5000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert uuid.UUID(ids[0]).version == 7
+    assert uuid7(1, bytes(10)) < uuid7(2, bytes(10))
+
+
+def test_contas_sequenciais_e_rollback_devolve_numeros(banco_temporario):
+    banco_temporario.inserir_cliente('Sequencia Teste', '11999999999', '44455566677', True, False)
+    primeira = banco_temporario.nova_conta('44455566677', 0.0)['numero_conta']
+    assert primeira == formatar_numero_conta(1)
+
+    with pytest.raises(RuntimeError):
+        with banco_temporario.transacao() as conn:
+            identificadores.get_gerador().numeros_conta(conn, 10)
+            raise RuntimeError
+    assert banco_temporario.nova_conta('44455566677', 0.0)['numero_conta'] == formatar_numero_conta(2)
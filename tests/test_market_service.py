@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import market_service
+from services.market_service import FonteCotacoes
+
+
+#fonte local: nada de rede nos testes
+class FonteFake(FonteCotacoes):
+    def __init__(self, precos, atraso=0.0):
+        self.precos = precos
+        self.atraso = atraso
+        self.chamadas = 0
+        self.chamadas_lote = 0
+        self._lock = threading.Lock()
+
+    def buscar(self, ticker):
+        with self._lock:
+            self.chamadas += 1
+        time.sleep(self.atraso)
+        preco = self.precos.get(ticker)
+        return {"preco": preco, "ticker": ticker} if preco is not None else None
+
+    def buscar_varios(self, tickers):
+        with self._lock:
+            self.chamadas_lote += 1
+        return {t: ({"preco": self.precos[t], "ticker": t} if t in self.precos else None) for t in tickers}
+
+
+@pytest.fixture
+def fonte(fonte_cotacoes):
+    return FonteFake({"PETR4.SA": 37.5})
+
+
+def test_cotacao_fica_em_cache_dentro_do_ttl(fonte):
+    market_service.configurar_fonte(fonte, ttl=60)
+
+    assert market_service.buscar_ativo('petr4.sa') == {"preco": 37.5, "ticker": "PETR4.SA"}
+    assert market_service.buscar_ativo('PETR4.SA')['preco'] == 37.5
+    assert market_service.buscar_ativo('XXXX') is None
+    assert market_service.buscar_ativo('XXXX') is None
+    assert fonte.chamadas == 2
+
+
+def test_buscas_simultaneas_viram_uma_chamada(fonte):
+    fonte.atraso = 0.2
+    market_service.configurar_fonte(fonte, ttl=60)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        resultados = list(executor.map(market_service.buscar_ativo, ['PETR4.SA'] * 10))
+
+    assert all(r['preco'] == 37.5 for r in resultados)
+    assert fonte.chamadas == 1
+
+
+def test_cotacao_vencida_e_servida_enquanto_atualiza(fonte):
+    market_service.configurar_fonte(fonte, ttl=0.05, stale=60)
+    market_service.buscar_ativo('PETR4.SA')
+    fonte.precos['PETR4.SA'] = 38.0
+    time.sleep(0.1)
+
+    assert market_service.buscar_ativo('PETR4.SA')['preco'] == 37.5
+    for _ in range(50):
+        if market_service.buscar_ativo('PETR4.SA')['preco'] == 38.0:
+            break
+        time.sleep(0.02)
+    assert market_service.buscar_ativo('PETR4.SA')['preco'] == 38.0
+
+
+def test_lote_busca_so_os_ausentes_numa_chamada(fonte):
+    fonte.precos.update({"VALE3.SA": 61.2, "ITUB4.SA": 33.9})
+    market_service.configurar_fonte(fonte, ttl=60)
+    market_service.buscar_ativo('PETR4.SA')
+
+    cotacoes = market_service.buscar_ativos(['petr4.sa', 'VALE3.SA', 'ITUB4.SA', 'NADA3.SA'])
+
+    assert cotacoes['VALE3.SA']['preco'] == 61.2
+    assert cotacoes['PETR4.SA']['preco'] == 37.5
+    assert cotacoes['NADA3.SA'] is None
+    assert (fonte.chamadas, fonte.chamadas_lote) == (1, 1)
@@ -0,0 +1,102 @@
+import re
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api_banco
+from services import database, market_service, metricas
+from services.market_service import FonteCotacoes
+
+DOCUMENTO = '66677788899'
+
+
+def _valor(texto: str, serie: str) -> float:
+    encontrado = re.search(rf'^{re.escape(serie)} (\S+)$', texto, re.MULTILINE)
+    assert encontrado, f'série ausente: {serie}'
+    return float(encontrado.group(1))
+
+
+@pytest.fixture
+def cliente(banco_temporario, monkeypatch):
+    monkeypatch.setattr(database, 'CACHE_CONSULTAS', False)
+    metricas.limpar_metricas()
+    with TestClient(api_banco.app) as cliente:
+        banco_temporario.inserir_cliente('Metricas Teste', '11999999999', DOCUMENTO, True, False)
+        banco_temporario.nova_conta(DOCUMENTO, 100.0)
+        yield cliente
+
+
+def test_latencia_e_sql_por_rota(cliente):
+    resposta = cliente.get(f'/clientes/{DOCUMENTO}')
+    assert resposta.status_code == 200
+    assert 'db;dur=' in resposta.headers['server-timing']
+    assert cliente.get(f'/contas/{DOCUMENTO}/extrato').status_code == 200
+    assert cliente.get('/clientes/00000000000').status_code == 404
+
+    texto = cliente.get('/metrics').text
+    rota = 'app="api_banco",rota="/clientes/{documento}"'
+    assert _valor(texto, f'banco_http_requisicoes_segundos_count{{app="api_banco",metodo="GET",rota="/clientes/{{documento}}",status="200"}}') == 1
+    assert _valor(texto, f'banco_http_requisicoes_segundos_count{{app="api_banco",metodo="GET",rota="/clientes/{{documento}}",status="404"}}') == 1
+    #rota async (database_async) e rota síncrona (threadpool) contam o sql da própria requisição
+    assert _valor(texto, f'banco_sql_consultas_por_requisicao_sum{{{rota}}}') == 2
+    assert _valor(texto, 'banco_sql_consultas_por_requisicao_sum{app="api_banco",rota="/contas/{documento}/extrato"}') >= 1
+    assert _valor(texto, 'banco_http_requisicoes_em_andamento{app="api_banco"}') == 1
+    assert cliente.get('/debug/perfil').status_code == 404
+
+
+def test_chamadas_externas_e_rota_normalizada(fonte_cotacoes):
+    class FonteLocal(FonteCotacoes):
+        nome = 'local'
+
+        def buscar(self, ticker):
+            return {"preco": 10.0, "ticker": ticker}
+
+    metricas.limpar_metricas()
+    fonte_cotacoes(FonteLocal())
+    market_service.buscar_ativo('PETR4.SA')
+    market_service.buscar_ativo('PETR4.SA')
+    assert metricas.CHAMADAS_EXTERNAS_SEGUNDOS.total('local', 'buscar', 'ok') == 1
+    assert metricas.rota_normalizada('/investimento/12345678901/pagina?limite=5') == '/investimento/{id}/pagina'
+
+
+def test_profiler_amostra_pilhas():
+    parar = threading.Event()
+    ocupada = threading.Thread(target=parar.wait, name='thread-ocupada')
+    ocupada.start()
+    try:
+        pilhas = metricas.amostrar_pilhas(0.05, 0.01)
+    finally:
+        parar.set()
+        ocupada.join()
+    assert any(pilha.startswith('thread-ocupada;') and 'wait (threading.py' in pilha for pilha in pilhas)
+    with pytest.raises(ValueError):
+        metricas.amostrar_pilhas(metricas.PROFILER_MAX_SEGUNDOS + 1)
+
+
+def test_top_sql_e_log_de_lentos(cliente, monkeypatch, caplog):
+    #desligado por padrão e nunca nas apps sem admin
+    assert cliente.get('/admin/sql/top').status_code == 404
+    monkeypatch.setattr(metricas, 'ADMIN', True)
+    sem_admin, com_admin = FastAPI(), FastAPI()
+    metricas.instrumentar(sem_admin, 'sem_admin')
+    metricas.instrumentar(com_admin, 'com_admin', admin = True)
+    assert TestClient(sem_admin).get('/admin/sql/top').status_code == 404
+    admin = TestClient(com_admin)
+
+    assert admin.delete('/admin/sql/top').status_code == 200
+    for _ in range(3):
+        cliente.get(f'/clientes/{DOCUMENTO}')
+
+    top = admin.get('/admin/sql/top', params = {"ordem": 'execucoes'}).json()
+    busca = next(c for c in top if c['sql'] == 'SELECT * FROM "clientes" WHERE documento = ?')
+    assert busca['execucoes'] == 3 and busca['total_ms'] >= busca['maximo_ms'] > 0
+    assert admin.get('/admin/sql/top', params = {"ordem": 'nada'}).status_code == 400
+    assert metricas.normalizar_sql("SELECT  *\n FROM t WHERE a = 'x' AND b = 10") == 'SELECT * FROM t WHERE a = ? AND b = ?'
+
+    monkeypatch.setattr(metricas, 'SQL_LENTO_MS', 0.0)
+    with caplog.at_level('WARNING', logger = 'services.sql'):
+        cliente.get(f'/clientes/{DOCUMENTO}')
+    assert 'sql lento' in caplog.text and '(str)' in caplog.text
+    assert DOCUMENTO not in caplog.text
@@ -0,0 +1,109 @@
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+DOCUMENTO = '55566677788'
+
+
+@pytest.fixture
+def investidor(banco_temporario, cliente_investidor):
+    #várias conexões de verdade, para as transações concorrerem no sqlite
+    banco_temporario.iniciar_pool(banco_temporario.DB_FILE, tamanho=8)
+    cliente_investidor(DOCUMENTO, 'Investidor Estresse', saldo_cc = 1000.0)
+    return banco_temporario
+
+
+def tentar(funcao, *args):
+    try:
+        funcao(*args)
+        return True
+    except ValueError:
+        return False
+
+
+def test_investimentos_paralelos_nao_perdem_atualizacoes(investidor):
+    #200 tentativas de 10 para um saldo de 1000: exatamente 100 podem passar
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        resultados = list(executor.map(
+            lambda _: tentar(investidor.novo_investimento_db, DOCUMENTO, 'RENDA FIXA', 10.0, 0.12, True),
+            range(200)
+        ))
+
+    assert sum(resultados) == 100
+    assert investidor.busca_conta(DOCUMENTO)['saldo_cc'] == pytest.approx(0.0)
+    assert len(investidor.busca_investimento_doc(DOCUMENTO)) == 100
+    with investidor.get_connection() as conn:
+        patrimonio = conn.execute('SELECT patrimonio FROM "investidor" WHERE documento = ?', (DOCUMENTO,)).fetchone()[0]
+    assert patrimonio == pytest.approx(1000.0)
+
+
+def test_retiradas_paralelas_respeitam_valor_investido(investidor):
+    investimento = investidor.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 500.0, 0.12, True)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        resultados = list(executor.map(
+            lambda _: tentar(investidor.retirada_investimento_db, investimento['id_investimento'], 20.0, DOCUMENTO),
+            range(40)
+        ))
+
+    assert sum(resultados) == 25
+    assert investidor.busca_investimento_db(investimento['id_investimento'])['valor_investido'] == pytest.approx(0.0)
+    assert investidor.busca_conta(DOCUMENTO)['saldo_cc'] == pytest.approx(1000.0)
+
+
+def test_razao_fecha_com_saldos_materializados(investidor):
+    investimento = investidor.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 300.0, 0.12, True)
+    investidor.retirada_investimento_db(investimento['id_investimento'], 100.0, DOCUMENTO)
+    conta = investidor.busca_conta(DOCUMENTO)
+    investidor.atualizar_saldo_db(conta['numero_conta'], 900.0)
+
+    with investidor.get_connection() as conn:
+        totais = dict(conn.execute(
+            'SELECT origem, SUM(valor) FROM "lancamentos" WHERE documento = ? GROUP BY origem', (DOCUMENTO,)
+        ).fetchall())
+        patrimonio = conn.execute('SELECT patrimonio FROM "investidor" WHERE documento = ?', (DOCUMENTO,)).fetchone()[0]
+
+    assert totais['CONTA'] == pytest.approx(investidor.busca_conta(DOCUMENTO)['saldo_cc'])
+    assert totais['INVESTIDOR'] == pytest.approx(patrimonio)
+    assert totais['INVESTIMENTO'] == pytest.approx(200.0)
+    assert investidor.extrato_db(DOCUMENTO, limite=1)[0]['saldo_apos'] == pytest.approx(900.0)
+
+
+def test_paginacao_por_cursor_percorre_todos_os_investimentos(investidor):
+    criados = {investidor.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 10.0, 0.12, True)['id_investimento'] for _ in range(7)}
+
+    vistos, apos = [], None
+    while True:
+        pagina = investidor.pagina_investimentos_doc(DOCUMENTO, 3, apos)
+        vistos += [item['id_investimento'] for item in pagina]
+        if len(pagina) < 3:
+            break
+        apos = investidor.decodificar_cursor(investidor.codificar_cursor(pagina[-1]['data_aplicacao'], pagina[-1]['id_investimento']))
+
+    assert len(vistos) == len(set(vistos)) == 7
+    assert set(vistos) == criados
+    assert {item['id_investimento'] for item in investidor.iterar_investimentos_doc(DOCUMENTO, lote=2)} == criados
+
+
+def test_cpf_com_duas_contas_movimenta_so_a_primeira(investidor):
+    primeira = investidor.busca_conta(DOCUMENTO)['numero_conta']
+    investidor.nova_conta(DOCUMENTO, 1000.0)
+    investidor.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 300.0, 0.12, True)
+
+    with investidor.get_connection() as conn:
+        saldos = dict(conn.execute('SELECT numero_conta, saldo_cc FROM "contas" WHERE documento = ?', (DOCUMENTO,)).fetchall())
+        razao = conn.execute(
+            'SELECT SUM(valor) FROM "lancamentos" WHERE documento = ? AND origem = \'CONTA\' AND valor < 0', (DOCUMENTO,)
+        ).fetchone()[0]
+    assert saldos.pop(primeira) == pytest.approx(700.0)
+    assert list(saldos.values()) == [pytest.approx(1000.0)]
+    assert razao == pytest.approx(-300.0)
+
+
+@pytest.mark.parametrize('chave', [5, ['2024-01-01'], [1, 2], {"a": 'b'}])
+def test_cursor_com_outro_formato_e_invalido(banco_temporario, chave):
+    cursor = base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+    with pytest.raises(ValueError):
+        banco_temporario.decodificar_cursor(cursor)
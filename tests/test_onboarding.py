@@ -0,0 +1,22 @@
+import pytest
+
+DOCUMENTO = '11100022233'
+
+
+def test_onboarding_cria_tudo_na_mesma_transacao(banco_temporario):
+    cadastro = banco_temporario.onboarding_db('Onboarding Teste', '11999999999', DOCUMENTO, True, True, 250.0, 'onboarding@teste.com', 1000.0, 'MODERADO')
+
+    assert cadastro['cliente']['documento'] == DOCUMENTO
+    assert cadastro['conta']['saldo_cc'] == 250.0
+    assert cadastro['investidor']['perfil'] == 'MODERADO'
+    assert banco_temporario.extrato_db(DOCUMENTO)[0]['historico'] == 'ABERTURA'
+    #documento repetido não cria nada
+    assert banco_temporario.onboarding_db('Outro Nome', '11999999999', DOCUMENTO, True, False) is None
+
+
+def test_onboarding_desfaz_tudo_se_uma_etapa_falha(banco_temporario):
+    with pytest.raises(ValueError):
+        banco_temporario.onboarding_db('Onboarding Teste', '11999999999', DOCUMENTO, True, True, 250.0, 'onboarding@teste.com', 0.0, 'INVALIDO')
+
+    assert banco_temporario.busca_cliente(DOCUMENTO) is None
+    assert banco_temporario.busca_conta(DOCUMENTO) is None
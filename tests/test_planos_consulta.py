@@ -0,0 +1,39 @@
+import pytest
+
+
+#executa as funções mais usadas e guarda todo SQL que chegou ao sqlite
+def capturar_consultas(database):
+    comandos = []
+    with database.get_connection() as conn:
+        conn.set_trace_callback(comandos.append)
+    try:
+        database.inserir_cliente('Cliente Plano', '11999999999', '11122233344', True, True)
+        conta = database.nova_conta('11122233344', 500.0)
+        database.cadastrar_investidor_db('11122233344', 'Cliente Plano', '11999999999', 'plano@teste.com', 0.0, 'MODERADO')
+        investimento = database.novo_investimento_db('11122233344', 'RENDA FIXA', 100.0, 0.12, True)
+        database.busca_cliente('11122233344')
+        database.busca_cliente_por_nome('plano')
+        database.busca_conta('11122233344')
+        database.busca_investidor_db('11122233344')
+        database.busca_investimento_db(investimento['id_investimento'])
+        database.busca_investimento_doc('11122233344')
+        database.extrato_db('11122233344')
+        database.pagina_investimentos_doc('11122233344', 10, (investimento['data_aplicacao'], investimento['id_investimento']))
+        database.atualizar_saldo_db(conta['numero_conta'], 400.0)
+    finally:
+        with database.get_connection() as conn:
+            conn.set_trace_callback(None)
+    #ignora os comandos internos do fts5 nas tabelas auxiliares (clientes_fts_*)
+    return [c for c in comandos if c.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')) and '_fts_' not in c]
+
+
+def test_consultas_quentes_usam_indice(banco_temporario):
+    comandos = capturar_consultas(banco_temporario)
+    assert comandos
+
+    with banco_temporario.get_connection() as conn:
+        for comando in comandos:
+            plano = conn.execute(f'EXPLAIN QUERY PLAN {comando}').fetchall()
+            #a busca full-text aparece como "SCAN ... VIRTUAL TABLE INDEX", que usa o índice fts
+            scans = [linha['detail'] for linha in plano if linha['detail'].startswith('SCAN') and 'VIRTUAL TABLE' not in linha['detail']]
+            assert not scans, f'Consulta sem índice: {comando} -> {scans}'
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+from services import posicao_service
+from services.market_service import FonteCotacoes
+
+DOCUMENTO = '66677788899'
+CADASTRO = {"nome": 'Carteira Teste', "saldo_cc": 10000.0}
+
+
+class FonteFixa(FonteCotacoes):
+    def buscar(self, ticker):
+        return {"preco": 20.0, "ticker": ticker} if ticker == 'PETR4.SA' else None
+
+
+@pytest.fixture
+def carteira(banco_temporario, cliente_investidor, fonte_cotacoes):
+    fonte_cotacoes(FonteFixa())
+    cliente_investidor(DOCUMENTO, 'Carteira Teste', saldo_cc = 10000.0)
+    banco_temporario.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 1000.0, 0.12, True)
+    banco_temporario.novo_investimento_db(DOCUMENTO, 'ACOES', 500.0, 0.0, True, 'PETR4.SA', 10.0)
+    banco_temporario.novo_investimento_db(DOCUMENTO, 'CRIPTO', 300.0, 0.0, True, 'SEMCOTACAO', 5.0)
+    with banco_temporario.get_connection() as conn:
+        conn.execute('UPDATE "investimento" SET data_aplicacao = ? WHERE documento = ?', ('2025-01-01 00:00:00', DOCUMENTO))
+    return banco_temporario
+
+
+def test_posicao_aplica_juros_e_marca_a_mercado(carteira):
+    posicao = posicao_service.posicao_cliente(DOCUMENTO, datetime(2026, 1, 1))
+
+    por_tipo = posicao['por_tipo']
+    assert por_tipo['RENDA FIXA']['valor_atual'] == pytest.approx(1120.0)
+    #50 cotas compradas a 10, cotadas a 20
+    assert por_tipo['ACOES']['valor_atual'] == pytest.approx(1000.0)
+    #sem cotação a posição fica pelo custo
+    assert por_tipo['CRIPTO']['valor_atual'] == pytest.approx(300.0)
+    assert posicao['valor_atual'] == pytest.approx(2420.0)
+    assert posicao['rendimento'] == pytest.approx(620.0)
+
+
+def test_posicao_de_todos_os_clientes_em_lotes(carteira):
+    totais = list(posicao_service.iterar_posicoes_todos(lote=1, data_referencia=datetime(2026, 1, 1)))
+
+    assert totais == [{"documento": DOCUMENTO, "valor_investido": 1800.0, "valor_atual": 2420.0, "rendimento": 620.0}]
+
+
+#o preço que o gateway já buscou vira o preço de compra; o core só consulta o provedor sem ele,
+#e sem cotação recusa a aplicação em vez de gravar uma posição que nunca é marcada a mercado
+def test_novo_investimento_usa_o_preco_do_gateway(cliente, banco_temporario, fonte_cotacoes):
+    fonte = FonteFixa()
+    fonte.buscar = lambda ticker: pytest.fail('o core não deveria buscar a cotação')
+    fonte_cotacoes(fonte)
+    params = {"documento": DOCUMENTO, "tipo": 'ACOES', "valor_investido": 500.0, "ativo": True, "ticker": 'PETR4.SA'}
+
+    resposta = cliente.post('/investimento/novo', params = {**params, "preco_aplicacao": 25.0})
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()['preco_aplicacao'] == 25.0
+
+    fonte_cotacoes(FonteFixa())
+    assert cliente.post('/investimento/novo', params = {**params, "ticker": 'SEMCOTACAO'}).status_code == 503
+    assert len(banco_temporario.busca_investimento_doc(DOCUMENTO)) == 1
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == pytest.approx(9500.0)
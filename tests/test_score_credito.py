@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from services import score_credito
+
+
+def test_calcular_scores_vetorizado():
+    indicadores = pd.DataFrame({
+        "saldo_cc": [0.0, 5000.0, 20000.0],
+        "saldo_medio": [3000.0, 5000.0, 20000.0],
+        "patrimonio": [0.0, 25000.0, 80000.0],
+        "movimentacoes": [4, 10, 50],
+    })
+
+    #saldo atual zerado zera o score; cada indicador satura no seu peso
+    assert score_credito.calcular_scores(indicadores).tolist() == [0, 500, 1000]
+
+
+def test_score_gravado_e_invalidado_por_movimentacao(banco_temporario):
+    documento = '44455566677'
+    banco_temporario.inserir_cliente('Score Teste', '11999999999', documento, True, False)
+    conta = banco_temporario.nova_conta(documento, 5000.0)
+
+    assert score_credito.recalcular_scores(lote=1) == {"calculados": 1}
+    score = score_credito.buscar_score(documento)
+    assert score['score'] == 305
+
+    banco_temporario.atualizar_saldo_db(conta['numero_conta'], 10000.0)
+    with banco_temporario.get_connection() as conn:
+        assert conn.execute('SELECT 1 FROM "score_credito" WHERE documento = ?', (documento,)).fetchone() is None
+    #recalculado com as duas movimentações (o peso de cada saldo depende de quando os lançamentos caíram)
+    score = score_credito.buscar_score(documento)
+    assert score['movimentacoes'] == 2 and score['score'] > 305
+    assert score_credito.buscar_score('00000000000') is None
+
+
+def test_saldo_medio_ponderado_pelo_tempo(banco_temporario):
+    documento = '44455566678'
+    banco_temporario.inserir_cliente('Score Tempo', '11999999999', documento, True, False)
+    conta = banco_temporario.nova_conta(documento, 0.0)
+    #5000 por 20 dias e 10000 nos últimos 10: a média simples daria 7500
+    with banco_temporario.get_connection() as conn:
+        conn.executemany(
+            'INSERT INTO "lancamentos" (documento, origem, referencia, historico, valor, saldo_apos, data_lancamento) '
+            'VALUES (?, \'CONTA\', ?, \'AJUSTE\', ?, ?, datetime(\'now\', \'localtime\', ?))',
+            [(documento, conta['numero_conta'], 5000.0, 5000.0, '-30 days'), (documento, conta['numero_conta'], 5000.0, 10000.0, '-10 days')]
+        )
+        conn.execute('UPDATE "contas" SET saldo_cc = 10000.0 WHERE documento = ?', (documento,))
+
+    score = score_credito.buscar_score(documento)
+    assert score['saldo_medio'] == pytest.approx(20000.0 / 3, rel=1e-4)
+    assert score['score'] == 410
@@ -0,0 +1,38 @@
+import pytest
+
+from services.movimentacao import ConflitoVersao
+
+DOCUMENTO = '55566677788'
+CADASTRO = {"nome": 'Versao Teste', "saldo_cc": 100.0}
+
+
+def test_if_match_desatualizado_responde_412(cliente, banco_temporario):
+    etag = cliente.get(f'/contas/{DOCUMENTO}').headers['etag']
+    assert etag == '"1"'
+    #uma movimentação no meio muda a versão
+    banco_temporario.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 10.0, 0.1, True)
+
+    resposta = cliente.patch(f'/contas/{DOCUMENTO}/atualizar_saldo', params = {"novo_saldo": 500.0}, headers = {"If-Match": etag})
+    assert resposta.status_code == 412 and resposta.headers['etag'] == '"2"'
+    assert banco_temporario.busca_conta(DOCUMENTO)['saldo_cc'] == 90.0
+
+    resposta = cliente.patch(f'/contas/{DOCUMENTO}/atualizar_saldo', params = {"novo_saldo": 500.0}, headers = {"If-Match": '"2"'})
+    assert resposta.status_code == 200 and resposta.headers['etag'] == '"3"'
+    #sem If-Match continua gravando
+    assert cliente.patch(f'/contas/{DOCUMENTO}/atualizar_saldo', params = {"novo_saldo": 50.0}).status_code == 200
+    assert cliente.patch(f'/contas/{DOCUMENTO}/atualizar_saldo', params = {"novo_saldo": 1.0}, headers = {"If-Match": 'abc'}).status_code == 400
+
+
+def test_investidor_e_investimento_com_versao(cliente, banco_temporario):
+    etag = cliente.get(f'/clientes/investidor/{DOCUMENTO}').headers['etag']
+    params = {"nome": 'Versao Nova', "telefone": '11988888888', "email": 'nova@teste.com', "patrimonio": 0.0, "perfil": 'ARROJADO'}
+    resposta = cliente.patch(f'/investidor/{DOCUMENTO}', params = params, headers = {"If-Match": etag})
+    assert resposta.status_code == 200 and resposta.json()['nome'] == 'Versao Nova'
+    assert cliente.patch(f'/investidor/{DOCUMENTO}', params = params, headers = {"If-Match": etag}).status_code == 412
+
+    investimento = banco_temporario.novo_investimento_db(DOCUMENTO, 'RENDA FIXA', 10.0, 0.1, True)
+    with pytest.raises(ConflitoVersao):
+        banco_temporario.atualiza_investimento_db(investimento['id_investimento'], 0.0, False, 'RENDA FIXA', DOCUMENTO, versao = 5)
+    resposta = cliente.patch(f'/investimento/atualizar/{investimento["id_investimento"]}', params = {"tipo": 'RENDA FIXA', "valor_investido": 0.0, "ativo": False},
+                             headers = {"If-Match": f'"{investimento["versao"]}"'})
+    assert resposta.status_code == 200 and resposta.json()['versao'] == investimento['versao'] + 1